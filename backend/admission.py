@@ -0,0 +1,162 @@
+import math
+import os
+import time
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from auth import bearer_subject
+from cache import TTLCache
+from metrics import Counter, pool_pressure, registry
+
+# Limits are per worker process: with N workers a client gets up to N times these rates
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+LOAD_SHEDDING_ENABLED = os.getenv("LOAD_SHEDDING_ENABLED", "true").lower() == "true"
+# Shed when this many checkouts are queued on a pool...
+SHED_POOL_WAITERS = int(os.getenv("SHED_POOL_WAITERS", "20"))
+# ...or recent checkouts waited this long on average...
+SHED_POOL_WAIT_MS = float(os.getenv("SHED_POOL_WAIT_MS", "250"))
+# ...or this many API requests are already in progress in this worker (0 disables)
+SHED_MAX_IN_FLIGHT = int(os.getenv("SHED_MAX_IN_FLIGHT", "256"))
+SHED_RETRY_AFTER = int(os.getenv("SHED_RETRY_AFTER", "1"))
+RATE_LIMIT_TRACKED_CLIENTS = int(os.getenv("RATE_LIMIT_TRACKED_CLIENTS", "100000"))
+
+# Observability stays reachable while the API sheds load
+SHED_EXEMPT_PATHS = {"/api/admin/metrics", "/api/admin/metrics/slow-queries"}
+# Open for as long as the client stays connected; bounded by EVENTS_MAX_SUBSCRIBERS instead
+LONG_LIVED_PATHS = {"/api/events"}
+
+rejected_requests = registry.register(Counter(
+    "http_requests_rejected_total", "Requests rejected by admission control", ("reason",)
+))
+
+def _limit(name: str, rate: float, burst: float):
+    # (tokens per second, bucket size), overridable as RATE_LIMIT_<NAME>_RATE / _BURST
+    return (
+        float(os.getenv(f"RATE_LIMIT_{name}_RATE", str(rate))),
+        float(os.getenv(f"RATE_LIMIT_{name}_BURST", str(burst)))
+    )
+
+# name -> (key, (rate, burst), applies(method, path)); key is "ip" or "user" (falls back to ip)
+RATE_LIMITS = {
+    "ip": ("ip", _limit("IP", 20, 60), lambda method, path: True),
+    "user": ("user", _limit("USER", 10, 30), lambda method, path: True),
+    # Password guessing; login is also the most expensive call (bcrypt)
+    "login": ("ip", _limit("LOGIN", 0.2, 5), lambda method, path: method == "POST" and path == "/api/auth/login"),
+    # Booking writes; GETs are exempt since the frontend polls a booking while payment settles
+    "bookings": (
+        "user", _limit("BOOKINGS", 1, 5),
+        lambda method, path: method != "GET" and path.startswith("/api/bookings")
+    ),
+}
+
+# ============ TOKEN BUCKETS ============
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def retry_after(self) -> float:
+        # Seconds until a token is available, 0 if one is available now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+# (limit name, client key) -> TokenBucket; an idle bucket refills completely within
+# burst / rate seconds, so dropping it after that is indistinguishable from keeping it
+buckets = TTLCache(maxsize=RATE_LIMIT_TRACKED_CLIENTS, ttl=3600)
+
+def _bucket(name: str, client: str, rate: float, burst: float, now: float) -> TokenBucket:
+    key = (name, client)
+    bucket = buckets.get(key)
+    if bucket is None:
+        bucket = TokenBucket(rate, burst, now)
+    else:
+        bucket.refill(now)
+    buckets.set(key, bucket, ttl=burst / rate)
+    return bucket
+
+def check_rate_limits(request: Request):
+    # (limit name, seconds to wait) for the first exhausted bucket, None if admitted.
+    # Tokens are only taken when every applicable bucket has one.
+    method, path = request.method, request.url.path
+    now = time.monotonic()
+    clients = {"ip": f"ip:{request.client.host if request.client else 'unknown'}"}
+    taken = []
+    for name, (key, (rate, burst), applies) in RATE_LIMITS.items():
+        if not applies(method, path):
+            continue
+        if key not in clients:
+            user = bearer_subject(request)
+            clients[key] = f"user:{user}" if user else None
+        client = clients[key]
+        if client is None:
+            if name == "user":
+                continue  # anonymous traffic is covered by the ip bucket
+            client = clients["ip"]
+        bucket = _bucket(name, client, rate, burst, now)
+        wait = bucket.retry_after()
+        if wait:
+            return name, wait
+        taken.append(bucket)
+    for bucket in taken:
+        bucket.tokens -= 1
+    return None
+
+# ============ LOAD SHEDDING ============
+_in_flight = 0
+
+def overload_reason():
+    # Cheap checks only: runs before every API request
+    if SHED_MAX_IN_FLIGHT and _in_flight >= SHED_MAX_IN_FLIGHT:
+        return "in_flight"
+    for waiting, recent_wait in pool_pressure().values():
+        if waiting >= SHED_POOL_WAITERS:
+            return "pool_queue"
+        if recent_wait * 1000 >= SHED_POOL_WAIT_MS:
+            return "pool_wait"
+    return None
+
+# ============ MIDDLEWARE ============
+def _reject(status_code: int, detail: str, retry_after: float, reason: str):
+    rejected_requests.inc(reason)
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+async def admit(request: Request, call_next):
+    global _in_flight
+    path = request.url.path
+    if not path.startswith("/api/"):
+        return await call_next(request)
+
+    # Shedding first: a fast 503 keeps the requests already admitted fast
+    if LOAD_SHEDDING_ENABLED and path not in SHED_EXEMPT_PATHS:
+        reason = overload_reason()
+        if reason:
+            return _reject(503, "Service is overloaded, please retry shortly", SHED_RETRY_AFTER, f"overload_{reason}")
+    if RATE_LIMIT_ENABLED:
+        limited = check_rate_limits(request)
+        if limited:
+            name, wait = limited
+            return _reject(429, "Too many requests", wait, f"rate_limit_{name}")
+
+    if path in LONG_LIVED_PATHS:
+        return await call_next(request)
+    _in_flight += 1
+    try:
+        return await call_next(request)
+    finally:
+        _in_flight -= 1
+
+def install(app):
+    if RATE_LIMIT_ENABLED or LOAD_SHEDDING_ENABLED:
+        app.middleware("http")(admit)
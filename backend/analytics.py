@@ -0,0 +1,93 @@
+import os
+from datetime import date, datetime, time, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import case, delete, func, insert, inspect, select, text
+
+from archive import all_bookings
+from models import BookingArchive, BookingDailyRollup, BookingStatus, PaymentStatus, Service
+
+MAX_ANALYTICS_DAYS = int(os.getenv("MAX_ANALYTICS_DAYS", "731"))
+DEFAULT_ANALYTICS_DAYS = 30
+GROUP_BY_DIMENSIONS = ("day", "category", "service")
+
+# ============ BACKFILL ============
+def rebuild_rollups(conn, start: date = None, end: date = None) -> int:
+    # Recomputes the rollups for [start, end] (default: everything) from bookings and the archive.
+    # Sync connection: used by manage.py and migrations.
+    if conn.dialect.name == "postgresql":
+        # Booking writes queue behind the rebuild instead of racing it
+        conn.execute(text(f"LOCK TABLE {BookingDailyRollup.__tablename__} IN EXCLUSIVE MODE"))
+    # Migration 0004 backfills before migration 0006 creates the archive
+    archived = inspect(conn).has_table(BookingArchive.__tablename__)
+    bookings = all_bookings("id", "created_at", "service_id", "status", "payment_status", "total_amount", archived=archived)
+    day = func.date(bookings.c.created_at)
+    aggregate = select(
+        day,
+        bookings.c.service_id,
+        bookings.c.status,
+        func.count(bookings.c.id),
+        func.coalesce(func.sum(case((bookings.c.payment_status == PaymentStatus.SUCCESS, bookings.c.total_amount), else_=0.0)), 0.0)
+    ).group_by(day, bookings.c.service_id, bookings.c.status)
+    clear = delete(BookingDailyRollup)
+    if start:
+        aggregate = aggregate.where(bookings.c.created_at >= datetime.combine(start, time.min))
+        clear = clear.where(BookingDailyRollup.day >= start)
+    if end:
+        aggregate = aggregate.where(bookings.c.created_at < datetime.combine(end + timedelta(days=1), time.min))
+        clear = clear.where(BookingDailyRollup.day <= end)
+    conn.execute(clear)
+    result = conn.execute(
+        insert(BookingDailyRollup).from_select(["day", "service_id", "status", "booking_count", "revenue"], aggregate)
+    )
+    return result.rowcount
+
+# ============ QUERIES ============
+def parse_group_by(value: str) -> tuple:
+    dimensions = tuple(part.strip() for part in value.split(",") if part.strip())
+    unknown = [part for part in dimensions if part not in GROUP_BY_DIMENSIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown group_by {', '.join(unknown)}; use any of {', '.join(GROUP_BY_DIMENSIONS)}"
+        )
+    return dimensions
+
+def analytics_range(date_from: date = None, date_to: date = None):
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=DEFAULT_ANALYTICS_DAYS - 1)
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (date_to - date_from).days >= MAX_ANALYTICS_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_ANALYTICS_DAYS} days")
+    return date_from, date_to
+
+def _status_count(status: BookingStatus):
+    return func.coalesce(func.sum(case((BookingDailyRollup.status == status, BookingDailyRollup.booking_count), else_=0)), 0)
+
+def analytics_query(date_from: date, date_to: date, group_by: tuple):
+    # Reads only the rollups (plus the small services table for category/service labels)
+    dimensions = []
+    if "day" in group_by:
+        dimensions.append(BookingDailyRollup.day)
+    if "category" in group_by:
+        dimensions.append(Service.category)
+    if "service" in group_by:
+        dimensions += [BookingDailyRollup.service_id, Service.title.label("service_title")]
+    query = select(
+        *dimensions,
+        func.coalesce(func.sum(BookingDailyRollup.booking_count), 0).label("bookings"),
+        _status_count(BookingStatus.PENDING).label("pending"),
+        _status_count(BookingStatus.CONFIRMED).label("confirmed"),
+        _status_count(BookingStatus.CANCELLED).label("cancelled"),
+        func.coalesce(func.sum(BookingDailyRollup.revenue), 0.0).label("revenue")
+    ).where(BookingDailyRollup.day >= date_from, BookingDailyRollup.day <= date_to)
+    if "category" in group_by or "service" in group_by:
+        query = query.join(Service, Service.id == BookingDailyRollup.service_id)
+    if dimensions:
+        query = query.group_by(*dimensions).order_by(*dimensions)
+    return query
+
+async def read_analytics(db, date_from: date, date_to: date, group_by: tuple) -> list:
+    rows = (await db.execute(analytics_query(date_from, date_to, group_by))).mappings().all()
+    return [dict(row, revenue=round(row["revenue"], 2)) for row in rows]
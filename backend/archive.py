@@ -0,0 +1,126 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, delete, func, insert, literal, select, union_all
+
+from database import AsyncSessionLocal
+from metrics import Counter, registry
+from models import Booking, BookingArchive, BookingStatus, PaymentStatus
+
+BOOKING_ARCHIVE_ENABLED = os.getenv("BOOKING_ARCHIVE_ENABLED", "true").lower() == "true"
+# Bookings move to bookings_archive this many days after their session...
+BOOKING_ARCHIVE_AFTER_DAYS = float(os.getenv("BOOKING_ARCHIVE_AFTER_DAYS", "90"))
+# ...or this many days after they were cancelled
+BOOKING_ARCHIVE_CANCELLED_AFTER_DAYS = float(os.getenv("BOOKING_ARCHIVE_CANCELLED_AFTER_DAYS", "30"))
+# Rows moved per transaction; the pause between batches lets booking writes through
+BOOKING_ARCHIVE_BATCH_SIZE = int(os.getenv("BOOKING_ARCHIVE_BATCH_SIZE", "500"))
+BOOKING_ARCHIVE_BATCH_PAUSE = float(os.getenv("BOOKING_ARCHIVE_BATCH_PAUSE", "0.1"))
+BOOKING_ARCHIVE_INTERVAL_SECONDS = float(os.getenv("BOOKING_ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+# Every archive column except archived_at is copied from bookings as is
+ARCHIVED_COLUMNS = tuple(column.name for column in BookingArchive.__table__.columns if column.name != "archived_at")
+
+archived_bookings = registry.register(Counter(
+    "bookings_archived_total", "Bookings moved to bookings_archive"
+))
+
+# ============ HISTORY ============
+def all_bookings(*names, archived: bool = True):
+    # bookings and bookings_archive as one relation, for aggregates over the full history
+    live = select(*(Booking.__table__.c[name] for name in names))
+    if not archived:
+        return live.subquery("all_bookings")
+    return union_all(live, select(*(BookingArchive.__table__.c[name] for name in names))).subquery("all_bookings")
+
+# ============ MOVER ============
+def archive_conditions(now: datetime) -> list:
+    # One condition per index (ix_bookings_booking_date, ix_bookings_cancelled_at), each
+    # moved in its own passes. Nothing the scheduler or payment worker still owns is
+    # archived, and never the newest booking: SQLite would hand its id out again.
+    owned_elsewhere = (
+        Booking.due_at.is_(None),
+        Booking.payment_status != PaymentStatus.PROCESSING,
+        Booking.id < select(func.max(Booking.id)).scalar_subquery()
+    )
+    return [
+        (Booking.booking_date < now - timedelta(days=BOOKING_ARCHIVE_AFTER_DAYS), *owned_elsewhere),
+        (
+            Booking.status == BookingStatus.CANCELLED,
+            Booking.cancelled_at < now - timedelta(days=BOOKING_ARCHIVE_CANCELLED_AFTER_DAYS),
+            *owned_elsewhere
+        ),
+    ]
+
+async def archive_batch(db, conditions, now: datetime, batch_size: int = BOOKING_ARCHIVE_BATCH_SIZE) -> int:
+    # Copy then delete in one transaction: a booking is always in exactly one of the tables.
+    # booking_stats and the rollups count both tables, so they are left alone.
+    ids = (await db.execute(
+        select(Booking.id)
+        .where(*conditions)
+        .order_by(Booking.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )).scalars().all()
+    if not ids:
+        return 0
+    source = select(
+        *(Booking.__table__.c[name] for name in ARCHIVED_COLUMNS),
+        literal(now, DateTime)
+    ).where(Booking.id.in_(ids), *conditions)
+    await db.execute(insert(BookingArchive).from_select([*ARCHIVED_COLUMNS, "archived_at"], source))
+    result = await db.execute(
+        delete(Booking)
+        .where(Booking.id.in_(ids), *conditions)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    archived_bookings.inc(amount=result.rowcount)
+    return result.rowcount
+
+async def archive_bookings(now: datetime = None, batch_size: int = BOOKING_ARCHIVE_BATCH_SIZE, pause: float = 0) -> int:
+    now = now or datetime.utcnow()
+    moved = 0
+    for conditions in archive_conditions(now):
+        while True:
+            async with AsyncSessionLocal() as db:
+                count = await archive_batch(db, conditions, now, batch_size)
+            moved += count
+            if count < batch_size:
+                break
+            await asyncio.sleep(pause)
+    return moved
+
+class BookingArchiver:
+    def __init__(self, interval: float = BOOKING_ARCHIVE_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        if self._task or not BOOKING_ARCHIVE_ENABLED:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                moved = await archive_bookings(pause=BOOKING_ARCHIVE_BATCH_PAUSE)
+                if moved:
+                    print(f"📦 Archived {moved} bookings")
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"⚠️ Booking archive run failed: {exc}")
+            await asyncio.sleep(self.interval)
+
+booking_archiver = BookingArchiver()
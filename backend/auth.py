@@ -1,38 +1,44 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
+import time
 from dotenv import load_dotenv
-from database import get_db
+from database import get_async_db
 from models import User, UserRole
+from schemas import UserPrincipal
+from cache import TTLCache
+import hashing
 
 load_dotenv()
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-min-32-chars-long")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
-
-# Updated bcrypt configuration
-pwd_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto",
-    bcrypt__rounds=12
-)
+# Stream tickets go in URLs (EventSource cannot set headers), so they only open event
+# streams and expire long before the access token that obtained them
+STREAM_TICKET_SECONDS = int(os.getenv("STREAM_TICKET_SECONDS", "30"))
+STREAM_TICKET_PURPOSE = "stream"
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+# Upper bound on how long another worker can serve a principal after it was invalidated here
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# token -> UserPrincipal; entries never outlive the token's own exp claim
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
 
+# Synchronous helpers for scripts; request handlers use hashing.password_hasher
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return hashing.verify_password(plain_password, hashed_password)
 
 def get_password_hash(password):
-    # Truncate password to 72 bytes for bcrypt compatibility
-    if len(password.encode('utf-8')) > 72:
-        password = password[:72]
-    return pwd_context.hash(password)
+    return hashing.hash_password(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -44,30 +50,80 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def decode_token(token: str):
+def create_stream_ticket(subject: str):
+    return create_access_token(
+        {"sub": subject, "purpose": STREAM_TICKET_PURPOSE},
+        expires_delta=timedelta(seconds=STREAM_TICKET_SECONDS)
+    )
+
+def decode_token_payload(token: str, purpose: str = None):
+    # purpose is None for access tokens; a token made for another purpose is refused
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return email
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("sub") is None or payload.get("purpose") != purpose:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload
+
+def decode_token(token: str):
+    return decode_token_payload(token)["sub"]
+
+def bearer_subject(request: Request):
+    # Subject of a validly signed bearer token, for middleware that keys work by client;
+    # routes still authenticate the token properly
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return decode_token_payload(token)["sub"]
+    except HTTPException:
+        return None
+
+def invalidate_user(user_id: int):
+    # Call after deactivating a user or changing their role
+    return principal_cache.discard_where(lambda token, principal: principal.id == user_id)
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    token = credentials.credentials
-    email = decode_token(token)
-    user = db.query(User).filter(User.email == email).first()
+    return await principal_for_token(credentials.credentials, db)
+
+async def get_stream_user(
+    ticket: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # EventSource cannot set headers: browsers pass a stream ticket (POST /api/events/ticket)
+    # in the query string instead of their bearer token
+    if credentials:
+        return await principal_for_token(credentials.credentials, db)
+    if not ticket:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    # Tickets are not cached: each opens one stream, and the cache only holds access tokens
+    return await load_principal(decode_token_payload(ticket, purpose=STREAM_TICKET_PURPOSE), db)
+
+async def load_principal(payload: dict, db: AsyncSession):
+    result = await db.execute(select(User).where(User.email == payload["sub"]))
+    user = result.scalar_one_or_none()
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    return user
+    return UserPrincipal.model_validate(user)
+
+async def principal_for_token(token: str, db: AsyncSession):
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+    
+    payload = decode_token_payload(token)
+    principal = await load_principal(payload, db)
+    principal_cache.set(token, principal, ttl=payload["exp"] - time.time())
+    return principal
 
-async def get_current_admin(current_user: User = Depends(get_current_user)):
+async def get_current_admin(current_user: UserPrincipal = Depends(get_current_user)):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Not authorized")
     return current_user
\ No newline at end of file
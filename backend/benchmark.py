@@ -0,0 +1,407 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+# Load generator for the booking API.
+#
+#   python benchmark.py --users 2000 --services 50 --bookings 50000 --duration 60 --output bench.json
+#   python benchmark.py --compare bench-main.json --output bench-branch.json
+#
+# By default the app runs in-process on a fresh SQLite file (client and server share one event
+# loop, so absolute numbers are pessimistic; compare runs made the same way). Use --database-url
+# for a throwaway Postgres, and --url to drive a running server that uses the same database.
+# App modules are imported inside run(): hashing/image workers are spawned processes that
+# re-import this file, and must not build the app or touch the database.
+
+SCENARIOS = {
+    "browse_catalog": 30,
+    "service_detail": 15,
+    "availability": 10,
+    "login": 5,
+    "my_bookings": 10,
+    "book": 12,
+    "book_and_cancel": 6,
+    "admin_dashboard": 6,
+    "admin_bookings": 6,
+}
+PASSWORD = "bench-password"
+SEED_BATCH_SIZE = 1000
+
+# ============ RESULTS ============
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+        self.recording = False
+
+    def record(self, route: str, elapsed: float, status: int):
+        if not self.recording:
+            return
+        self.latencies[route].append(elapsed)
+        self.statuses[route][status] += 1
+        if status >= 500:
+            self.errors[route] += 1
+
+    def failure(self, route: str):
+        if self.recording:
+            self.errors[route] += 1
+            self.statuses[route]["exception"] += 1
+
+def percentile(sorted_values: list, pct: float) -> float:
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    routes = {}
+    total = 0
+    for route in sorted(set(recorder.latencies) | set(recorder.errors)):
+        values = sorted(recorder.latencies[route])
+        total += len(values)
+        routes[route] = {
+            "requests": len(values),
+            "errors": recorder.errors[route],
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+            "statuses": {str(k): v for k, v in sorted(recorder.statuses[route].items(), key=lambda kv: str(kv[0]))},
+        }
+    return {
+        "duration_seconds": round(elapsed, 2),
+        "requests": total,
+        "errors": sum(recorder.errors.values()),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "routes": routes,
+    }
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_report(results: dict):
+    summary = results["summary"]
+    print(f"\n📊 {summary['requests']} requests in {summary['duration_seconds']}s "
+          f"({summary['throughput_rps']} req/s, {summary['errors']} errors)")
+    print(f"{'route':<44}{'req':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>6}")
+    for route, stats in summary["routes"].items():
+        print(f"{route:<44}{stats['requests']:>8}{stats['throughput_rps']:>9}"
+              f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['errors']:>6}")
+
+def print_comparison(baseline: dict, results: dict):
+    print(f"\n🔁 Compared with {baseline.get('revision') or 'baseline'} (rps: higher is better, latency: lower is better)")
+    print(f"{'route':<44}{'rps Δ%':>10}{'p50 Δ%':>10}{'p95 Δ%':>10}{'p99 Δ%':>10}")
+    old_routes = baseline["summary"]["routes"]
+    for route, stats in results["summary"]["routes"].items():
+        old = old_routes.get(route)
+        if not old:
+            continue
+        def change(key):
+            return f"{(stats[key] - old[key]) / old[key] * 100:+.1f}" if old[key] else "n/a"
+        print(f"{route:<44}{change('throughput_rps'):>10}{change('p50_ms'):>10}{change('p95_ms'):>10}{change('p99_ms'):>10}")
+
+# ============ SEEDING ============
+async def seed(args, rng: random.Random) -> dict:
+    from sqlalchemy import insert, select
+
+    from database import AsyncSessionLocal
+    from hashing import hash_password
+    from models import Booking, BookingStatus, PaymentStatus, Service, User, UserRole
+    from slots import SLOT_TIMES, ensure_all_inventory
+    from stats import reconcile_booking_stats
+
+    started = time.perf_counter()
+    # One hash for every seeded user: seeding should not be bounded by bcrypt
+    hashed_password = hash_password(PASSWORD)
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        user_rows = [{
+            "email": f"bench{i}@benchmark.wellness.com",
+            "username": f"bench{i}",
+            "hashed_password": hashed_password,
+            "full_name": f"Bench User {i}",
+            "role": UserRole.USER,
+            "is_active": True,
+            "created_at": now - timedelta(minutes=i),
+        } for i in range(args.users)]
+        for i in range(0, len(user_rows), SEED_BATCH_SIZE):
+            await db.execute(insert(User), user_rows[i:i + SEED_BATCH_SIZE])
+
+        categories = [f"Bench Category {i}" for i in range(max(args.services // 5, 1))]
+        service_rows = [{
+            "title": f"Bench Service {i}",
+            "category": categories[i % len(categories)],
+            "description": "Benchmark service " * 8,
+            "price": float(rng.randrange(300, 3000)),
+            "duration_minutes": 60,
+            "expert_name": f"Expert {i}",
+            "slot_capacity": args.slot_capacity,
+            "is_active": True,
+            "created_at": now,
+        } for i in range(args.services)]
+        if service_rows:
+            await db.execute(insert(Service), service_rows)
+        await db.commit()
+
+        user_ids = (await db.execute(select(User.id).where(User.role == UserRole.USER))).scalars().all()
+        service_rows = (await db.execute(select(Service.id, Service.price).where(Service.is_active == True))).all()
+
+        # Historical bookings; (user, day, slot) is unique by construction so the active-slot index holds
+        statuses = [BookingStatus.CONFIRMED] * 6 + [BookingStatus.PENDING] * 2 + [BookingStatus.CANCELLED] * 2
+        batch = []
+        for i in range(args.bookings):
+            user_index, rest = i % len(user_ids), i // len(user_ids)
+            service_id, price = service_rows[rng.randrange(len(service_rows))]
+            status = rng.choice(statuses)
+            booking_date = (now - timedelta(days=2 + rest % 365)).replace(hour=0, minute=0, second=0, microsecond=0)
+            batch.append({
+                "user_id": user_ids[user_index],
+                "service_id": service_id,
+                "booking_date": booking_date,
+                "time_slot": SLOT_TIMES[(rest // 365) % len(SLOT_TIMES)],
+                "status": status,
+                # Unpaid ones are FAILED, not PENDING: the payment sweeper would otherwise pick them up mid-run
+                "payment_status": PaymentStatus.FAILED if status == BookingStatus.PENDING else PaymentStatus.SUCCESS,
+                "payment_id": None if status == BookingStatus.PENDING else f"PAY_BENCH{i:08d}",
+                "total_amount": price,
+                "created_at": booking_date - timedelta(days=rng.randrange(1, 30)),
+                "cancelled_at": booking_date if status == BookingStatus.CANCELLED else None,
+                "version": 1,
+            })
+            if len(batch) >= SEED_BATCH_SIZE:
+                await db.execute(insert(Booking), batch)
+                batch = []
+        if batch:
+            await db.execute(insert(Booking), batch)
+        await db.commit()
+        await reconcile_booking_stats(db)
+        await ensure_all_inventory(db)
+
+    print(f"🌱 Seeded {args.users} users, {args.services} services, {args.bookings} bookings "
+          f"in {time.perf_counter() - started:.1f}s")
+    return {
+        "emails": [f"bench{i}@benchmark.wellness.com" for i in range(args.users)],
+        "service_ids": [row.id for row in service_rows],
+    }
+
+# ============ SCENARIOS ============
+class VirtualUser:
+    def __init__(self, client, recorder: Recorder, rng: random.Random, fixtures: dict, token: str, admin_token: str):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.fixtures = fixtures
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.admin_headers = {"Authorization": f"Bearer {admin_token}"}
+
+    async def request(self, route: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except Exception as exc:
+            self.recorder.failure(route)
+            print(f"❌ {route}: {exc!r}")
+            return None
+        self.recorder.record(route, time.perf_counter() - started, response.status_code)
+        return response
+
+    def service_id(self) -> int:
+        return self.rng.choice(self.fixtures["service_ids"])
+
+    def future_slot(self):
+        from slots import SLOT_TIMES
+        day = datetime.utcnow().date() + timedelta(days=self.rng.randrange(3, 45))
+        return day.isoformat(), self.rng.choice(SLOT_TIMES)
+
+    async def browse_catalog(self):
+        await self.request("GET /api/services", "GET", "/api/services")
+        await self.request("GET /api/services/category/list", "GET", "/api/services/category/list")
+
+    async def service_detail(self):
+        await self.request("GET /api/services/{id}", "GET", f"/api/services/{self.service_id()}")
+
+    async def availability(self):
+        await self.request("GET /api/services/{id}/availability", "GET", f"/api/services/{self.service_id()}/availability")
+
+    async def login(self):
+        await self.request("POST /api/auth/login", "POST", "/api/auth/login", json={
+            "email": self.rng.choice(self.fixtures["emails"]), "password": PASSWORD
+        })
+
+    async def my_bookings(self):
+        await self.request("GET /api/bookings/my", "GET", "/api/bookings/my", headers=self.headers)
+
+    async def book(self):
+        booking_date, time_slot = self.future_slot()
+        return await self.request("POST /api/bookings", "POST", "/api/bookings", headers=self.headers, json={
+            "service_id": self.service_id(), "booking_date": booking_date, "time_slot": time_slot
+        })
+
+    async def book_and_cancel(self):
+        response = await self.book()
+        if response is not None and response.status_code == 201:
+            booking_id = response.json()["id"]
+            await self.request("DELETE /api/bookings/{id}", "DELETE", f"/api/bookings/{booking_id}", headers=self.headers)
+
+    async def admin_dashboard(self):
+        await self.request("GET /api/admin/dashboard", "GET", "/api/admin/dashboard", headers=self.admin_headers)
+
+    async def admin_bookings(self):
+        response = await self.request("GET /api/admin/bookings", "GET", "/api/admin/bookings", headers=self.admin_headers)
+        cursor = response.headers.get("X-Next-Cursor") if response is not None else None
+        if cursor:
+            await self.request("GET /api/admin/bookings?cursor", "GET", "/api/admin/bookings",
+                               headers=self.admin_headers, params={"cursor": cursor})
+
+async def drive(args, client, fixtures: dict, recorder: Recorder, rng: random.Random):
+    from auth import create_access_token
+
+    names = list(args.mix)
+    weights = [args.mix[name] for name in names]
+    admin_token = create_access_token({"sub": "admin@wellness.com"}, timedelta(hours=2))
+    deadline_warmup = time.perf_counter() + args.warmup
+    deadline = deadline_warmup + args.duration
+
+    async def worker(index: int):
+        user_rng = random.Random(rng.random())
+        email = fixtures["emails"][index % len(fixtures["emails"])]
+        user = VirtualUser(client, recorder, user_rng, fixtures,
+                           create_access_token({"sub": email}, timedelta(hours=2)), admin_token)
+        while time.perf_counter() < deadline:
+            await getattr(user, user_rng.choices(names, weights)[0])()
+            if args.think_time:
+                await asyncio.sleep(user_rng.expovariate(1 / args.think_time))
+
+    async def start_recording():
+        await asyncio.sleep(args.warmup)
+        recorder.recording = True
+
+    tasks = [asyncio.create_task(worker(i)) for i in range(args.concurrency)]
+    await start_recording()
+    started = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - started
+
+# ============ ENTRY POINT ============
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario '{name}', expected one of {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the booking API and report per-route latency")
+    parser.add_argument("--database-url", help="Throwaway database to seed (default: fresh SQLite file)")
+    parser.add_argument("--url", help="Drive a running server instead of the in-process app")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--services", type=int, default=30)
+    parser.add_argument("--bookings", type=int, default=10000)
+    parser.add_argument("--slot-capacity", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before recording")
+    parser.add_argument("--think-time", type=float, default=0, help="Mean pause between actions, seconds")
+    parser.add_argument("--mix", type=parse_mix, default=dict(SCENARIOS),
+                        help="Scenario weights, e.g. browse_catalog=50,book=10")
+    parser.add_argument("--bcrypt-rounds", type=int, default=None, help="Override BCRYPT_ROUNDS for the run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run to diff against")
+    return parser.parse_args(argv)
+
+def configure_environment(args):
+    # Must run before any app module is imported: configuration is read at import time
+    if not args.database_url:
+        args.database_url = f"sqlite:///{tempfile.mkdtemp(prefix='wellness-bench-')}/bench.db"
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("EMAIL_TRANSPORT", "file")
+    # Every virtual user shares one client address; per-IP limits would throttle the run itself
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    os.environ.setdefault("EMAIL_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "wellness-bench-emails"))
+    if args.bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+async def run(args) -> dict:
+    import httpx
+
+    from main import app
+
+    rng = random.Random(args.seed)
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        await app.router.startup()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    recorder = Recorder()
+    try:
+        fixtures = await seed(args, rng)
+        print(f"🏃 {args.concurrency} virtual users, {args.warmup:g}s warmup + {args.duration:g}s measured")
+        elapsed = await drive(args, client, fixtures, recorder, rng)
+    finally:
+        await client.aclose()
+        if not args.url:
+            await app.router.shutdown()
+
+    return {
+        "revision": git_revision(),
+        "created_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "database": args.database_url.split("://", 1)[0],
+        "target": args.url or "in-process",
+        "config": {
+            "users": args.users,
+            "services": args.services,
+            "bookings": args.bookings,
+            "slot_capacity": args.slot_capacity,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "think_time": args.think_time,
+            "mix": args.mix,
+            "seed": args.seed,
+            "bcrypt_rounds": int(os.getenv("BCRYPT_ROUNDS", "12")),
+        },
+        "summary": summarize(recorder, elapsed),
+    }
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_environment(args)
+    import manage
+    manage.bootstrap()
+    results = asyncio.run(run(args))
+    print_report(results)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+    return 1 if results["summary"]["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
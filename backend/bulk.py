@@ -0,0 +1,230 @@
+import csv
+import io
+import json
+import os
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import or_, select, update
+
+from models import Booking, BookingStatus, PaymentStatus, Service, User
+from events import booking_event, publish_booking_events
+from outbox import enqueue_emails
+from schemas import ServiceImportRow
+from slots import release_slots, resize_slots_many
+from stats import add_rollup_transition, add_transition, apply_rollup_deltas, apply_stat_deltas, new_deltas, rollup_day
+
+# Keeps every IN list below the bind parameter limits of asyncpg (32767) and SQLite
+MAX_IMPORT_ROWS = int(os.getenv("MAX_IMPORT_ROWS", "5000"))
+MAX_BULK_BOOKINGS = int(os.getenv("MAX_BULK_BOOKINGS", "10000"))
+ID_BATCH_SIZE = 500
+# Validation errors reported per failed import, the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+# Bulk status changes an admin may make, and the statuses they apply to. Bookings whose
+# payment is PROCESSING are skipped: the payment worker owns them until the gateway answers
+BULK_STATUS_SOURCES = {
+    BookingStatus.CANCELLED: (BookingStatus.PENDING, BookingStatus.CONFIRMED),
+    # e.g. paid offline; the payment worker only ever moves PENDING bookings forward
+    BookingStatus.CONFIRMED: (BookingStatus.PENDING,),
+}
+# Payment recorded by a bulk change; confirming marks the booking paid so the worker
+# finds nothing left to charge
+BULK_PAYMENT_STATUS = {
+    BookingStatus.CONFIRMED: PaymentStatus.SUCCESS,
+}
+
+def _batches(values: list, size: int = ID_BATCH_SIZE):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def _reject_rows(errors: list):
+    detail = errors[:MAX_REPORTED_ERRORS]
+    if len(errors) > MAX_REPORTED_ERRORS:
+        detail.append({"row": None, "errors": [f"{len(errors) - MAX_REPORTED_ERRORS} more rows failed"]})
+    raise HTTPException(status_code=422, detail=detail)
+
+# ============ SERVICE IMPORT ============
+def parse_service_import(body: bytes, content_type: str) -> list:
+    # JSON array of services, or CSV with a header row using the same field names
+    if content_type.startswith("text/csv"):
+        try:
+            reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+            # Empty cells are left unset: defaults on create, untouched on update
+            records = [
+                {key.strip(): value.strip() for key, value in record.items() if key and value and value.strip()}
+                for record in reader
+            ]
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise HTTPException(status_code=400, detail=f"Invalid CSV: {exc}")
+    elif content_type.startswith("application/json"):
+        try:
+            records = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON")
+        if not isinstance(records, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of services")
+    else:
+        raise HTTPException(status_code=415, detail="Send services as application/json or text/csv")
+
+    if not records:
+        raise HTTPException(status_code=400, detail="No services to import")
+    if len(records) > MAX_IMPORT_ROWS:
+        raise HTTPException(status_code=413, detail=f"Imports are limited to {MAX_IMPORT_ROWS} services")
+
+    rows, errors = [], []
+    for index, record in enumerate(records, start=1):
+        try:
+            rows.append(ServiceImportRow.model_validate(record))
+        except ValidationError as exc:
+            errors.append({"row": index, "errors": exc.errors(include_url=False, include_context=False)})
+    if errors:
+        _reject_rows(errors)
+    return rows
+
+async def import_services(db, rows: list) -> dict:
+    # All or nothing in the caller's transaction; inserts and updates go out as
+    # batched statements at flush (insertmanyvalues / executemany)
+    ids = [row.id for row in rows if row.id is not None]
+    titles = list({row.title for row in rows if row.id is None})
+    existing = (await db.execute(
+        select(Service).where(or_(Service.id.in_(ids), Service.title.in_(titles)))
+    )).scalars().all() if ids or titles else []
+    by_id = {service.id: service for service in existing}
+    by_key = {}
+    for service in sorted(existing, key=lambda service: service.id):
+        by_key.setdefault((service.title, service.category), service)
+
+    services, resized, errors, seen = [], [], [], set()
+    created = updated = 0
+    for index, row in enumerate(rows, start=1):
+        if row.id is not None:
+            service = by_id.get(row.id)
+            if service is None:
+                errors.append({"row": index, "errors": [f"Service {row.id} not found"]})
+                continue
+        else:
+            service = by_key.get((row.title, row.category))
+        key = service.id if service is not None else (row.title, row.category)
+        if key in seen:
+            errors.append({"row": index, "errors": ["Duplicate of an earlier row"]})
+            continue
+        seen.add(key)
+
+        if service is None:
+            service = Service(**row.model_dump(exclude={"id"}))
+            db.add(service)
+            created += 1
+        else:
+            old_capacity = service.slot_capacity
+            for field, value in row.model_dump(exclude={"id"}, exclude_unset=True).items():
+                setattr(service, field, value)
+            if service.slot_capacity != old_capacity:
+                resized.append(service)
+            updated += 1
+        services.append(service)
+    if errors:
+        _reject_rows(errors)
+
+    await db.flush()
+    if resized:
+        await resize_slots_many(db, [service.id for service in resized])
+    # New services get no precomputed inventory here: reservations create missing
+    # slot rows on demand and the next bootstrap fills the horizon
+    await db.commit()
+    return {"created": created, "updated": updated, "ids": [service.id for service in services]}
+
+# ============ BOOKING STATUS ============
+def bulk_booking_query():
+    # Everything a status change needs: counters, slot release and the notification
+    return (
+        select(
+            Booking.id, Booking.user_id, Booking.service_id, Booking.booking_date, Booking.time_slot,
+            Booking.status, Booking.payment_status, Booking.total_amount, Booking.created_at,
+            User.email, Service.title
+        )
+        .join(User, Booking.user_id == User.id)
+        .join(Service, Booking.service_id == Service.id)
+    )
+
+def _status_email(row, status: BookingStatus, reason: str = None):
+    when = f"{row.booking_date:%Y-%m-%d} at {row.time_slot}"
+    if status == BookingStatus.CANCELLED:
+        body = f"Your booking #{row.id} for {row.title} on {when} has been cancelled by our team."
+        subject = "Booking Cancelled"
+    else:
+        body = f"Your booking #{row.id} for {row.title} on {when} is confirmed!"
+        subject = "Booking Confirmed!"
+    if reason:
+        body = f"{body}\n\n{reason}"
+    return row.email, subject, body
+
+async def change_booking_status(db, query, status: BookingStatus, notify: bool = True, reason: str = None, dry_run: bool = False) -> dict:
+    # query is bulk_booking_query() narrowed by the caller's filter
+    sources = BULK_STATUS_SOURCES.get(status)
+    if sources is None:
+        raise HTTPException(status_code=400, detail=f"Bookings can only be bulk-changed to {', '.join(s.value for s in BULK_STATUS_SOURCES)}")
+    guard = (Booking.status.in_(sources), Booking.payment_status != PaymentStatus.PROCESSING)
+    rows = (await db.execute(
+        query.where(*guard)
+        .order_by(Booking.id)
+        .limit(MAX_BULK_BOOKINGS + 1)
+        .with_for_update(of=Booking)
+    )).all()
+    if len(rows) > MAX_BULK_BOOKINGS:
+        raise HTTPException(status_code=400, detail=f"More than {MAX_BULK_BOOKINGS} bookings match, narrow the filter")
+    if dry_run or not rows:
+        await db.rollback()
+        return {"matched": len(rows), "updated": 0, "notified": 0}
+
+    now = datetime.utcnow()
+    # Cancelled bookings need no scheduling; confirmed ones are looked at by the
+    # scheduler right away, which sets their reminder time
+    values = {"status": status, "version": Booking.version + 1, "due_at": now}
+    if status == BookingStatus.CANCELLED:
+        values.update(cancelled_at=now, due_at=None)
+    payment_status = BULK_PAYMENT_STATUS.get(status)
+    if payment_status is not None:
+        values.update(payment_status=payment_status, payment_updated_at=now)
+    updated = 0
+    for batch in _batches([row.id for row in rows]):
+        # The guard turns a concurrent change (or payment claim) into a short count instead of a lost update
+        result = await db.execute(
+            update(Booking)
+            .where(Booking.id.in_(batch), *guard)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        updated += result.rowcount
+    if updated != len(rows):
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Bookings were updated concurrently, please retry")
+
+    # Core updates bypass the flush hook that maintains booking_stats and the rollups
+    deltas, rollups = new_deltas(), new_deltas()
+    for row in rows:
+        old = (row.status, row.payment_status, row.total_amount)
+        new = (status, payment_status or row.payment_status, row.total_amount)
+        add_transition(deltas, old=old, new=new)
+        add_rollup_transition(rollups, rollup_day(row.created_at), row.service_id, old=old, new=new)
+
+    def apply_deltas(session):
+        apply_stat_deltas(session.connection(), deltas)
+        apply_rollup_deltas(session.connection(), rollups)
+    await db.run_sync(apply_deltas)
+    if status == BookingStatus.CANCELLED:
+        await release_slots(db, Counter((row.service_id, row.booking_date.date(), row.time_slot) for row in rows))
+    if notify:
+        await enqueue_emails(db, [_status_email(row, status, reason) for row in rows])
+    await db.commit()
+    publish_booking_events(filter(None, (
+        booking_event(
+            SimpleNamespace(**{**row._asdict(), "status": status, "payment_status": payment_status or row.payment_status}),
+            row.status, row.payment_status
+        )
+        for row in rows
+    )))
+    return {"matched": len(rows), "updated": updated, "notified": len(rows) if notify else 0}
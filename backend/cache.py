@@ -0,0 +1,163 @@
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from conditional import make_etag
+
+_MISSING = object()
+
+# Bounded LRU cache with per-entry expiry, shared by the in-process caches
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def discard_where(self, predicate) -> int:
+        # Linear scan; meant for rare explicit invalidations, not the read path
+        with self._lock:
+            keys = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+# Pre-serialized catalog responses keyed by route and parameters:
+#   ("list", category, skip, limit, cursor) / ("service", id) / ("categories",)
+class CatalogCache:
+    def __init__(self, maxsize: int = 2048, ttl: float = 300.0):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._listeners = []
+        self._watchers = []
+        self.version = 0
+        # Wall-clock time of the last invalidation, local or remote
+        self.invalidated_at = None
+        # ETags name one cached fill in this process: versions are per worker, and a
+        # refill after expiry may read newer rows without any invalidation
+        self._epoch = os.urandom(4).hex()
+        self._fills = itertools.count(1)
+
+    def get(self, key):
+        # (entry, etag) or None
+        return self._cache.get(key)
+
+    def set(self, key, entry, version: int):
+        # version is self.version as read before querying; a fill that raced with
+        # an invalidation is dropped instead of caching stale data. Returns the
+        # entry's ETag, None if it was dropped.
+        if version != self.version:
+            return None
+        etag = make_etag(self._epoch, version, next(self._fills))
+        self._cache.set(key, (entry, etag))
+        return etag
+
+    def subscribe(self, listener):
+        # Cross-worker hook: listener(event) is called for every local invalidation,
+        # a deployment can forward the event to other workers and apply it there
+        # with apply_remote(event)
+        self._listeners.append(listener)
+
+    def watch(self, watcher):
+        # In-process hook: watcher(event) is called for every invalidation, local or
+        # remote, so derived structures (the search index) stay in step with the cache
+        self._watchers.append(watcher)
+
+    def invalidate(self, service_id: int = None, categories=(), categories_changed: bool = False, publish: bool = True):
+        affected = {None, *categories}
+        if service_id is not None:
+            self._cache.pop(("service", service_id))
+        self._cache.discard_where(lambda key, value: key[0] == "list" and key[1] in affected)
+        if categories_changed:
+            self._cache.pop(("categories",))
+        self._changed({
+            "service_id": service_id,
+            "categories": sorted(c for c in categories if c is not None),
+            "categories_changed": categories_changed,
+        }, publish)
+
+    def invalidate_all(self, publish: bool = True):
+        # For bulk changes touching more services than are worth tracking one by one
+        self._cache.clear()
+        self._changed({"all": True}, publish)
+
+    def _changed(self, event: dict, publish: bool):
+        self.version += 1
+        self.invalidated_at = time.time()
+        for watcher in self._watchers:
+            watcher(event)
+        if publish:
+            for listener in self._listeners:
+                listener(event)
+
+    def apply_remote(self, event: dict):
+        if event.get("all"):
+            self.invalidate_all(publish=False)
+            return
+        self.invalidate(
+            service_id=event.get("service_id"),
+            categories=event.get("categories", ()),
+            categories_changed=event.get("categories_changed", False),
+            publish=False
+        )
+
+    def clear(self):
+        self._cache.clear()
+        self.version += 1
+
+    def stats(self) -> dict:
+        return self._cache.stats()
@@ -0,0 +1,87 @@
+import gzip
+import os
+
+from fastapi import Request, Response
+
+from cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # brotli is optional: without it responses are only gzip encoded
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+# Smaller bodies fit in a packet or two already; encoding them costs more than it saves
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# Levels above ~5 are many times slower for a few percent on JSON
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+# Streamed as produced; buffering would hold every event back
+STREAMED_TYPES = ("text/event-stream",)
+
+# Encoded bodies of responses carrying an ETag, keyed by (path, query, etag, encoding):
+# a cached catalog page is compressed once per fill instead of once per request
+encoded_bodies = TTLCache(maxsize=int(os.getenv("COMPRESSION_CACHE_SIZE", "512")), ttl=300)
+
+def choose_encoding(accept_encoding: str):
+    # "br" when available and accepted, else "gzip", else None; honours q=0
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+def encode(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+async def compress(request: Request, call_next):
+    response = await call_next(request)
+    content_type = response.headers.get("content-type", "")
+    if (
+        response.status_code != 200
+        or not content_type.startswith(COMPRESSIBLE_TYPES)
+        or content_type.startswith(STREAMED_TYPES)
+        or "content-encoding" in response.headers
+    ):
+        return response
+    response.headers.append("Vary", "Accept-Encoding")
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    length = response.headers.get("content-length")
+    if encoding is None or (length is not None and int(length) < COMPRESSION_MIN_SIZE):
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = [(name, value) for name, value in response.raw_headers if name != b"content-length"]
+    if len(body) >= COMPRESSION_MIN_SIZE:
+        etag = response.headers.get("etag")
+        key = (request.url.path, request.url.query, etag, encoding)
+        encoded = encoded_bodies.get(key) if etag else None
+        if encoded is None:
+            encoded = encode(body, encoding)
+            if etag:
+                encoded_bodies.set(key, encoded)
+        body = encoded
+        headers.append((b"content-encoding", encoding.encode()))
+    compressed = Response(content=body, status_code=response.status_code)
+    compressed.raw_headers.extend(headers)
+    return compressed
+
+def install(app):
+    # Added last, so it wraps every other middleware and sees final bodies
+    if COMPRESSION_ENABLED:
+        app.middleware("http")(compress)
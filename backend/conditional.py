@@ -0,0 +1,32 @@
+from fastapi import Request, Response
+
+# Responses carrying an ETag are revalidated on every use; private ones are never
+# stored by shared caches
+PUBLIC_CACHE_CONTROL = "no-cache"
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+def make_etag(*parts) -> str:
+    # Weak: the same resource is served identity, gzip or br encoded
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+def etag_matches(request: Request, etag: str) -> bool:
+    # Weak comparison, as If-None-Match requires
+    header = request.headers.get("if-none-match")
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    return _opaque(etag) in {_opaque(tag) for tag in header.split(",")}
+
+def validator_headers(etag: str, private: bool = False) -> dict:
+    if not etag:
+        return {}
+    return {"ETag": etag, "Cache-Control": PRIVATE_CACHE_CONTROL if private else PUBLIC_CACHE_CONTROL}
+
+def not_modified(etag: str, private: bool = False, headers: dict = None) -> Response:
+    # No body: the client reuses the representation it already holds
+    return Response(status_code=304, headers={**validator_headers(etag, private), **(headers or {})})
@@ -1,12 +1,39 @@
 from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 import os
 from dotenv import load_dotenv
 
+from metrics import timed_pool
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Statement logging for local debugging; query timing is collected by metrics.py instead
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
+
+# Async drivers used by the request handlers
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+}
+
+def get_async_database_url(url: str, override: str = None) -> str:
+    if override:
+        return override
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        return url
+    parsed = parsed.set(drivername=ASYNC_DRIVERS[backend])
+    # asyncpg does not understand libpq's sslmode parameter
+    if backend == "postgresql" and "sslmode" in parsed.query:
+        parsed = parsed.difference_update_query(["sslmode"]).update_query_dict({"ssl": parsed.query["sslmode"]})
+    return parsed.render_as_string(hide_password=False)
 
 # PostgreSQL engine configuration
 engine = create_engine(
@@ -14,11 +41,56 @@ engine = create_engine(
     pool_pre_ping=True,
     pool_size=10,
     max_overflow=20,
-    echo=True
+    echo=SQL_ECHO
+)
+
+def async_pool_options(url: str, name: str, pool_size: int, max_overflow: int) -> dict:
+    if make_url(url).get_backend_name() == "sqlite":
+        # aiosqlite opens a connection per checkout, there is no pool to size
+        return {}
+    return {"pool_size": pool_size, "max_overflow": max_overflow, "poolclass": timed_pool(AsyncAdaptedQueuePool, name)}
+
+# Async engine used by the API; the sync engine is kept for scripts and migrations
+ASYNC_DATABASE_URL = get_async_database_url(DATABASE_URL, os.getenv("ASYNC_DATABASE_URL"))
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    echo=SQL_ECHO,
+    **async_pool_options(ASYNC_DATABASE_URL, "primary", 10, 20)
 )
 
+# Optional read replica with its own pool for catalog browsing and reporting (see replica.py);
+# without one, reads share the primary engine
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+if REPLICA_DATABASE_URL:
+    ASYNC_REPLICA_DATABASE_URL = get_async_database_url(REPLICA_DATABASE_URL, os.getenv("ASYNC_REPLICA_DATABASE_URL"))
+    replica_engine = create_async_engine(
+        ASYNC_REPLICA_DATABASE_URL,
+        pool_pre_ping=True,
+        echo=SQL_ECHO,
+        **async_pool_options(
+            ASYNC_REPLICA_DATABASE_URL,
+            "replica",
+            int(os.getenv("REPLICA_POOL_SIZE", "10")),
+            int(os.getenv("REPLICA_MAX_OVERFLOW", "20"))
+        )
+    )
+else:
+    replica_engine = async_engine
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+ReplicaSessionLocal = async_sessionmaker(
+    bind=replica_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 
 def get_db():
     db = SessionLocal()
@@ -27,5 +99,15 @@ def get_db():
     finally:
         db.close()
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def conflict_insert(db, model):
+    # INSERT supporting ON CONFLICT for backends that have it, None otherwise; db is a session or connection
+    dialect = (db.get_bind() if hasattr(db, "get_bind") else db).dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    return None
@@ -0,0 +1,240 @@
+import asyncio
+import os
+import time
+from collections import defaultdict, deque
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
+
+from metrics import Counter, Gauge, registry
+from models import Booking, BookingStatus, PaymentStatus
+from projections import dumps
+
+# Per worker: a client sees events published in the worker serving its stream, plus
+# whatever a deployment forwards from other workers (see EventBroker.subscribe)
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "10000"))
+# Undelivered events per stream; a client further behind is told to resync instead
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+# Recent events kept for Last-Event-ID resumption after a reconnect
+EVENTS_REPLAY_SIZE = int(os.getenv("EVENTS_REPLAY_SIZE", "1000"))
+# Comment lines keep idle streams open through proxies and reveal dead clients
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+# Streams end after this long; the client reconnects (re-authenticating) and resumes
+# from Last-Event-ID, so revoked tokens and deactivated users stop receiving events
+EVENTS_MAX_STREAM_SECONDS = float(os.getenv("EVENTS_MAX_STREAM_SECONDS", "3600"))
+EVENTS_RETRY_MS = 3000
+
+ADMIN_TOPIC = "admin"
+
+def user_topic(user_id: int) -> str:
+    return f"user:{user_id}"
+
+# Tells the client its stream has gaps: refetch over the REST API, then continue
+RESYNC_MESSAGE = b"event: resync\ndata: {}\n\n"
+KEEPALIVE_MESSAGE = b": keepalive\n\n"
+
+published_events = registry.register(Counter(
+    "events_published_total", "Events published to push subscribers", ("type",)
+))
+resynced_streams = registry.register(Counter(
+    "events_resyncs_total", "Streams told to resync after falling behind or reconnecting too late"
+))
+
+# ============ BROKER ============
+class Subscription:
+    __slots__ = ("topics", "_messages", "_ready")
+
+    def __init__(self, topics: frozenset):
+        self.topics = topics
+        self._messages = deque()
+        self._ready = asyncio.Event()
+
+    def offer(self, message: bytes):
+        if len(self._messages) >= EVENTS_QUEUE_SIZE:
+            # Too far behind: drop the backlog rather than buffer without bound
+            self._messages.clear()
+            resynced_streams.inc()
+            message = RESYNC_MESSAGE
+        self._messages.append(message)
+        self._ready.set()
+
+    async def drain(self, timeout: float) -> list:
+        # Everything queued since the last call, waiting up to timeout; [] if nothing came
+        if not self._messages:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        messages = list(self._messages)
+        self._messages.clear()
+        return messages
+
+class EventBroker:
+    def __init__(self):
+        self._topics = defaultdict(set)   # topic -> subscriptions
+        self._recent = deque(maxlen=EVENTS_REPLAY_SIZE)   # (seq, topics, message)
+        self._listeners = []
+        self._seq = 0
+        # Event ids are "<epoch>-<seq>": a Last-Event-ID from another worker or an
+        # earlier process is recognised as unknown and answered with a resync
+        self._epoch = os.urandom(4).hex()
+        self.subscribers = 0
+
+    def subscribe(self, listener):
+        # Cross-worker hook, as CatalogCache.subscribe: listener(type, data, topics) is
+        # called for every local event; apply it elsewhere with apply_remote(...)
+        self._listeners.append(listener)
+
+    def open(self, topics, last_event_id: str = None) -> Subscription:
+        if self.subscribers >= EVENTS_MAX_SUBSCRIBERS:
+            raise HTTPException(status_code=503, detail="Too many open event streams", headers={"Retry-After": "5"})
+        subscription = Subscription(frozenset(topics))
+        for topic in subscription.topics:
+            self._topics[topic].add(subscription)
+        self.subscribers += 1
+        if last_event_id:
+            self._replay(subscription, last_event_id)
+        return subscription
+
+    def close(self, subscription: Subscription):
+        for topic in subscription.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[topic]
+        self.subscribers -= 1
+
+    def _replay(self, subscription: Subscription, last_event_id: str):
+        epoch, _, seq = last_event_id.partition("-")
+        oldest = self._recent[0][0] if self._recent else self._seq + 1
+        if epoch != self._epoch or not seq.isdigit() or int(seq) < oldest - 1:
+            resynced_streams.inc()
+            subscription.offer(RESYNC_MESSAGE)
+            return
+        for event_seq, topics, message in self._recent:
+            if event_seq > int(seq) and not topics.isdisjoint(subscription.topics):
+                subscription.offer(message)
+
+    def publish(self, event_type: str, data: dict, topics, publish: bool = True):
+        # Encoded once, then fanned out as the same bytes to every matching stream
+        self._seq += 1
+        topics = frozenset(topics)
+        message = (
+            f"id: {self._epoch}-{self._seq}\nevent: {event_type}\ndata: ".encode()
+            + dumps(data) + b"\n\n"
+        )
+        self._recent.append((self._seq, topics, message))
+        published_events.inc(event_type)
+        matched = set()
+        for topic in topics:
+            matched.update(self._topics.get(topic, ()))
+        for subscription in matched:
+            subscription.offer(message)
+        if publish:
+            for listener in self._listeners:
+                listener(event_type, data, sorted(topics))
+
+    def apply_remote(self, event_type: str, data: dict, topics):
+        self.publish(event_type, data, topics, publish=False)
+
+broker = EventBroker()
+
+registry.register(Gauge(
+    "events_subscribers", "Open event streams in this worker", lambda: [((), broker.subscribers)]
+))
+
+# ============ STREAMS ============
+def event_stream(topics, last_event_id: str = None) -> StreamingResponse:
+    subscription = broker.open(topics, last_event_id)
+
+    async def stream():
+        deadline = time.monotonic() + EVENTS_MAX_STREAM_SECONDS
+        try:
+            yield f"retry: {EVENTS_RETRY_MS}\n\n".encode()
+            while time.monotonic() < deadline:
+                messages = await subscription.drain(EVENTS_KEEPALIVE_SECONDS)
+                yield b"".join(messages) if messages else KEEPALIVE_MESSAGE
+        finally:
+            broker.close(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ============ BOOKING EVENTS ============
+def booking_action(previous_status, previous_payment, status, payment_status):
+    # None when nothing a client shows has changed (e.g. scheduler bookkeeping)
+    if previous_status is None:
+        return "created"
+    if status != previous_status and status == BookingStatus.CANCELLED:
+        return "cancelled"
+    if payment_status != previous_payment:
+        if payment_status == PaymentStatus.SUCCESS:
+            return "paid"
+        if payment_status == PaymentStatus.FAILED:
+            return "payment_failed"
+        return "payment_pending" if payment_status == PaymentStatus.PENDING else None
+    if status != previous_status:
+        return "confirmed" if status == BookingStatus.CONFIRMED else None
+    return None
+
+def booking_event(booking, previous_status=None, previous_payment=None):
+    # booking: a Booking or any row with the same attribute names
+    action = booking_action(previous_status, previous_payment, booking.status, booking.payment_status)
+    if action is None:
+        return None
+    return {
+        "action": action,
+        "id": booking.id,
+        "user_id": booking.user_id,
+        "service_id": booking.service_id,
+        "booking_date": booking.booking_date,
+        "time_slot": booking.time_slot,
+        "status": booking.status,
+        "payment_status": booking.payment_status,
+        # Lets the admin dashboard adjust its counters without refetching
+        "previous_status": previous_status,
+        "previous_payment_status": previous_payment,
+        "total_amount": booking.total_amount,
+    }
+
+def publish_booking_events(events):
+    for data in events:
+        broker.publish("booking", data, (ADMIN_TOPIC, user_topic(data["user_id"])))
+
+def _previous(obj, key):
+    history = attributes.get_history(obj, key)
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, key)
+
+# ORM writes (booking creation, cancellation, payment results, expiry) are collected at
+# flush and published once the transaction commits; Core updates publish explicitly
+@event.listens_for(Session, "after_flush")
+def _collect_booking_events(session, flush_context):
+    events = []
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            events.append(booking_event(obj))
+    for obj in session.dirty:
+        if isinstance(obj, Booking) and session.is_modified(obj):
+            events.append(booking_event(obj, _previous(obj, "status"), _previous(obj, "payment_status")))
+    events = [data for data in events if data is not None]
+    if events:
+        session.info.setdefault("booking_events", []).extend(events)
+
+@event.listens_for(Session, "after_commit")
+def _publish_booking_events(session):
+    events = session.info.pop("booking_events", None)
+    if events:
+        publish_booking_events(events)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_booking_events(session):
+    session.info.pop("booking_events", None)
@@ -0,0 +1,87 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from passlib.context import CryptContext
+
+# Kept free of app imports: this module is loaded by the hashing worker processes
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# 0 runs hashing in the shared thread pool instead of dedicated processes
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Requests allowed to wait for a worker before new ones are rejected with 503
+HASH_QUEUE_DEPTH = int(os.getenv("HASH_QUEUE_DEPTH", "32"))
+
+# Hashes made with any other round count are reported as needing an update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+
+def hash_password(password: str) -> str:
+    # Truncate password to 72 bytes for bcrypt compatibility
+    if len(password.encode('utf-8')) > 72:
+        password = password[:72]
+    return pwd_context.hash(password)
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+def verify_and_update(plain_password: str, hashed_password: str):
+    # Returns (valid, new_hash); new_hash is set when the stored hash uses outdated rounds
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+class PasswordHasher:
+    def __init__(self, workers: int = HASH_WORKERS, queue_depth: int = HASH_QUEUE_DEPTH):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self._executor = None
+        self._in_flight = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        if self._executor is None and self.workers > 0:
+            # spawn: forking a process that already runs an event loop and DB threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _submit(self, fn, *args):
+        if self._in_flight >= max(self.workers, 1) + self.queue_depth:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Too many authentication requests, please retry shortly",
+                headers={"Retry-After": "1"}
+            )
+        self._in_flight += 1
+        try:
+            executor = self._get_executor()
+            if executor is None:
+                return await run_in_threadpool(fn, *args)
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        finally:
+            self._in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(verify_password, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str):
+        return await self._submit(verify_and_update, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher()
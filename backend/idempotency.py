@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime, timedelta
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, insert, select, update
+
+from auth import bearer_subject
+from cache import TTLCache
+from database import AsyncSessionLocal, conflict_insert
+from metrics import Counter, registry
+from models import IdempotencyKey
+from querybudget import uncounted
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+# Set on responses replayed from the store
+REPLAYED_HEADER = "Idempotent-Replayed"
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# Shares keys between workers through the idempotency_keys table; without it a retry
+# is only recognised by the worker that served the original
+IDEMPOTENCY_DB_ENABLED = os.getenv("IDEMPOTENCY_DB_ENABLED", "false").lower() == "true"
+# How long a duplicate waits for the original to finish before getting a 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_POLL_SECONDS = 0.1
+MAX_KEY_LENGTH = 255
+
+# Routes that honour Idempotency-Key: (method, path)
+IDEMPOTENT_ROUTES = (
+    ("POST", re.compile(r"/api/bookings")),
+    ("POST", re.compile(r"/api/bookings/\d+/retry-payment")),
+)
+# Outcomes that can change on a retry are not kept: conflicts, rate limits and server errors
+UNSTORED_STATUSES = {409, 429}
+# Recomputed for every response
+SKIPPED_HEADERS = {b"content-length", b"date", b"server"}
+
+idempotency_requests = registry.register(Counter(
+    "idempotency_requests_total", "Requests carrying an Idempotency-Key by outcome", ("outcome",)
+))
+
+class StoredResponse:
+    __slots__ = ("fingerprint", "status_code", "headers", "body")
+
+    def __init__(self, fingerprint: str, status_code: int, headers: list, body: bytes):
+        self.fingerprint = fingerprint
+        self.status_code = status_code
+        self.headers = headers   # [(name, value)] as str
+        self.body = body
+
+    def to_response(self) -> Response:
+        response = Response(content=self.body, status_code=self.status_code)
+        response.raw_headers.extend((name.encode("latin-1"), value.encode("latin-1")) for name, value in self.headers)
+        return response
+
+# (token subject, key) -> StoredResponse
+responses = TTLCache(maxsize=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_TTL_SECONDS)
+# (token subject, key) -> future resolved when the request holding the key finishes
+_in_flight = {}
+# Returned by _claim when another worker still holds the key
+_IN_PROGRESS = object()
+
+def _applies(method: str, path: str) -> bool:
+    return any(method == route_method and pattern.fullmatch(path) for route_method, pattern in IDEMPOTENT_ROUTES)
+
+def _fingerprint(request: Request, body: bytes) -> str:
+    digest = hashlib.sha256(f"{request.method} {request.url.path}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+def _error(status_code: int, detail: str, outcome: str, headers: dict = None):
+    idempotency_requests.inc(outcome)
+    return JSONResponse(status_code=status_code, content={"detail": detail}, headers=headers)
+
+def _in_progress():
+    return _error(409, "A request with this Idempotency-Key is still in progress", "in_progress", {"Retry-After": "1"})
+
+def _replay(stored: StoredResponse, fingerprint: str):
+    if stored.fingerprint != fingerprint:
+        return _error(422, "This Idempotency-Key was already used for a different request", "mismatch")
+    idempotency_requests.inc("replayed")
+    response = stored.to_response()
+    response.headers[REPLAYED_HEADER] = "true"
+    return response
+
+# ============ SHARED STORE ============
+async def _claim(slot: tuple, fingerprint: str):
+    # None once this request holds the key; otherwise the original's stored response,
+    # or _IN_PROGRESS if it is still running elsewhere after IDEMPOTENCY_WAIT_SECONDS
+    subject, key = slot
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            stmt = conflict_insert(db, IdempotencyKey)
+            stmt = stmt.on_conflict_do_nothing() if stmt is not None else insert(IdempotencyKey).prefix_with("IGNORE")
+            result = await db.execute(stmt.values(
+                subject=subject,
+                key=key,
+                fingerprint=fingerprint,
+                created_at=now,
+                expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+            ))
+            await db.commit()
+            if result.rowcount:
+                return None
+            row = (await db.execute(
+                select(IdempotencyKey).where(IdempotencyKey.subject == subject, IdempotencyKey.key == key)
+            )).scalar_one_or_none()
+            if row is not None and row.expires_at <= now:
+                await db.execute(delete(IdempotencyKey).where(
+                    IdempotencyKey.subject == subject, IdempotencyKey.key == key, IdempotencyKey.expires_at <= now
+                ))
+                await db.commit()
+                continue
+            if row is not None and row.status_code is not None:
+                return StoredResponse(row.fingerprint, row.status_code, json.loads(row.headers), row.body)
+        # Released (the original failed) or still running: try again shortly
+        if row is not None and time.monotonic() >= deadline:
+            return _IN_PROGRESS
+        await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+async def _finish(slot: tuple, stored: StoredResponse = None):
+    # Saves the response for replay, or releases the key so a retry runs the request again
+    subject, key = slot
+    where = (IdempotencyKey.subject == subject, IdempotencyKey.key == key)
+    async with AsyncSessionLocal() as db:
+        if stored is None:
+            await db.execute(delete(IdempotencyKey).where(*where))
+        else:
+            await db.execute(update(IdempotencyKey).where(*where).values(
+                status_code=stored.status_code,
+                headers=json.dumps(stored.headers),
+                body=stored.body
+            ))
+        # Expired keys are dropped as new ones are written (ix_idempotency_keys_expires_at)
+        await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow()))
+        await db.commit()
+
+# ============ MIDDLEWARE ============
+async def idempotent(request: Request, call_next):
+    key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+    if not key or not _applies(request.method, request.url.path):
+        return await call_next(request)
+    subject = bearer_subject(request)
+    if subject is None:
+        return await call_next(request)  # the route rejects it
+    if len(key) > MAX_KEY_LENGTH:
+        return _error(400, f"{IDEMPOTENCY_KEY_HEADER} is limited to {MAX_KEY_LENGTH} characters", "invalid")
+    fingerprint = _fingerprint(request, await request.body())
+    slot = (subject, key)
+
+    # Duplicates in this worker wait for the original and replay its response; if it
+    # was not kept (e.g. a 5xx) the first of them runs the request again
+    while True:
+        stored = responses.get(slot)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+        original = _in_flight.get(slot)
+        if original is None:
+            break
+        try:
+            await asyncio.wait_for(asyncio.shield(original), IDEMPOTENCY_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            return _in_progress()
+
+    done = _in_flight[slot] = asyncio.get_running_loop().create_future()
+    claimed = False
+    try:
+        if IDEMPOTENCY_DB_ENABLED:
+            with uncounted():
+                stored = await _claim(slot, fingerprint)
+            if stored is _IN_PROGRESS:
+                return _in_progress()
+            if stored is not None:
+                responses.set(slot, stored)
+                return _replay(stored, fingerprint)
+            claimed = True
+
+        response = await call_next(request)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        headers = [
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in response.raw_headers if name.lower() not in SKIPPED_HEADERS
+        ]
+        stored = StoredResponse(fingerprint, response.status_code, headers, body)
+        keep = stored.status_code < 500 and stored.status_code not in UNSTORED_STATUSES
+        if keep:
+            responses.set(slot, stored)
+        if claimed:
+            with uncounted():
+                await _finish(slot, stored if keep else None)
+            claimed = False
+        idempotency_requests.inc("stored" if keep else "not_stored")
+        return stored.to_response()
+    finally:
+        del _in_flight[slot]
+        done.set_result(None)
+        if claimed:
+            # The request failed before a response: release the key for the retry
+            with uncounted():
+                await _finish(slot)
+
+def install(app):
+    app.middleware("http")(idempotent)
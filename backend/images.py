@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from fastapi.staticfiles import StaticFiles
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional: without it uploads are stored but not resized
+    Image = None
+
+IMAGE_DIR = "static/images/services"
+THUMBNAIL_DIR = f"{IMAGE_DIR}/thumbs"
+IMAGE_URL_PREFIX = "/static/images/services"
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(5 * 1024 * 1024)))
+# Multipart framing (boundaries, part headers, other fields) on top of the file itself
+MAX_UPLOAD_REQUEST_BYTES = MAX_UPLOAD_BYTES + 64 * 1024
+UPLOAD_CHUNK_SIZE = 256 * 1024
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+# Leading bytes of each allowed format; the stored extension follows the content
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+]
+THUMBNAIL_WIDTHS = [int(w) for w in os.getenv("THUMBNAIL_WIDTHS", "320,640").split(",") if w.strip()]
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Uploaded files are named by the SHA-256 of their content
+CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{64}(_\d+)?\.[a-z]+$")
+
+# ============ VARIANTS (run in worker processes) ============
+def thumbnail_path(digest: str, width: int) -> str:
+    return f"{THUMBNAIL_DIR}/{digest}_{width}.webp"
+
+def make_variants(source_path: str, digest: str, widths: list) -> list:
+    created = []
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    with Image.open(source_path) as image:
+        image.load()
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        for width in widths:
+            target = thumbnail_path(digest, width)
+            if os.path.exists(target):
+                continue
+            variant = image.copy()
+            if variant.width > width:
+                variant.thumbnail((width, round(variant.height * width / variant.width)))
+            tmp_target = f"{target}.{os.getpid()}.tmp"
+            variant.save(tmp_target, format="WEBP", quality=80, method=4)
+            os.replace(tmp_target, target)
+            created.append(target)
+    return created
+
+def thumbnail_url(image_url: str, width: int = None):
+    # URL of the resized WebP variant of a content-addressed upload once it has been
+    # written; image_url itself until then, or when no variant will ever exist
+    if not image_url or not THUMBNAIL_WIDTHS:
+        return image_url
+    filename = image_url.rsplit("/", 1)[-1]
+    if not image_url.startswith(IMAGE_URL_PREFIX + "/") or not CONTENT_ADDRESSED.match(filename):
+        return image_url
+    digest = filename.split(".", 1)[0]
+    width = width or THUMBNAIL_WIDTHS[0]
+    if not os.path.exists(thumbnail_path(digest, width)):
+        return image_url
+    return f"{IMAGE_URL_PREFIX}/thumbs/{digest}_{width}.webp"
+
+def sniff_extension(head: bytes):
+    # Extension of the image format the leading bytes belong to, None if not an allowed image
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    return None
+
+# ============ UPLOADS ============
+def _write_chunk(handle, hasher, chunk: bytes):
+    hasher.update(chunk)
+    handle.write(chunk)
+
+class ImageStore:
+    def __init__(self, workers: int = IMAGE_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._pending = set()
+
+    async def save(self, file: UploadFile) -> dict:
+        ext = os.path.splitext(file.filename or "")[1].lower()
+        if ext == ".jpeg":
+            ext = ".jpg"
+        if ext not in ALLOWED_EXTENSIONS:
+            raise HTTPException(status_code=400, detail=f"Unsupported image type, allowed: {', '.join(sorted(ALLOWED_EXTENSIONS))}")
+
+        # Stream into a temp file on the same filesystem so the final rename is atomic
+        await run_in_threadpool(os.makedirs, IMAGE_DIR, exist_ok=True)
+        handle = await run_in_threadpool(tempfile.NamedTemporaryFile, dir=IMAGE_DIR, suffix=".part", delete=False)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if size == 0:
+                    ext = sniff_extension(chunk)
+                    if ext is None:
+                        raise HTTPException(status_code=400, detail="File is not a JPEG, PNG, GIF or WebP image")
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Image exceeds {MAX_UPLOAD_BYTES} bytes")
+                await run_in_threadpool(_write_chunk, handle, hasher, chunk)
+            if size == 0:
+                raise HTTPException(status_code=400, detail="Empty file")
+            await run_in_threadpool(handle.close)
+        except BaseException:
+            await run_in_threadpool(handle.close)
+            await run_in_threadpool(os.remove, handle.name)
+            raise
+
+        digest = hasher.hexdigest()
+        filename = f"{digest}{ext}"
+        path = f"{IMAGE_DIR}/{filename}"
+        if os.path.exists(path):
+            # Same bytes already stored: drop the duplicate
+            await run_in_threadpool(os.remove, handle.name)
+        else:
+            await run_in_threadpool(os.replace, handle.name, path)
+
+        self._schedule_variants(path, digest)
+        image_url = f"{IMAGE_URL_PREFIX}/{filename}"
+        # Variants still being generated fall back to image_url
+        return {
+            "image_url": image_url,
+            "size": size,
+            "variants": {
+                str(width): thumbnail_url(image_url, width)
+                for width in THUMBNAIL_WIDTHS
+            } if Image is not None else {},
+        }
+
+    def _schedule_variants(self, path: str, digest: str):
+        if Image is None or not THUMBNAIL_WIDTHS:
+            return
+        if all(os.path.exists(thumbnail_path(digest, width)) for width in THUMBNAIL_WIDTHS):
+            return
+        task = asyncio.create_task(self._make_variants(path, digest))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _make_variants(self, path: str, digest: str):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=max(self.workers, 1),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, make_variants, path, digest, THUMBNAIL_WIDTHS
+            )
+        except Exception as exc:
+            print(f"⚠️ Could not create image variants for {path}: {exc}")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+image_store = ImageStore()
+
+# ============ REQUEST SIZE ============
+async def limit_upload_size(request: Request, call_next):
+    # Multipart bodies are spooled to disk while the form is parsed, before any route
+    # code runs: bound them by Content-Length (which the server enforces) up front
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        length = request.headers.get("content-length")
+        if length is None or not length.isdigit():
+            return JSONResponse(status_code=411, content={"detail": "Uploads need a Content-Length"})
+        if int(length) > MAX_UPLOAD_REQUEST_BYTES:
+            return JSONResponse(status_code=413, content={"detail": f"Image exceeds {MAX_UPLOAD_BYTES} bytes"})
+    return await call_next(request)
+
+def install(app):
+    app.middleware("http")(limit_upload_size)
+
+# ============ STATIC FILES ============
+class CachedStaticFiles(StaticFiles):
+    # Content-addressed files never change, so browsers and CDNs may cache them forever
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if CONTENT_ADDRESSED.match(os.path.basename(full_path)):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
@@ -1,35 +1,76 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Request, Response, Query
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from datetime import datetime, timedelta
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta, date
+from typing import List, Dict, Optional
+import json
 import os
-import shutil
-import uuid
 
-from database import get_db, engine
-from models import User, Service, Booking, Base, UserRole, BookingStatus, PaymentStatus
+from database import get_async_db, async_engine, replica_engine
+from migrations import pending_migrations
+from models import User, Service, Booking, BookingArchive, UserRole, BookingStatus, PaymentStatus
 from schemas import (
-    UserCreate, UserLogin, UserResponse, Token,
-    ServiceCreate, ServiceUpdate, ServiceResponse,
-    BookingCreate, BookingResponse, BookingAdminResponse,
-    DashboardStats
+    UserCreate, UserLogin, UserResponse, UserAdminUpdate, UserPrincipal, Token,
+    ServiceCreate, ServiceUpdate, ServiceResponse, ServiceImportResult,
+    BookingCreate, BookingResponse, BookingAdminResponse, BookingBulkStatusUpdate, BookingBulkStatusResult,
+    DashboardStats, CacheStats, SlotAvailability, AnalyticsRow, StreamTicket
+)
+from outbox import enqueue_email, outbox_worker
+from cache import CatalogCache
+from pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER,
+    after_created_desc, after_id_asc, split_page
+)
+from payments import payment_processor
+from scheduler import booking_scheduler
+from archive import booking_archiver
+from stats import read_dashboard_stats, reconcile_booking_stats
+from slots import (
+    MAX_AVAILABILITY_DAYS, normalize_time_slot,
+    reserve_slot, release_slot, resize_slots, ensure_inventory, get_availability
+)
+from hashing import password_hasher
+from images import image_store, CachedStaticFiles, install as install_upload_limit
+from projections import dumps, service_list_query, service_rows, booking_list_query, booking_rows, booking_version_query
+from conditional import etag_matches, make_etag, not_modified, validator_headers
+from querybudget import statement_budget, install as install_query_budget
+from metrics import registry as metrics_registry, slow_query_log, install as install_metrics
+from search import search_catalog, search_index
+from admission import install as install_admission
+from idempotency import REPLAYED_HEADER, install as install_idempotency
+from compression import install as install_compression
+from events import ADMIN_TOPIC, booking_event, event_stream, publish_booking_events, user_topic
+from analytics import analytics_range, parse_group_by, read_analytics
+from bulk import parse_service_import, import_services, bulk_booking_query, change_booking_status
+from replica import (
+    REPLICA_ENABLED, LAST_WRITE_HEADER,
+    get_read_db, get_user_read_db, read_session, within_window, note_write
 )
 from auth import (
-    get_password_hash,
-    verify_password,
+    STREAM_TICKET_SECONDS,
     create_access_token,
+    create_stream_ticket,
     get_current_user,
-    get_current_admin
+    get_current_admin,
+    get_stream_user,
+    invalidate_user,
+    principal_cache
 )
 
-# Initialize database
-Base.metadata.create_all(bind=engine)
-
 app = FastAPI(title="Wellness Booking Platform API", version="1.0.0")
 
+# Rate limits (429) and load shedding (503); added before CORS so rejections still carry CORS headers
+install_admission(app)
+# Idempotency-Key replays for booking creation and payment retry; outside admission so replays are not rate limited
+install_idempotency(app)
+# Oversized uploads are refused on Content-Length, before the multipart body is spooled
+install_upload_limit(app)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -37,149 +78,100 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, LAST_WRITE_HEADER, REPLAYED_HEADER, "Retry-After"],
 )
 
-# Static files
-os.makedirs("static/images/services", exist_ok=True)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Per-request SQL statement counting, enabled with QUERY_BUDGET_MODE=warn|raise
+install_query_budget(app, async_engine, replica_engine)
+# Request latency, per-route SQL time and pool wait, served at /api/admin/metrics
+install_metrics(app, {"primary": async_engine, "replica": replica_engine} if REPLICA_ENABLED else {"primary": async_engine})
+# gzip/br for JSON and text bodies over COMPRESSION_MIN_SIZE; outermost, so it encodes final bodies
+install_compression(app)
 
-# Mock Payment Service
-def mock_payment_gateway(amount: float):
-    import random
-    payment_id = f"PAY_{uuid.uuid4().hex[:12].upper()}"
-    success = random.choice([True, True, True, False])  # 75% success rate
-    return {
-        "status": PaymentStatus.SUCCESS if success else PaymentStatus.FAILED,
-        "payment_id": payment_id,
-        "message": "Payment successful" if success else "Payment failed"
-    }
+# Catalog reads are served from pre-serialized JSON; admin writes invalidate it
+catalog_cache = CatalogCache(
+    maxsize=int(os.getenv("CATALOG_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("CATALOG_CACHE_TTL", "300"))
+)
+
+async def get_catalog_db():
+    # Catalog reads go to the replica, except refills right after an admin write:
+    # caching a lagging replica's rows would keep them stale for the whole TTL
+    async with read_session(within_window(catalog_cache.invalidated_at)) as db:
+        yield db
 
-# Mock Email Service
-def send_email(to: str, subject: str, body: str):
-    print(f"\n📧 MOCK EMAIL SENT")
-    print(f"To: {to}")
-    print(f"Subject: {subject}")
-    print(f"Body: {body}\n")
+# The in-memory search index (non-Postgres backends) reloads services the cache invalidates
+catalog_cache.watch(search_index.on_catalog_event)
 
-# Initialize Admin Account & Sample Services
+# Static files
+os.makedirs("static/images/services", exist_ok=True)
+app.mount("/static", CachedStaticFiles(directory="static"), name="static")
+
+# Schema, seed data and derived tables come from `python manage.py bootstrap`, run once per deploy
 @app.on_event("startup")
 async def startup_event():
-    db = next(get_db())
-    
-    # Create admin if not exists
-    admin = db.query(User).filter(User.email == "admin@wellness.com").first()
-    if not admin:
-        admin = User(
-            email="admin@wellness.com",
-            username="admin",
-            hashed_password=get_password_hash("Admin@123"),
-            full_name="System Administrator",
-            role=UserRole.ADMIN,
-            is_active=True
-        )
-        db.add(admin)
-        db.commit()
-        print("✅ Admin account created: admin@wellness.com / Admin@123")
-    
-    # Create sample services if none exist
-    services_count = db.query(Service).count()
-    if services_count == 0:
-        sample_services = [
-            Service(
-                title="Morning Yoga Flow",
-                category="Yoga Therapy",
-                description="Start your day with energizing yoga poses and breathing exercises to improve flexibility and mental clarity",
-                price=999.0,
-                duration_minutes=60,
-                expert_name="Dr. Sarah Johnson",
-                is_active=True
-            ),
-            Service(
-                title="Personalized Diet Plan",
-                category="Nutrition Consultation",
-                description="Get a customized nutrition plan based on your health goals, lifestyle, and dietary preferences",
-                price=1499.0,
-                duration_minutes=45,
-                expert_name="Nutritionist Mike Chen",
-                is_active=True
-            ),
-            Service(
-                title="Stress Management Workshop",
-                category="Mental Wellness Workshop",
-                description="Learn evidence-based techniques to manage stress, anxiety, and improve overall mental well-being",
-                price=799.0,
-                duration_minutes=90,
-                expert_name="Dr. Emily Roberts",
-                is_active=True
-            ),
-            Service(
-                title="Expert Wellness Consultation",
-                category="One-on-One Expert Call",
-                description="Private one-on-one consultation with experienced wellness experts for personalized guidance",
-                price=599.0,
-                duration_minutes=30,
-                expert_name="Various Experts",
-                is_active=True
-            ),
-            Service(
-                title="Guided Meditation Session",
-                category="Meditation & Mindfulness",
-                description="Deep relaxation through guided meditation practices to reduce stress and enhance mindfulness",
-                price=499.0,
-                duration_minutes=45,
-                expert_name="Master Li Wei",
-                is_active=True
-            ),
-            Service(
-                title="HIIT Workout Training",
-                category="Fitness Training",
-                description="High-intensity interval training designed for fitness enthusiasts to build strength and endurance",
-                price=899.0,
-                duration_minutes=60,
-                expert_name="Coach David Martinez",
-                is_active=True
-            )
-        ]
-        for service in sample_services:
-            db.add(service)
-        db.commit()
-        print("✅ 6 Sample services created successfully")
+    async with async_engine.connect() as conn:
+        pending = await conn.run_sync(pending_migrations)
+    if pending:
+        print(f"⚠️ {len(pending)} database migration(s) pending, run: python manage.py migrate")
+    outbox_worker.start()
+    payment_processor.start()
+    booking_scheduler.start()
+    booking_archiver.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await booking_archiver.stop()
+    await booking_scheduler.stop()
+    await payment_processor.stop()
+    await outbox_worker.stop()
+    password_hasher.shutdown()
+    image_store.shutdown()
 
 # ============ AUTH ROUTES ============
 @app.post("/api/auth/register", response_model=UserResponse, status_code=201)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == user.email).first():
+@statement_budget(5)
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    if (await db.execute(select(User.id).where(User.email == user.email))).first():
         raise HTTPException(status_code=400, detail="Email already registered")
-    if db.query(User).filter(User.username == user.username).first():
+    if (await db.execute(select(User.id).where(User.username == user.username))).first():
         raise HTTPException(status_code=400, detail="Username already taken")
     
     db_user = User(
         email=user.email,
         username=user.username,
-        hashed_password=get_password_hash(user.password),
+        hashed_password=await password_hasher.hash(user.password),
         full_name=user.full_name,
         phone=user.phone,
         role=UserRole.USER
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    
-    send_email(
+    enqueue_email(
+        db,
         user.email,
         "Welcome to Wellness Platform!",
         f"Hi {user.full_name or user.username}, welcome to our wellness community!"
     )
+    await db.commit()
+    await db.refresh(db_user)
     
     return db_user
 
 @app.post("/api/auth/login", response_model=Token)
-def login(credentials: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == credentials.email).first()
-    if not user or not verify_password(credentials.password, user.hashed_password):
+@statement_budget(2)
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(User).where(User.email == credentials.email))).scalar_one_or_none()
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    valid, new_hash = await password_hasher.verify_and_update(credentials.password, user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Account is inactive")
+    if new_hash:
+        # BCRYPT_ROUNDS changed since this hash was made
+        user.hashed_password = new_hash
+        await db.commit()
     
     access_token = create_access_token(data={"sub": user.email})
     return {
@@ -189,155 +181,287 @@ def login(credentials: UserLogin, db: Session = Depends(get_db)):
     }
 
 @app.get("/api/auth/me", response_model=UserResponse)
-async def get_me(current_user: User = Depends(get_current_user)):
+@statement_budget(1)
+async def get_me(current_user: UserPrincipal = Depends(get_current_user)):
     return current_user
 
 # ============ SERVICE ROUTES ============
 @app.get("/api/services", response_model=List[ServiceResponse])
-def get_services(
+@statement_budget(1)
+async def get_services(
+    request: Request,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
     category: str = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_catalog_db)
+):
+    # cursor (keyset on id) supersedes skip
+    key = ("list", category or None, 0 if cursor else skip, limit, cursor)
+    cached = catalog_cache.get(key)
+    if cached is None:
+        version = catalog_cache.version
+        query = service_list_query().where(Service.is_active == True)
+        if category:
+            query = query.where(Service.category == category)
+        if cursor:
+            query = after_id_asc(query, Service.id, cursor)
+        else:
+            query = query.offset(skip)
+        result = await db.execute(query.order_by(Service.id).limit(limit + 1))
+        rows, next_cursor = split_page(result.all(), limit, lambda s: (s.id,))
+        body = dumps(service_rows(rows))
+        entry = (body, next_cursor)
+        etag = catalog_cache.set(key, entry, version)
+    else:
+        entry, etag = cached
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    body, next_cursor = entry
+    headers = validator_headers(etag)
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Declared before /api/services/{service_id} so "search" is not taken for an id
+@app.get("/api/services/search", response_model=List[ServiceResponse])
+@statement_budget(1)
+async def search_services(
+    q: str = Query(..., min_length=1, max_length=200),
+    category: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_catalog_db)
 ):
-    query = db.query(Service).filter(Service.is_active == True)
-    if category:
-        query = query.filter(Service.category == category)
-    return query.offset(skip).limit(limit).all()
+    # Ranked match over title, category, expert and description; words may be typed partially
+    results = await search_catalog(db, q, limit, category)
+    return Response(content=dumps(results), media_type="application/json")
 
 @app.get("/api/services/{service_id}", response_model=ServiceResponse)
-def get_service(service_id: int, db: Session = Depends(get_db)):
-    service = db.query(Service).filter(Service.id == service_id).first()
-    if not service:
+@statement_budget(1)
+async def get_service(service_id: int, request: Request, db: AsyncSession = Depends(get_catalog_db)):
+    key = ("service", service_id)
+    cached = catalog_cache.get(key)
+    if cached is None:
+        version = catalog_cache.version
+        service = await db.get(Service, service_id)
+        if not service:
+            raise HTTPException(status_code=404, detail="Service not found")
+        body = ServiceResponse.model_validate(service).model_dump_json().encode()
+        etag = catalog_cache.set(key, body, version)
+    else:
+        body, etag = cached
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    return Response(content=body, media_type="application/json", headers=validator_headers(etag))
+
+@app.get("/api/services/{service_id}/availability", response_model=List[SlotAvailability])
+@statement_budget(2)
+async def get_service_availability(
+    service_id: int,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    service = await db.get(Service, service_id)
+    if not service or not service.is_active:
         raise HTTPException(status_code=404, detail="Service not found")
-    return service
+    
+    date_from = date_from or date.today()
+    date_to = date_to or date_from + timedelta(days=6)
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (date_to - date_from).days >= MAX_AVAILABILITY_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_AVAILABILITY_DAYS} days")
+    return await get_availability(db, service, date_from, date_to)
 
 @app.get("/api/services/category/list")
-def get_categories(db: Session = Depends(get_db)):
-    categories = db.query(Service.category).distinct().all()
-    return {"categories": [cat[0] for cat in categories]}
+@statement_budget(1)
+async def get_categories(request: Request, db: AsyncSession = Depends(get_catalog_db)):
+    key = ("categories",)
+    cached = catalog_cache.get(key)
+    if cached is None:
+        version = catalog_cache.version
+        categories = (await db.execute(select(Service.category).distinct())).all()
+        body = json.dumps({"categories": [cat[0] for cat in categories]}).encode()
+        etag = catalog_cache.set(key, body, version)
+    else:
+        body, etag = cached
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    return Response(content=body, media_type="application/json", headers=validator_headers(etag))
 
 # ============ BOOKING ROUTES ============
+# A slot without an inventory row yet costs two extra statements (insert, retried increment)
 @app.post("/api/bookings", response_model=BookingResponse, status_code=201)
+@statement_budget(9)
 async def create_booking(
     booking: BookingCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    service = db.query(Service).filter(Service.id == booking.service_id).first()
+    service = await db.get(Service, booking.service_id)
     if not service or not service.is_active:
         raise HTTPException(status_code=404, detail="Service not found")
     
     booking_datetime = datetime.strptime(booking.booking_date, "%Y-%m-%d")
+    time_slot = normalize_time_slot(booking.time_slot)
+    if time_slot is None:
+        raise HTTPException(status_code=400, detail="Invalid time slot")
     
-    # Check duplicate booking
-    existing = db.query(Booking).filter(
-        and_(
-            Booking.user_id == current_user.id,
-            Booking.service_id == booking.service_id,
-            Booking.booking_date == booking_datetime,
-            Booking.time_slot == booking.time_slot,
-            Booking.status != BookingStatus.CANCELLED
-        )
-    ).first()
-    
-    if existing:
-        raise HTTPException(status_code=400, detail="You already have a booking for this service at this time")
+    # Reserve capacity first; the slot row serializes concurrent bookings
+    if not await reserve_slot(db, service, booking_datetime.date(), time_slot):
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="This time slot is fully booked")
     
     # Create booking
     new_booking = Booking(
         user_id=current_user.id,
         service_id=service.id,
         booking_date=booking_datetime,
-        time_slot=booking.time_slot,
+        time_slot=time_slot,
         total_amount=service.price,
         notes=booking.notes,
         status=BookingStatus.PENDING,
         payment_status=PaymentStatus.PENDING
     )
     db.add(new_booking)
-    db.commit()
-    db.refresh(new_booking)
-    
-    # Mock Payment
-    payment_result = mock_payment_gateway(service.price)
-    new_booking.payment_status = payment_result["status"]
-    new_booking.payment_id = payment_result["payment_id"]
-    
-    if payment_result["status"] == PaymentStatus.SUCCESS:
-        new_booking.status = BookingStatus.CONFIRMED
-        send_email(
-            current_user.email,
-            "Booking Confirmed!",
-            f"Your booking for {service.title} on {booking.booking_date} at {booking.time_slot} is confirmed! Payment ID: {payment_result['payment_id']}"
-        )
-    else:
-        send_email(
-            current_user.email,
-            "Payment Failed",
-            f"Payment for {service.title} failed. Please retry from your bookings page."
-        )
+    try:
+        # uq_bookings_active_user_slot rejects duplicates atomically
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="You already have a booking for this service at this time")
+    new_booking = (await db.execute(
+        select(Booking).options(joinedload(Booking.service)).where(Booking.id == new_booking.id)
+        .execution_options(populate_existing=True)
+    )).scalar_one()
     
-    db.commit()
-    db.refresh(new_booking)
+    # Payment runs in the background; clients poll GET /api/bookings/{id} for the result
+    payment_processor.submit(new_booking.id)
+    note_write(response, current_user.id)
     return new_booking
 
+def filter_bookings(query, status: Optional[BookingStatus], date_from: Optional[date], date_to: Optional[date], model=Booking):
+    if status:
+        query = query.where(model.status == status)
+    if date_from:
+        query = query.where(model.booking_date >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        query = query.where(model.booking_date < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    return query
+
 @app.get("/api/bookings/my", response_model=List[BookingResponse])
+@statement_budget(3)
 async def get_my_bookings(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    status: Optional[BookingStatus] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_user_read_db)
 ):
-    return db.query(Booking).filter(Booking.user_id == current_user.id).order_by(Booking.created_at.desc()).all()
+    # The frontend polls this while payments settle: an unchanged version answers 304
+    # before the list query runs
+    etag = make_etag("b", current_user.id, *(await db.execute(booking_version_query(current_user.id))).one())
+    if etag_matches(request, etag):
+        return not_modified(etag, private=True)
+    query = booking_list_query().where(Booking.user_id == current_user.id)
+    query = filter_bookings(query, status, date_from, date_to)
+    query = after_created_desc(query, Booking.created_at, Booking.id, cursor)
+    result = await db.execute(
+        query.order_by(Booking.created_at.desc(), Booking.id.desc()).limit(limit + 1)
+    )
+    rows, next_cursor = split_page(result.all(), limit, lambda b: (b.created_at, b.id))
+    headers = validator_headers(etag, private=True)
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    return Response(content=dumps(booking_rows(rows)), media_type="application/json", headers=headers)
 
-@app.post("/api/bookings/{booking_id}/retry-payment", response_model=BookingResponse)
+@app.get("/api/bookings/{booking_id}", response_model=BookingResponse)
+@statement_budget(2)
+async def get_booking(
+    booking_id: int,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    booking = (await db.execute(select(Booking).options(joinedload(Booking.service)).where(
+        Booking.id == booking_id,
+        Booking.user_id == current_user.id
+    ))).scalar_one_or_none()
+    
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    return booking
+
+@app.post("/api/bookings/{booking_id}/retry-payment", response_model=BookingResponse, status_code=202)
+@statement_budget(4)
 async def retry_payment(
     booking_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    booking = db.query(Booking).filter(
+    booking = (await db.execute(select(Booking).where(
         Booking.id == booking_id,
         Booking.user_id == current_user.id
-    ).first()
+    ))).scalar_one_or_none()
     
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
     if booking.payment_status == PaymentStatus.SUCCESS:
         raise HTTPException(status_code=400, detail="Payment already successful")
+    if booking.status == BookingStatus.CANCELLED:
+        raise HTTPException(status_code=400, detail="Booking is cancelled")
     
-    payment_result = mock_payment_gateway(booking.total_amount)
-    booking.payment_status = payment_result["status"]
-    booking.payment_id = payment_result["payment_id"]
-    
-    if payment_result["status"] == PaymentStatus.SUCCESS:
-        booking.status = BookingStatus.CONFIRMED
-        send_email(
-            current_user.email,
-            "Payment Successful!",
-            f"Your payment for booking #{booking.id} is now confirmed! Payment ID: {payment_result['payment_id']}"
-        )
+    # Only a FAILED payment can go back to the queue; PENDING/PROCESSING are already in flight
+    requeued = await db.execute(
+        update(Booking)
+        .where(Booking.id == booking.id, Booking.payment_status == PaymentStatus.FAILED)
+        .values(payment_status=PaymentStatus.PENDING, payment_updated_at=datetime.utcnow(), version=Booking.version + 1)
+    )
+    if requeued.rowcount != 1:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Payment is already being processed")
+    await db.commit()
+    # The checks above only needed the booking row; the response also carries its service
+    booking = (await db.execute(
+        select(Booking).options(joinedload(Booking.service)).where(Booking.id == booking.id)
+        .execution_options(populate_existing=True)
+    )).scalar_one()
     
-    db.commit()
-    db.refresh(booking)
+    payment_processor.submit(booking.id)
+    publish_booking_events([booking_event(booking, booking.status, PaymentStatus.FAILED)])
+    note_write(response, current_user.id)
     return booking
 
 @app.delete("/api/bookings/{booking_id}")
+@statement_budget(7)
 async def cancel_booking(
     booking_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    booking = db.query(Booking).filter(
-        Booking.id == booking_id,
-        Booking.user_id == current_user.id
-    ).first()
+    # Only the service title is needed, for the cancellation email
+    booking = (await db.execute(
+        select(Booking)
+        .options(joinedload(Booking.service).load_only(Service.title))
+        .where(Booking.id == booking_id, Booking.user_id == current_user.id)
+    )).scalar_one_or_none()
     
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
     if booking.status == BookingStatus.CANCELLED:
         raise HTTPException(status_code=400, detail="Booking already cancelled")
+    # The payment worker owns the booking until the gateway answers; a claim made after
+    # this check bumps version and turns the commit below into a 409 as well
+    if booking.payment_status == PaymentStatus.PROCESSING:
+        raise HTTPException(status_code=409, detail="Payment is being processed, please retry shortly", headers={"Retry-After": "5"})
     
     # Check 24-hour cancellation policy
     time_until_booking = booking.booking_date - datetime.utcnow()
@@ -346,112 +470,291 @@ async def cancel_booking(
     
     booking.status = BookingStatus.CANCELLED
     booking.cancelled_at = datetime.utcnow()
-    db.commit()
-    
-    send_email(
+    await release_slot(db, booking.service_id, booking.booking_date, booking.time_slot)
+    enqueue_email(
+        db,
         current_user.email,
         "Booking Cancelled",
         f"Your booking #{booking.id} for {booking.service.title} has been cancelled successfully."
     )
+    try:
+        await db.commit()
+    except StaleDataError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Booking was updated concurrently, please retry")
     
+    note_write(response, current_user.id)
     return {"message": "Booking cancelled successfully"}
 
+# ============ EVENT STREAM ============
+@app.post("/api/events/ticket", response_model=StreamTicket)
+@statement_budget(1)
+async def create_event_ticket(current_user: UserPrincipal = Depends(get_current_user)):
+    # Short-lived credential for ?ticket=, so the bearer token never goes into a URL
+    return {"ticket": create_stream_ticket(current_user.email), "expires_in": STREAM_TICKET_SECONDS}
+
+@app.get("/api/events")
+@statement_budget(1)
+async def stream_events(
+    request: Request,
+    last_event_id: Optional[str] = None,
+    current_user: UserPrincipal = Depends(get_stream_user)
+):
+    # Server-Sent Events replacing polling: "booking" events for the user's own bookings,
+    # or for every booking for admins. Reconnects resume from Last-Event-ID, or from
+    # ?last_event_id= when the client reconnects itself with a new ticket.
+    topics = [ADMIN_TOPIC] if current_user.role == UserRole.ADMIN else [user_topic(current_user.id)]
+    return event_stream(topics, request.headers.get("last-event-id") or last_event_id)
+
 # ============ ADMIN ROUTES ============
 @app.get("/api/admin/dashboard", response_model=DashboardStats)
+@statement_budget(2)
 async def get_dashboard_stats(
-    current_admin: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_admin: UserPrincipal = Depends(get_current_admin),
+    read_db: AsyncSession = Depends(get_read_db),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    total_users = db.query(func.count(User.id)).filter(User.role == UserRole.USER).scalar()
-    total_bookings = db.query(func.count(Booking.id)).scalar()
-    total_revenue = db.query(func.sum(Booking.total_amount)).filter(
-        Booking.payment_status == PaymentStatus.SUCCESS
-    ).scalar() or 0
-    
-    pending = db.query(func.count(Booking.id)).filter(Booking.status == BookingStatus.PENDING).scalar()
-    confirmed = db.query(func.count(Booking.id)).filter(Booking.status == BookingStatus.CONFIRMED).scalar()
-    cancelled = db.query(func.count(Booking.id)).filter(Booking.status == BookingStatus.CANCELLED).scalar()
-    
-    return {
-        "total_users": total_users,
-        "total_bookings": total_bookings,
-        "total_revenue": total_revenue,
-        "pending_bookings": pending,
-        "confirmed_bookings": confirmed,
-        "cancelled_bookings": cancelled
-    }
+    # O(1): reads the booking_stats counters maintained on every booking write
+    stats = await read_dashboard_stats(read_db)
+    if stats is None:
+        # Counters not built yet (fresh deploy on existing data)
+        stats = await reconcile_booking_stats(db)
+    # The counters are the version: any booking or user change moves one of them
+    etag = make_etag("d", *stats.values())
+    if etag_matches(request, etag):
+        return not_modified(etag, private=True)
+    return Response(content=dumps(stats), media_type="application/json", headers=validator_headers(etag, private=True))
+
+@app.post("/api/admin/stats/reconcile", response_model=DashboardStats)
+@statement_budget(8)
+async def reconcile_dashboard_stats(
+    current_admin: UserPrincipal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await reconcile_booking_stats(db)
+
+@app.get("/api/admin/analytics", response_model=List[AnalyticsRow], response_model_exclude_none=True)
+@statement_budget(2)
+async def get_analytics(
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    group_by: str = Query("day", description="Comma-separated: day, category, service"),
+    current_admin: UserPrincipal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db)
+):
+    # Booking volume and revenue by the day bookings were made (UTC), served from the daily rollups
+    date_from, date_to = analytics_range(date_from, date_to)
+    return await read_analytics(db, date_from, date_to, parse_group_by(group_by))
 
 @app.get("/api/admin/users", response_model=List[UserResponse])
+@statement_budget(2)
 async def get_all_users(
-    current_admin: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_admin: UserPrincipal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db)
+):
+    query = select(User).where(User.role == UserRole.USER)
+    query = after_created_desc(query, User.created_at, User.id, cursor)
+    result = await db.execute(query.order_by(User.created_at.desc(), User.id.desc()).limit(limit + 1))
+    users, next_cursor = split_page(result.scalars().all(), limit, lambda u: (u.created_at, u.id))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return users
+
+@app.patch("/api/admin/users/{user_id}", response_model=UserResponse)
+@statement_budget(3)
+async def update_user(
+    user_id: int,
+    user_update: UserAdminUpdate,
+    current_admin: UserPrincipal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    return db.query(User).filter(User.role == UserRole.USER).all()
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    for key, value in user_update.dict(exclude_unset=True).items():
+        setattr(user, key, value)
+    
+    await db.commit()
+    await db.refresh(user)
+    invalidate_user(user.id)
+    return user
+
+@app.get("/api/admin/cache/stats", response_model=Dict[str, CacheStats])
+@statement_budget(1)
+async def get_cache_stats(current_admin: UserPrincipal = Depends(get_current_admin)):
+    return {"principals": principal_cache.stats(), "catalog": catalog_cache.stats()}
+
+@app.get("/api/admin/metrics", response_class=PlainTextResponse)
+@statement_budget(1)
+async def get_metrics(current_admin: UserPrincipal = Depends(get_current_admin)):
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/admin/metrics/slow-queries")
+@statement_budget(1)
+async def get_slow_queries(current_admin: UserPrincipal = Depends(get_current_admin)):
+    return list(slow_query_log)
 
 @app.get("/api/admin/bookings", response_model=List[BookingAdminResponse])
+@statement_budget(2)
 async def get_all_bookings(
-    current_admin: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    status: Optional[BookingStatus] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_admin: UserPrincipal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    return db.query(Booking).order_by(Booking.created_at.desc()).all()
+    query = filter_bookings(booking_list_query(include_user=True), status, date_from, date_to)
+    query = after_created_desc(query, Booking.created_at, Booking.id, cursor)
+    result = await db.execute(
+        query.order_by(Booking.created_at.desc(), Booking.id.desc()).limit(limit + 1)
+    )
+    rows, next_cursor = split_page(result.all(), limit, lambda b: (b.created_at, b.id))
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return Response(
+        content=dumps(booking_rows(rows, include_user=True)),
+        media_type="application/json",
+        headers=headers
+    )
+
+@app.get("/api/admin/bookings/archive", response_model=List[BookingAdminResponse])
+@statement_budget(2)
+async def get_archived_bookings(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    status: Optional[BookingStatus] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    user_id: Optional[int] = None,
+    current_admin: UserPrincipal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db)
+):
+    # Past sessions and old cancellations moved out of bookings by archive.py
+    query = booking_list_query(include_user=True, model=BookingArchive)
+    query = filter_bookings(query, status, date_from, date_to, model=BookingArchive)
+    if user_id is not None:
+        query = query.where(BookingArchive.user_id == user_id)
+    query = after_created_desc(query, BookingArchive.created_at, BookingArchive.id, cursor)
+    result = await db.execute(
+        query.order_by(BookingArchive.created_at.desc(), BookingArchive.id.desc()).limit(limit + 1)
+    )
+    rows, next_cursor = split_page(result.all(), limit, lambda b: (b.created_at, b.id))
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return Response(
+        content=dumps(booking_rows(rows, include_user=True)),
+        media_type="application/json",
+        headers=headers
+    )
+
+# No statement budget: bulk routes issue one statement per batch, not per request
+@app.post("/api/admin/bookings/bulk-status", response_model=BookingBulkStatusResult)
+async def bulk_update_booking_status(
+    change: BookingBulkStatusUpdate,
+    current_admin: UserPrincipal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # e.g. cancel every upcoming booking of an expert who left; dry_run only counts matches
+    criteria = change.filter
+    if not criteria.model_dump(exclude_none=True):
+        raise HTTPException(status_code=400, detail="At least one filter criterion is required")
+    query = filter_bookings(bulk_booking_query(), criteria.status, criteria.date_from, criteria.date_to)
+    if criteria.booking_ids is not None:
+        query = query.where(Booking.id.in_(criteria.booking_ids))
+    if criteria.service_id is not None:
+        query = query.where(Booking.service_id == criteria.service_id)
+    if criteria.expert_name is not None:
+        query = query.where(Service.expert_name == criteria.expert_name)
+    if criteria.user_id is not None:
+        query = query.where(Booking.user_id == criteria.user_id)
+    return await change_booking_status(db, query, change.status, change.notify, change.reason, change.dry_run)
 
 @app.post("/api/admin/services", response_model=ServiceResponse, status_code=201)
+@statement_budget(6)
 async def create_service(
     service: ServiceCreate,
-    current_admin: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    current_admin: UserPrincipal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
 ):
     new_service = Service(**service.dict())
     db.add(new_service)
-    db.commit()
-    db.refresh(new_service)
+    await db.flush()
+    await ensure_inventory(db, new_service)
+    await db.commit()
+    await db.refresh(new_service)
+    catalog_cache.invalidate(new_service.id, categories=[new_service.category], categories_changed=True)
     return new_service
 
+@app.post("/api/admin/services/import", response_model=ServiceImportResult)
+async def import_services_bulk(
+    request: Request,
+    current_admin: UserPrincipal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Body is a JSON array or CSV (Content-Type: text/csv); every row is validated
+    # before anything is written, then the whole import commits as one transaction
+    rows = parse_service_import(await request.body(), request.headers.get("content-type", ""))
+    result = await import_services(db, rows)
+    catalog_cache.invalidate_all()
+    return result
+
 @app.put("/api/admin/services/{service_id}", response_model=ServiceResponse)
+@statement_budget(5)
 async def update_service(
     service_id: int,
     service_update: ServiceUpdate,
-    current_admin: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    current_admin: UserPrincipal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    service = db.query(Service).filter(Service.id == service_id).first()
+    service = await db.get(Service, service_id)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
     
+    old_category = service.category
+    old_capacity = service.slot_capacity
     for key, value in service_update.dict(exclude_unset=True).items():
         setattr(service, key, value)
     
-    db.commit()
-    db.refresh(service)
+    if service.slot_capacity != old_capacity:
+        await resize_slots(db, service)
+    await db.commit()
+    await db.refresh(service)
+    catalog_cache.invalidate(
+        service.id,
+        categories=[old_category, service.category],
+        categories_changed=old_category != service.category
+    )
     return service
 
 @app.delete("/api/admin/services/{service_id}")
+@statement_budget(3)
 async def delete_service(
     service_id: int,
-    current_admin: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    current_admin: UserPrincipal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    service = db.query(Service).filter(Service.id == service_id).first()
+    service = await db.get(Service, service_id)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
     
     service.is_active = False
-    db.commit()
+    await db.commit()
+    catalog_cache.invalidate(service.id, categories=[service.category])
     return {"message": "Service deactivated successfully"}
 
 @app.post("/api/admin/upload-image")
+@statement_budget(1)
 async def upload_image(
     file: UploadFile = File(...),
-    current_admin: User = Depends(get_current_admin)
+    current_admin: UserPrincipal = Depends(get_current_admin)
 ):
-    file_ext = os.path.splitext(file.filename)[1]
-    filename = f"{uuid.uuid4().hex}{file_ext}"
-    file_path = f"static/images/services/{filename}"
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    return {"image_url": f"/static/images/services/{filename}"}
+    # Streamed, hashed and stored as <sha256>.<ext>; resized WebP variants follow in the background
+    return await image_store.save(file)
 
 @app.get("/")
 def root():
@@ -459,4 +762,5 @@ def root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Open event streams would otherwise hold a graceful shutdown forever
+    uvicorn.run(app, host="0.0.0.0", port=8000, timeout_graceful_shutdown=10)
\ No newline at end of file
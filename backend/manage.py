@@ -0,0 +1,227 @@
+import argparse
+import asyncio
+import sqlite3
+import sys
+from contextlib import contextmanager
+from datetime import date
+
+from sqlalchemy import func, insert, select, text
+
+from analytics import rebuild_rollups
+from database import engine, async_engine, AsyncSessionLocal, conflict_insert
+from hashing import hash_password
+from migrations import MIGRATIONS, migrate, pending_migrations
+from models import Service, User, UserRole
+
+# Run once per deploy, before starting the API workers:
+#   python manage.py bootstrap   (migrate + seed + derived tables)
+#   python manage.py migrate | seed | status
+
+# Arbitrary application-wide key for pg_advisory_lock / GET_LOCK
+BOOTSTRAP_LOCK_KEY = 727_411_001
+BOOTSTRAP_LOCK_NAME = "wellness_bootstrap"
+
+ADMIN_EMAIL = "admin@wellness.com"
+ADMIN_PASSWORD = "Admin@123"
+
+SAMPLE_SERVICES = [
+    {
+        "title": "Morning Yoga Flow",
+        "category": "Yoga Therapy",
+        "description": "Start your day with energizing yoga poses and breathing exercises to improve flexibility and mental clarity",
+        "price": 999.0,
+        "duration_minutes": 60,
+        "expert_name": "Dr. Sarah Johnson",
+        "slot_capacity": 10,
+    },
+    {
+        "title": "Personalized Diet Plan",
+        "category": "Nutrition Consultation",
+        "description": "Get a customized nutrition plan based on your health goals, lifestyle, and dietary preferences",
+        "price": 1499.0,
+        "duration_minutes": 45,
+        "expert_name": "Nutritionist Mike Chen",
+        "slot_capacity": 1,
+    },
+    {
+        "title": "Stress Management Workshop",
+        "category": "Mental Wellness Workshop",
+        "description": "Learn evidence-based techniques to manage stress, anxiety, and improve overall mental well-being",
+        "price": 799.0,
+        "duration_minutes": 90,
+        "expert_name": "Dr. Emily Roberts",
+        "slot_capacity": 20,
+    },
+    {
+        "title": "Expert Wellness Consultation",
+        "category": "One-on-One Expert Call",
+        "description": "Private one-on-one consultation with experienced wellness experts for personalized guidance",
+        "price": 599.0,
+        "duration_minutes": 30,
+        "expert_name": "Various Experts",
+        "slot_capacity": 1,
+    },
+    {
+        "title": "Guided Meditation Session",
+        "category": "Meditation & Mindfulness",
+        "description": "Deep relaxation through guided meditation practices to reduce stress and enhance mindfulness",
+        "price": 499.0,
+        "duration_minutes": 45,
+        "expert_name": "Master Li Wei",
+        "slot_capacity": 15,
+    },
+    {
+        "title": "HIIT Workout Training",
+        "category": "Fitness Training",
+        "description": "High-intensity interval training designed for fitness enthusiasts to build strength and endurance",
+        "price": 899.0,
+        "duration_minutes": 60,
+        "expert_name": "Coach David Martinez",
+        "slot_capacity": 12,
+    },
+]
+
+# ============ LOCKING ============
+@contextmanager
+def bootstrap_lock():
+    # Serializes concurrent bootstraps (e.g. several containers starting together);
+    # held on its own connection so each migration can still commit independently
+    with engine.connect() as conn:
+        dialect = conn.dialect.name
+        sqlite_lock = None
+        if dialect == "postgresql":
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": BOOTSTRAP_LOCK_KEY})
+        elif dialect == "mysql":
+            conn.execute(text("SELECT GET_LOCK(:name, -1)"), {"name": BOOTSTRAP_LOCK_NAME})
+        elif dialect == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+            # No advisory locks in SQLite: an exclusive transaction on a sibling file serves as one
+            sqlite_lock = sqlite3.connect(f"{engine.url.database}.lock", timeout=600, isolation_level=None)
+            sqlite_lock.execute("BEGIN EXCLUSIVE")
+        conn.commit()
+        try:
+            yield
+        finally:
+            if dialect == "postgresql":
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": BOOTSTRAP_LOCK_KEY})
+            elif dialect == "mysql":
+                conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": BOOTSTRAP_LOCK_NAME})
+            elif sqlite_lock is not None:
+                sqlite_lock.execute("COMMIT")
+                sqlite_lock.close()
+            conn.commit()
+
+# ============ SEEDING ============
+def seed():
+    with engine.begin() as conn:
+        if not conn.execute(select(User.id).where(User.email == ADMIN_EMAIL)).first():
+            # Upsert: the unique email/username turn a concurrent duplicate into a no-op
+            stmt = conflict_insert(conn, User)
+            stmt = stmt.on_conflict_do_nothing() if stmt is not None else insert(User).prefix_with("IGNORE")
+            result = conn.execute(stmt.values(
+                email=ADMIN_EMAIL,
+                username="admin",
+                hashed_password=hash_password(ADMIN_PASSWORD),
+                full_name="System Administrator",
+                role=UserRole.ADMIN,
+                is_active=True
+            ))
+            if result.rowcount:
+                print(f"✅ Admin account created: {ADMIN_EMAIL} / {ADMIN_PASSWORD}")
+
+        # Sample services only go into an empty catalog; the bootstrap lock makes this check safe
+        if conn.execute(select(func.count(Service.id))).scalar() == 0:
+            conn.execute(insert(Service), [dict(service, is_active=True) for service in SAMPLE_SERVICES])
+            print("✅ Sample services created")
+
+async def build_derived():
+    from slots import ensure_all_inventory
+    from stats import ensure_booking_stats
+
+    try:
+        async with AsyncSessionLocal() as db:
+            await ensure_booking_stats(db)
+            await ensure_all_inventory(db)
+    finally:
+        # Pooled connections belong to this short-lived event loop
+        await async_engine.dispose()
+
+def bootstrap():
+    with bootstrap_lock():
+        migrate(engine)
+        seed()
+        asyncio.run(build_derived())
+
+# ============ COMMANDS ============
+def cmd_migrate(args):
+    with bootstrap_lock():
+        applied = migrate(engine)
+    print(f"✅ Schema up to date ({len(applied)} applied)")
+
+def cmd_seed(args):
+    with bootstrap_lock():
+        seed()
+
+def cmd_bootstrap(args):
+    bootstrap()
+    print("✅ Bootstrap complete")
+
+def cmd_rollups(args):
+    # Safe while the API runs: booking writes wait for the rebuild (Postgres) or the write lock (SQLite)
+    with engine.begin() as conn:
+        rows = rebuild_rollups(conn, args.start, args.end)
+    print(f"✅ Rebuilt daily rollups ({rows} rows)")
+
+def cmd_archive(args):
+    # Same mover the API runs hourly; useful for the first run over a large table
+    from archive import archive_bookings
+
+    async def run():
+        try:
+            return await archive_bookings()
+        finally:
+            await async_engine.dispose()
+    print(f"✅ Archived {asyncio.run(run())} bookings")
+
+def cmd_reconcile(args):
+    # Rebuilds booking_stats from bookings and the archive; same as POST /api/admin/stats/reconcile
+    from stats import reconcile_booking_stats
+
+    async def run():
+        try:
+            async with AsyncSessionLocal() as db:
+                return await reconcile_booking_stats(db)
+        finally:
+            await async_engine.dispose()
+    print(f"✅ Reconciled booking counters: {asyncio.run(run())}")
+
+def cmd_status(args):
+    with engine.connect() as conn:
+        pending = dict(pending_migrations(conn))
+    for version, description, fn in MIGRATIONS:
+        print(f"{'pending' if version in pending else 'applied':<8} {version}  {description}")
+    return 1 if pending else 0
+
+COMMANDS = {
+    "migrate": (cmd_migrate, "Apply pending schema migrations"),
+    "seed": (cmd_seed, "Create the admin account and sample services if missing"),
+    "bootstrap": (cmd_bootstrap, "migrate + seed + booking counters and slot inventory"),
+    "rollups": (cmd_rollups, "Rebuild the daily booking rollups from bookings (--from/--to to limit)"),
+    "archive": (cmd_archive, "Move past and long-cancelled bookings to bookings_archive"),
+    "reconcile": (cmd_reconcile, "Rebuild the dashboard booking counters from bookings"),
+    "status": (cmd_status, "List applied and pending migrations (exit 1 if any are pending)"),
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Wellness Platform database management")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    parsers = {}
+    for name, (fn, help) in COMMANDS.items():
+        parsers[name] = subcommands.add_parser(name, help=help)
+        parsers[name].set_defaults(handler=fn)
+    parsers["rollups"].add_argument("--from", dest="start", type=date.fromisoformat, help="First day (YYYY-MM-DD)")
+    parsers["rollups"].add_argument("--to", dest="end", type=date.fromisoformat, help="Last day (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+    return args.handler(args) or 0
+
+if __name__ == "__main__":
+    sys.exit(main())
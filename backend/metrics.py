@@ -0,0 +1,259 @@
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+
+from fastapi import Request
+from sqlalchemy import event
+
+# Statements slower than this are counted and kept in the slow query log
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0)
+# Recent checkout wait (read by admission control) halves every this many seconds without checkouts
+POOL_WAIT_HALF_LIFE = 2.0
+# Label for statements issued outside HTTP requests (payment and email workers, startup)
+BACKGROUND_ROUTE = "background"
+# Label for requests not handled by an API route (static files, 404s)
+OTHER_ROUTE = "other"
+
+# ============ PRIMITIVES ============
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        bucket_labels = self.labels + ("le",)
+        with self._lock:
+            for label_values, series in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, label_values + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {series[-1]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+class Gauge:
+    # Value is read when metrics are scraped; collect() returns [(label values, value)]
+    def __init__(self, name: str, help: str, collect, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for label_values, value in self.collect():
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")
+))
+db_queries = registry.register(Counter(
+    "db_queries_total", "SQL statements executed", ("route",)
+))
+db_time = registry.register(Counter(
+    "db_query_duration_seconds_total", "Time spent executing SQL statements", ("route",)
+))
+db_slow_queries = registry.register(Counter(
+    "db_slow_queries_total", f"SQL statements slower than {SLOW_QUERY_MS:g}ms", ("route",)
+))
+pool_wait = registry.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ("engine",), buckets=POOL_WAIT_BUCKETS
+))
+
+slow_query_log = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+# ============ SQL PROFILING ============
+# Scope of the request currently executing, None for background work
+_request_scope = ContextVar("request_scope", default=None)
+
+def _route_label(scope) -> str:
+    if scope is None:
+        return BACKGROUND_ROUTE
+    # Route templates, not raw paths, keep label cardinality bounded
+    route = scope.get("route")
+    return route.path if route is not None else OTHER_ROUTE
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    route = _route_label(_request_scope.get())
+    db_queries.inc(route)
+    db_time.inc(route, amount=elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        db_slow_queries.inc(route)
+        statement = " ".join(statement.split())
+        slow_query_log.append({
+            "route": route,
+            "duration_ms": round(elapsed * 1000, 2),
+            "statement": statement[:1000],
+            "at": datetime.utcnow().isoformat()
+        })
+        print(f"🐢 Slow query ({elapsed * 1000:.0f}ms) on {route}: {statement[:200]}")
+
+def instrument(engine):
+    target = getattr(engine, "sync_engine", engine)
+    if not event.contains(target, "before_cursor_execute", _before_execute):
+        event.listen(target, "before_cursor_execute", _before_execute)
+        event.listen(target, "after_cursor_execute", _after_execute)
+
+def timed_pool(pool_class, name: str):
+    # Pool subclass that records how long each checkout waited for a connection,
+    # plus the live pressure signals admission control sheds load on
+    class TimedPool(pool_class):
+        waiting = 0
+        _recent_wait = 0.0
+        _recent_at = 0.0
+
+        def _do_get(self):
+            started = time.perf_counter()
+            self.waiting += 1
+            try:
+                return super()._do_get()
+            finally:
+                self.waiting -= 1
+                elapsed = time.perf_counter() - started
+                pool_wait.observe(elapsed, name)
+                self._recent_wait += (elapsed - self.recent_wait()) * 0.3
+                self._recent_at = time.monotonic()
+
+        def recent_wait(self) -> float:
+            # Moving average of checkout waits, decayed by time so an idle pool reads as healthy
+            return self._recent_wait * 0.5 ** ((time.monotonic() - self._recent_at) / POOL_WAIT_HALF_LIFE)
+    TimedPool.__name__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+# name -> engine, read at scrape time: dispose() swaps in a new pool
+_pooled_engines = {}
+
+def _pool_values(read):
+    return [((name,), read(target.pool)) for name, target in _pooled_engines.items()]
+
+registry.register(Gauge(
+    "db_pool_checked_out", "Connections currently checked out",
+    lambda: _pool_values(lambda pool: pool.checkedout()), ("engine",)
+))
+registry.register(Gauge(
+    "db_pool_size", "Configured pool size",
+    lambda: _pool_values(lambda pool: pool.size()), ("engine",)
+))
+registry.register(Gauge(
+    "db_pool_overflow", "Connections open beyond the pool size",
+    lambda: _pool_values(lambda pool: max(pool.overflow(), 0)), ("engine",)
+))
+registry.register(Gauge(
+    "db_pool_waiting", "Checkouts currently waiting for a connection",
+    lambda: _pool_values(lambda pool: getattr(pool, "waiting", 0)), ("engine",)
+))
+
+def pool_pressure() -> dict:
+    # name -> (checkouts waiting, recent checkout wait in seconds) for timed pools
+    pressure = {}
+    for name, target in _pooled_engines.items():
+        if hasattr(target.pool, "recent_wait"):
+            pressure[name] = (target.pool.waiting, target.pool.recent_wait())
+    return pressure
+
+def pool_gauges(name: str, engine):
+    target = getattr(engine, "sync_engine", engine)
+    if hasattr(target.pool, "checkedout"):
+        _pooled_engines[name] = target
+
+# ============ HTTP ============
+async def record_request(request: Request, call_next):
+    token = _request_scope.set(request.scope)
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        _request_scope.reset(token)
+        route = _route_label(request.scope)
+        http_requests.inc(request.method, route, status_code)
+        http_latency.observe(time.perf_counter() - started, request.method, route)
+
+def install(app, engines: dict):
+    # engines: name -> engine, e.g. {"primary": ..., "replica": ...}
+    for name, engine in engines.items():
+        instrument(engine)
+        pool_gauges(name, engine)
+    app.middleware("http")(record_request)
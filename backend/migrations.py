@@ -0,0 +1,153 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, select, text
+
+from analytics import rebuild_rollups
+from models import Base
+from slots import normalize_time_slot
+
+# Applied versions are recorded here; the newest entry in MIGRATIONS is the schema head
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", String(32), primary_key=True),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False, default=datetime.utcnow),
+)
+
+MIGRATIONS = []
+
+def migration(version: str, description: str):
+    # Migrations run in order inside one transaction each and must be safe to re-run
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return decorator
+
+# ============ HELPERS ============
+def has_column(conn, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+def add_column(conn, table: str, column: str, ddl: str):
+    if not has_column(conn, table, column):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def create_indexes(conn, table: str, *names):
+    indexes = {index.name: index for index in Base.metadata.tables[table].indexes}
+    for name in names:
+        indexes[name].create(conn, checkfirst=True)
+
+def add_enum_value(conn, enum_name: str, table: str, column: str, value: str):
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        conn.execute(text(f"ALTER TYPE {enum_name} ADD VALUE IF NOT EXISTS '{value}'"))
+    elif dialect == "mysql":
+        enum_type = Base.metadata.tables[table].c[column].type
+        values = ", ".join(f"'{v}'" for v in enum_type.enums)
+        conn.execute(text(f"ALTER TABLE {table} MODIFY {column} ENUM({values})"))
+    # SQLite stores enums as VARCHAR without a CHECK constraint: nothing to do
+
+def normalize_time_slots(conn, table: str):
+    # Older clients stored display labels ("09:00 AM – 10:00 AM"); rewrites them to the
+    # slot time so inventory counts and uq_bookings_active_user_slot see them. Labels
+    # that match no slot are left as they are
+    if not inspect(conn).has_table(table):
+        return
+    for (label,) in conn.execute(text(f"SELECT DISTINCT time_slot FROM {table}")).all():
+        time_slot = normalize_time_slot(label)
+        if time_slot is not None and time_slot != label:
+            conn.execute(
+                text(f"UPDATE {table} SET time_slot = :time_slot WHERE time_slot = :label"),
+                {"time_slot": time_slot, "label": label}
+            )
+
+# ============ MIGRATIONS ============
+@migration("0001", "Create missing tables")
+def create_tables(conn):
+    # Fresh databases get the full current schema; existing ones only gain tables they lack
+    Base.metadata.create_all(conn, checkfirst=True)
+
+@migration("0002", "Payment lifecycle, optimistic locking, slot capacity and pagination indexes")
+def booking_lifecycle(conn):
+    # Brings databases created by the original create_all up to the columns added since
+    timestamp = DateTime().compile(dialect=conn.dialect)
+    add_enum_value(conn, "payment_status", "bookings", "payment_status", "PROCESSING")
+    add_column(conn, "bookings", "payment_updated_at", timestamp)
+    add_column(conn, "bookings", "version", "INTEGER NOT NULL DEFAULT 1")
+    add_column(conn, "services", "slot_capacity", "INTEGER NOT NULL DEFAULT 1")
+    conn.execute(text("UPDATE bookings SET payment_updated_at = created_at WHERE payment_updated_at IS NULL"))
+    normalize_time_slots(conn, "bookings")
+    create_indexes(conn, "users", "ix_users_created_at_id")
+    # Fails if duplicate active bookings already exist; resolve them before migrating
+    create_indexes(
+        conn, "bookings",
+        "ix_bookings_created_at_id", "ix_bookings_user_created_at_id", "uq_bookings_active_user_slot"
+    )
+
+@migration("0003", "Full-text search index on services")
+def service_search_index(conn):
+    # Postgres only (the index is declared with ddl_if); other backends search in memory
+    create_indexes(conn, "services", "ix_services_search")
+
+@migration("0004", "Daily booking rollups")
+def booking_rollups(conn):
+    Base.metadata.tables["booking_daily_rollups"].create(conn, checkfirst=True)
+    rebuild_rollups(conn)
+
+@migration("0005", "Booking reminders and expiry schedule")
+def booking_schedule(conn):
+    timestamp = DateTime().compile(dialect=conn.dialect)
+    add_column(conn, "bookings", "due_at", timestamp)
+    add_column(conn, "bookings", "reminder_sent_at", timestamp)
+    # Open bookings are looked at once; the scheduler then sets their real due time
+    conn.execute(
+        text("UPDATE bookings SET due_at = :now WHERE status != 'CANCELLED' AND due_at IS NULL"),
+        {"now": datetime.utcnow()}
+    )
+    create_indexes(conn, "bookings", "ix_bookings_due_at")
+
+@migration("0006", "Bookings archive")
+def bookings_archive(conn):
+    Base.metadata.tables["bookings_archive"].create(conn, checkfirst=True)
+    create_indexes(conn, "bookings", "ix_bookings_booking_date", "ix_bookings_cancelled_at")
+
+@migration("0007", "Idempotency keys")
+def idempotency_keys(conn):
+    Base.metadata.tables["idempotency_keys"].create(conn, checkfirst=True)
+
+@migration("0008", "Refund pending payment status")
+def refund_pending_status(conn):
+    for table in ("bookings", "bookings_archive"):
+        add_enum_value(conn, "payment_status", table, "payment_status", "REFUND_PENDING")
+
+@migration("0009", "Normalize legacy time slot labels")
+def legacy_time_slots(conn):
+    # Databases that applied 0002 before it normalized labels; fails like 0002 if a user
+    # holds the same slot under both spellings
+    for table in ("bookings", "bookings_archive"):
+        normalize_time_slots(conn, table)
+
+# ============ RUNNER ============
+def applied_versions(conn) -> set:
+    if not inspect(conn).has_table(schema_migrations.name):
+        return set()
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+def pending_migrations(conn) -> list:
+    applied = applied_versions(conn)
+    return [(version, description) for version, description, fn in MIGRATIONS if version not in applied]
+
+def migrate(engine) -> list:
+    applied_now = []
+    with engine.begin() as conn:
+        migration_metadata.create_all(conn, checkfirst=True)
+    for version, description, fn in MIGRATIONS:
+        with engine.begin() as conn:
+            if version in applied_versions(conn):
+                continue
+            fn(conn)
+            conn.execute(schema_migrations.insert().values(version=version, description=description))
+        print(f"✅ Applied migration {version}: {description}")
+        applied_now.append(version)
+    return applied_now
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, Enum, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, Float, Date, DateTime, Enum, ForeignKey, LargeBinary, Text, Index, UniqueConstraint, text, func, literal_column
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 import enum
@@ -17,8 +17,33 @@ class BookingStatus(str, enum.Enum):
 
 class PaymentStatus(str, enum.Enum):
     PENDING = "PENDING"
+    PROCESSING = "PROCESSING"
     SUCCESS = "SUCCESS"
     FAILED = "FAILED"
+    # Charged after the booking was cancelled; the money goes back to the customer
+    REFUND_PENDING = "REFUND_PENDING"
+
+class EmailStatus(str, enum.Enum):
+    PENDING = "PENDING"
+    SENT = "SENT"
+    FAILED = "FAILED"
+
+# ================= SEARCH =================
+# Postgres full-text config used for the catalog index and the queries against it
+SEARCH_CONFIG = "english"
+
+def service_search_vector(title, category, expert_name, description):
+    # Weighted document (A ranks highest). Queries must build the identical expression
+    # for the planner to use ix_services_search, so config and literals are inlined.
+    config = literal_column(f"'{SEARCH_CONFIG}'")
+    weighted = [
+        func.setweight(func.to_tsvector(config, func.coalesce(column, literal_column("''"))), literal_column(f"'{weight}'"))
+        for column, weight in ((title, "A"), (category, "B"), (expert_name, "B"), (description, "C"))
+    ]
+    vector = weighted[0]
+    for part in weighted[1:]:
+        vector = vector.op("||")(part)
+    return vector
 
 # ================= TABLES =================
 class Admin(Base):
@@ -45,8 +70,12 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
-    # Relationships
-    bookings = relationship("Booking", back_populates="user", lazy="select")
+    # Relationships: nothing is loaded implicitly, queries opt in with joinedload/selectinload
+    bookings = relationship("Booking", back_populates="user", lazy="raise_on_sql")
+    
+    __table_args__ = (
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
 class Service(Base):
     __tablename__ = "services"
@@ -59,11 +88,22 @@ class Service(Base):
     duration_minutes = Column(Integer)
     expert_name = Column(String(255))
     image_url = Column(String(500))
+    # How many bookings the expert can take in one time slot
+    slot_capacity = Column(Integer, default=1, nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
-    # Relationships
-    bookings = relationship("Booking", back_populates="service", lazy="select")
+    # Relationships: nothing is loaded implicitly, queries opt in with joinedload/selectinload
+    bookings = relationship("Booking", back_populates="service", lazy="raise_on_sql")
+    
+    __table_args__ = (
+        # GIN index for /api/services/search on Postgres; other backends use search.SearchIndex
+        Index(
+            "ix_services_search",
+            service_search_vector(title, category, expert_name, description),
+            postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+    )
 
 class Booking(Base):
     __tablename__ = "bookings"
@@ -76,11 +116,147 @@ class Booking(Base):
     status = Column(Enum(BookingStatus, name='booking_status'), default=BookingStatus.PENDING)
     payment_status = Column(Enum(PaymentStatus, name='payment_status'), default=PaymentStatus.PENDING)
     payment_id = Column(String(50))
+    payment_updated_at = Column(DateTime, default=datetime.utcnow)
     total_amount = Column(Float)
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     cancelled_at = Column(DateTime, nullable=True)
+    # Optimistic locking: concurrent writers (payment worker vs. cancel) cannot overwrite each other
+    version = Column(Integer, nullable=False, default=1)
+    # When the scheduler should next look at this booking (reminder or expiry), see scheduler.py
+    due_at = Column(DateTime, nullable=True)
+    reminder_sent_at = Column(DateTime, nullable=True)
+    
+    # Relationships: loaded per query; rows already in the session resolve without SQL
+    user = relationship("User", back_populates="bookings", lazy="raise_on_sql")
+    service = relationship("Service", back_populates="bookings", lazy="raise_on_sql")
+    
+    # Keyset pagination: ORDER BY created_at DESC, id DESC
+    __table_args__ = (
+        Index("ix_bookings_created_at_id", "created_at", "id"),
+        Index("ix_bookings_user_created_at_id", "user_id", "created_at", "id"),
+        # Archive candidates (archive.py): sessions long past, cancellations long ago
+        Index("ix_bookings_booking_date", "booking_date"),
+        Index(
+            "ix_bookings_cancelled_at", "cancelled_at",
+            postgresql_where=text("cancelled_at IS NOT NULL"),
+            sqlite_where=text("cancelled_at IS NOT NULL")
+        ),
+        Index(
+            "ix_bookings_due_at", "due_at",
+            postgresql_where=text("due_at IS NOT NULL"),
+            sqlite_where=text("due_at IS NOT NULL")
+        ),
+        # A user holds at most one active booking per service and slot
+        Index(
+            "uq_bookings_active_user_slot",
+            "user_id", "service_id", "booking_date", "time_slot",
+            unique=True,
+            postgresql_where=text("status != 'CANCELLED'"),
+            sqlite_where=text("status != 'CANCELLED'")
+        ),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+# Bookings moved out of the hot table by archive.py: past sessions and old cancellations.
+# Same ids and columns (minus the scheduler's due_at); read through the admin API only.
+class BookingArchive(Base):
+    __tablename__ = "bookings_archive"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    service_id = Column(Integer, ForeignKey("services.id"), nullable=False)
+    booking_date = Column(DateTime, nullable=False)
+    time_slot = Column(String(50))
+    status = Column(Enum(BookingStatus, name='booking_status'), nullable=False)
+    payment_status = Column(Enum(PaymentStatus, name='payment_status'), nullable=False)
+    payment_id = Column(String(50))
+    payment_updated_at = Column(DateTime)
+    total_amount = Column(Float)
+    notes = Column(Text)
+    created_at = Column(DateTime)
+    cancelled_at = Column(DateTime, nullable=True)
+    version = Column(Integer, nullable=False)
+    reminder_sent_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    # Same keyset orderings as bookings
+    __table_args__ = (
+        Index("ix_bookings_archive_created_at_id", "created_at", "id"),
+        Index("ix_bookings_archive_user_created_at_id", "user_id", "created_at", "id"),
+    )
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(Enum(EmailStatus, name='email_status'), default=EmailStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+# Running booking counters per status, maintained in the same transaction as booking writes
+class BookingStat(Base):
+    __tablename__ = "booking_stats"
+    
+    status = Column(Enum(BookingStatus, name='booking_status'), primary_key=True)
+    booking_count = Column(Integer, default=0, nullable=False)
+    # Sum of total_amount over bookings in this status whose payment succeeded
+    revenue = Column(Float, default=0.0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Precomputed slot inventory; reservations are a conditional increment of `booked`
+class ServiceSlot(Base):
+    __tablename__ = "service_slots"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    service_id = Column(Integer, ForeignKey("services.id"), nullable=False)
+    slot_date = Column(Date, nullable=False)
+    time_slot = Column(String(50), nullable=False)
+    capacity = Column(Integer, nullable=False)
+    booked = Column(Integer, default=0, nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint("service_id", "slot_date", "time_slot", name="uq_service_slots_service_date_time"),
+    )
+
+# Daily booking volume and revenue per service, keyed by the day the booking was made (UTC);
+# maintained alongside booking_stats and rebuilt with `python manage.py rollups`
+class BookingDailyRollup(Base):
+    __tablename__ = "booking_daily_rollups"
+    
+    day = Column(Date, primary_key=True)
+    service_id = Column(Integer, ForeignKey("services.id"), primary_key=True)
+    status = Column(Enum(BookingStatus, name='booking_status'), primary_key=True)
+    booking_count = Column(Integer, default=0, nullable=False)
+    # Sum of total_amount over these bookings whose payment succeeded
+    revenue = Column(Float, default=0.0, nullable=False)
+
+# Responses kept for Idempotency-Key replays across workers (idempotency.py, IDEMPOTENCY_DB_ENABLED)
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    
+    # Token subject: keys are scoped per client
+    subject = Column(String(255), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    # Method, path and body hash of the first request; reusing a key for another request is an error
+    fingerprint = Column(String(64), nullable=False)
+    # NULL while the first request is still running
+    status_code = Column(Integer, nullable=True)
+    headers = Column(Text)
+    body = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
     
-    # Relationships
-    user = relationship("User", back_populates="bookings", lazy="joined")
-    service = relationship("Service", back_populates="bookings", lazy="joined")
\ No newline at end of file
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
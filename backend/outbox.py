@@ -0,0 +1,222 @@
+import asyncio
+import os
+import smtplib
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session
+
+from database import AsyncSessionLocal
+from models import EmailOutbox, EmailStatus
+
+EMAIL_TRANSPORT = os.getenv("EMAIL_TRANSPORT", "console")
+EMAIL_SPOOL_DIR = os.getenv("EMAIL_SPOOL_DIR", "mock_emails")
+EMAIL_FROM = os.getenv("EMAIL_FROM", "no-reply@wellness.com")
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "30"))
+OUTBOX_MAX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", "3600"))
+# Claimed messages are hidden from other workers for this long while being sent
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+
+# ============ TRANSPORTS ============
+class EmailTransport:
+    def send(self, to: str, subject: str, body: str):
+        raise NotImplementedError
+
+    def send_many(self, messages):
+        # Returns {message_id: error or None}
+        results = {}
+        for message_id, to, subject, body in messages:
+            try:
+                self.send(to, subject, body)
+                results[message_id] = None
+            except Exception as exc:
+                results[message_id] = str(exc) or exc.__class__.__name__
+        return results
+
+class ConsoleTransport(EmailTransport):
+    def send(self, to: str, subject: str, body: str):
+        print("\n📧 MOCK EMAIL SENT")
+        print(f"To: {to}")
+        print(f"Subject: {subject}")
+        print(f"Body: {body}\n")
+
+class FileSpoolTransport(EmailTransport):
+    def __init__(self, folder: str = EMAIL_SPOOL_DIR):
+        self.folder = folder
+        os.makedirs(self.folder, exist_ok=True)
+
+    def send(self, to: str, subject: str, body: str):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = os.path.join(self.folder, f"{to}_{timestamp}_{uuid.uuid4().hex[:8]}.txt")
+        with open(filename, "w") as f:
+            f.write(f"To: {to}\nSubject: {subject}\n\n{body}")
+
+class SMTPTransport(EmailTransport):
+    def send_many(self, messages):
+        # One connection per batch instead of one per message
+        results = {}
+        with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as smtp:
+            if SMTP_STARTTLS:
+                smtp.starttls()
+            if SMTP_USER:
+                smtp.login(SMTP_USER, SMTP_PASSWORD)
+            for message_id, to, subject, body in messages:
+                msg = EmailMessage()
+                msg["From"] = EMAIL_FROM
+                msg["To"] = to
+                msg["Subject"] = subject
+                msg.set_content(body)
+                try:
+                    smtp.send_message(msg)
+                    results[message_id] = None
+                except smtplib.SMTPException as exc:
+                    results[message_id] = str(exc)
+        return results
+
+TRANSPORTS = {
+    "console": ConsoleTransport,
+    "file": FileSpoolTransport,
+    "smtp": SMTPTransport,
+}
+
+def get_transport(name: str = EMAIL_TRANSPORT) -> EmailTransport:
+    if name not in TRANSPORTS:
+        raise ValueError(f"Unknown EMAIL_TRANSPORT '{name}', expected one of {sorted(TRANSPORTS)}")
+    return TRANSPORTS[name]()
+
+# ============ ENQUEUE ============
+def enqueue_email(db, to: str, subject: str, body: str):
+    # Written in the caller's transaction; delivered by the worker after commit
+    db.add(EmailOutbox(to_email=to, subject=subject, body=body))
+    db.info["outbox_dirty"] = True
+
+async def enqueue_emails(db, messages):
+    # Bulk enqueue_email for (to, subject, body) tuples: one batched INSERT
+    rows = [{"to_email": to, "subject": subject, "body": body} for to, subject, body in messages]
+    if rows:
+        await db.execute(insert(EmailOutbox), rows)
+        db.info["outbox_dirty"] = True
+
+@event.listens_for(Session, "after_commit")
+def _wake_outbox_after_commit(session):
+    if session.info.pop("outbox_dirty", False):
+        outbox_worker.wake()
+
+@event.listens_for(Session, "after_rollback")
+def _clear_outbox_flag(session):
+    session.info.pop("outbox_dirty", None)
+
+# ============ WORKER ============
+def backoff_delay(attempts: int) -> timedelta:
+    seconds = min(OUTBOX_BACKOFF_SECONDS * (2 ** max(attempts - 1, 0)), OUTBOX_MAX_BACKOFF_SECONDS)
+    return timedelta(seconds=seconds)
+
+class OutboxWorker:
+    def __init__(self, transport: EmailTransport = None, batch_size: int = OUTBOX_BATCH_SIZE):
+        self.transport = transport
+        self.batch_size = batch_size
+        self._task = None
+        self._loop = None
+        self._wakeup = None
+
+    def start(self):
+        if self._task:
+            return
+        if self.transport is None:
+            self.transport = get_transport()
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def wake(self):
+        if self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        while True:
+            try:
+                drained = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"⚠️ Email outbox drain failed: {exc}")
+                drained = 0
+            if drained >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def drain_once(self) -> int:
+        batch = await self._claim_batch()
+        if not batch:
+            return 0
+        try:
+            results = await asyncio.to_thread(self.transport.send_many, batch)
+        except Exception as exc:
+            # Transport-level failure (e.g. relay unreachable): retry the whole batch
+            results = {message[0]: str(exc) or exc.__class__.__name__ for message in batch}
+        await self._record_results(results)
+        return len(batch)
+
+    async def _claim_batch(self):
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(EmailOutbox)
+                .where(EmailOutbox.status == EmailStatus.PENDING, EmailOutbox.next_attempt_at <= now)
+                .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            rows = result.scalars().all()
+            batch = []
+            for row in rows:
+                row.attempts += 1
+                row.next_attempt_at = now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+                batch.append((row.id, row.to_email, row.subject, row.body))
+            await db.commit()
+        return batch
+
+    async def _record_results(self, results):
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(select(EmailOutbox).where(EmailOutbox.id.in_(list(results))))).scalars().all()
+            for row in rows:
+                error = results[row.id]
+                if error is None:
+                    row.status = EmailStatus.SENT
+                    row.sent_at = now
+                    row.last_error = None
+                elif row.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    row.status = EmailStatus.FAILED
+                    row.last_error = error
+                else:
+                    row.next_attempt_at = now + backoff_delay(row.attempts)
+                    row.last_error = error
+            await db.commit()
+
+outbox_worker = OutboxWorker()
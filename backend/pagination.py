@@ -0,0 +1,58 @@
+import base64
+import json
+import os
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "200"))
+
+# Response header carrying the cursor of the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(*values) -> str:
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def after_created_desc(query, created_col, id_col, cursor: str):
+    # Keyset for ORDER BY created_at DESC, id DESC
+    if not cursor:
+        return query
+    created_at, row_id = decode_cursor(cursor, 2)
+    try:
+        created_at = datetime.fromisoformat(created_at)
+        row_id = int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return query.where(or_(
+        created_col < created_at,
+        and_(created_col == created_at, id_col < row_id)
+    ))
+
+def after_id_asc(query, id_col, cursor: str):
+    # Keyset for ORDER BY id ASC
+    if not cursor:
+        return query
+    (row_id,) = decode_cursor(cursor, 1)
+    if not isinstance(row_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return query.where(id_col > row_id)
+
+def split_page(rows: list, limit: int, cursor_values):
+    # rows were fetched with limit + 1; the extra row only signals another page
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*cursor_values(rows[-1]))
@@ -0,0 +1,198 @@
+import asyncio
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, or_
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
+
+from database import AsyncSessionLocal
+from models import Booking, BookingStatus, PaymentStatus, Service, User
+from outbox import enqueue_email
+
+PAYMENT_WORKERS = int(os.getenv("PAYMENT_WORKERS", "4"))
+PAYMENT_QUEUE_SIZE = int(os.getenv("PAYMENT_QUEUE_SIZE", "1000"))
+PAYMENT_TIMEOUT_SECONDS = float(os.getenv("PAYMENT_TIMEOUT_SECONDS", "10"))
+PAYMENT_SWEEP_SECONDS = float(os.getenv("PAYMENT_SWEEP_SECONDS", "30"))
+PAYMENT_SWEEP_BATCH = int(os.getenv("PAYMENT_SWEEP_BATCH", "200"))
+# PROCESSING claims older than this belong to a worker that died; they are re-queued
+PAYMENT_STALE_SECONDS = float(os.getenv("PAYMENT_STALE_SECONDS", "300"))
+FINALIZE_ATTEMPTS = 3
+
+# Mock Payment Service
+def mock_payment_gateway(amount: float):
+    payment_id = f"PAY_{uuid.uuid4().hex[:12].upper()}"
+    success = random.choice([True, True, True, False])  # 75% success rate
+    return {
+        "status": PaymentStatus.SUCCESS if success else PaymentStatus.FAILED,
+        "payment_id": payment_id,
+        "message": "Payment successful" if success else "Payment failed"
+    }
+
+# Booking payment lifecycle: PENDING -> PROCESSING -> SUCCESS | FAILED, and FAILED -> PENDING on retry;
+# a booking cancelled mid-payment goes PROCESSING -> REFUND_PENDING | FAILED
+class PaymentProcessor:
+    def __init__(self, gateway=mock_payment_gateway, workers: int = PAYMENT_WORKERS):
+        self.gateway = gateway
+        self.workers = workers
+        self._queue = None
+        self._tasks = []
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=PAYMENT_QUEUE_SIZE)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self):
+        # A cancel that lands as an awaited DB call or gateway result completes can be
+        # swallowed, leaving the worker back at queue.get(); cancel again until all exit
+        pending = set(self._tasks)
+        while pending:
+            for task in pending:
+                task.cancel()
+            _, pending = await asyncio.wait(pending, timeout=1)
+        self._tasks = []
+
+    def submit(self, booking_id: int):
+        # Called after the PENDING row is committed. A full queue is not an error:
+        # the sweeper picks up PENDING bookings that never made it into the queue.
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(booking_id)
+        except asyncio.QueueFull:
+            pass
+
+    async def _worker(self):
+        while True:
+            booking_id = await self._queue.get()
+            try:
+                await self.process(booking_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"⚠️ Payment processing failed for booking #{booking_id}: {exc}")
+            finally:
+                self._queue.task_done()
+
+    async def _sweeper(self):
+        while True:
+            try:
+                for booking_id in await self.recover():
+                    self.submit(booking_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"⚠️ Payment sweep failed: {exc}")
+            await asyncio.sleep(PAYMENT_SWEEP_SECONDS)
+
+    async def recover(self):
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Booking)
+                .where(
+                    Booking.payment_status == PaymentStatus.PROCESSING,
+                    Booking.payment_updated_at < now - timedelta(seconds=PAYMENT_STALE_SECONDS)
+                )
+                .values(payment_status=PaymentStatus.PENDING, payment_updated_at=now, version=Booking.version + 1)
+            )
+            result = await db.execute(
+                select(Booking.id)
+                .where(
+                    Booking.payment_status == PaymentStatus.PENDING,
+                    Booking.status != BookingStatus.CANCELLED,
+                    or_(
+                        Booking.payment_updated_at == None,
+                        Booking.payment_updated_at < now - timedelta(seconds=PAYMENT_SWEEP_SECONDS)
+                    )
+                )
+                .order_by(Booking.id)
+                .limit(PAYMENT_SWEEP_BATCH)
+            )
+            booking_ids = result.scalars().all()
+            await db.commit()
+        return booking_ids
+
+    async def process(self, booking_id: int):
+        # Claim the booking; the conditional update makes this safe across workers and processes
+        async with AsyncSessionLocal() as db:
+            claimed = await db.execute(
+                update(Booking)
+                .where(
+                    Booking.id == booking_id,
+                    Booking.payment_status == PaymentStatus.PENDING,
+                    Booking.status != BookingStatus.CANCELLED
+                )
+                .values(
+                    payment_status=PaymentStatus.PROCESSING,
+                    payment_updated_at=datetime.utcnow(),
+                    version=Booking.version + 1
+                )
+            )
+            if claimed.rowcount != 1:
+                await db.rollback()
+                return
+            amount = (await db.execute(select(Booking.total_amount).where(Booking.id == booking_id))).scalar()
+            await db.commit()
+
+        # No DB connection is held while the gateway call is in flight
+        try:
+            payment_result = await asyncio.wait_for(
+                asyncio.to_thread(self.gateway, amount),
+                timeout=PAYMENT_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            payment_result = {"status": PaymentStatus.FAILED, "payment_id": None, "message": "Payment timed out"}
+        except Exception as exc:
+            payment_result = {"status": PaymentStatus.FAILED, "payment_id": None, "message": str(exc)}
+
+        for attempt in range(FINALIZE_ATTEMPTS):
+            try:
+                await self._finalize(booking_id, payment_result)
+                return
+            except StaleDataError:
+                # The booking changed underneath us (e.g. cancelled); reload and apply again
+                continue
+        print(f"⚠️ Could not record payment result for booking #{booking_id}")
+
+    async def _finalize(self, booking_id: int, payment_result: dict):
+        async with AsyncSessionLocal() as db:
+            booking = await db.get(Booking, booking_id, options=[
+                joinedload(Booking.user).load_only(User.email),
+                joinedload(Booking.service).load_only(Service.title)
+            ])
+            if not booking or booking.payment_status != PaymentStatus.PROCESSING:
+                return
+            booking.payment_status = payment_result["status"]
+            booking.payment_id = payment_result["payment_id"]
+            booking.payment_updated_at = datetime.utcnow()
+
+            if booking.status == BookingStatus.CANCELLED:
+                # Cancelled while the gateway call was in flight: a charge is owed back
+                # and nothing is confirmed
+                if payment_result["status"] == PaymentStatus.SUCCESS:
+                    booking.payment_status = PaymentStatus.REFUND_PENDING
+            elif payment_result["status"] == PaymentStatus.SUCCESS:
+                if booking.status == BookingStatus.PENDING:
+                    booking.status = BookingStatus.CONFIRMED
+                enqueue_email(
+                    db,
+                    booking.user.email,
+                    "Booking Confirmed!",
+                    f"Your booking for {booking.service.title} on {booking.booking_date:%Y-%m-%d} at {booking.time_slot} is confirmed! Payment ID: {payment_result['payment_id']}"
+                )
+            else:
+                enqueue_email(
+                    db,
+                    booking.user.email,
+                    "Payment Failed",
+                    f"Payment for {booking.service.title} failed. Please retry from your bookings page."
+                )
+            await db.commit()
+
+payment_processor = PaymentProcessor()
@@ -0,0 +1,85 @@
+import json
+from datetime import date, datetime
+from enum import Enum
+
+from sqlalchemy import func, select
+
+from images import thumbnail_url
+from models import Booking, Service, User
+
+try:
+    import orjson
+except ImportError:  # orjson is optional: the stdlib encoder produces the same JSON, only slower
+    orjson = None
+
+# Column projections for list endpoints: rows are fetched as plain tuples and encoded
+# directly, skipping ORM hydration and Pydantic validation. Field order and output
+# match ServiceResponse / UserResponse / BookingResponse / BookingAdminResponse.
+SERVICE_FIELDS = (
+    "title", "category", "description", "price", "duration_minutes",
+    "expert_name", "image_url", "slot_capacity", "id", "is_active", "created_at"
+)
+USER_FIELDS = ("email", "username", "full_name", "phone", "id", "role", "is_active", "created_at")
+BOOKING_FIELDS = (
+    "id", "user_id", "service_id", "booking_date", "time_slot", "status",
+    "payment_status", "payment_id", "total_amount", "notes", "created_at"
+)
+
+# ============ ENCODING ============
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+
+# ============ QUERIES ============
+def _columns(model, fields, prefix=""):
+    return [getattr(model, field).label(f"{prefix}{field}") for field in fields]
+
+def service_list_query():
+    return select(*_columns(Service, SERVICE_FIELDS))
+
+def booking_list_query(include_user: bool = False, model=Booking):
+    # model: Booking, or BookingArchive for archived history
+    columns = _columns(model, BOOKING_FIELDS) + _columns(Service, SERVICE_FIELDS, "service_")
+    query = select(*columns).join(Service, model.service_id == Service.id)
+    if include_user:
+        query = query.add_columns(*_columns(User, USER_FIELDS, "user_")).join(User, model.user_id == User.id)
+    return query
+
+def booking_version_query(user_id: int):
+    # Version of a user's booking list: inserts move count and max(id), every update
+    # bumps a row's version (optimistic locking), archiving lowers the count.
+    # Service edits are not included; they reach the list with its next booking change.
+    return select(
+        func.count(Booking.id),
+        func.coalesce(func.sum(Booking.version), 0),
+        func.coalesce(func.max(Booking.id), 0)
+    ).where(Booking.user_id == user_id)
+
+# ============ ROWS ============
+def _service(values) -> dict:
+    service = dict(zip(SERVICE_FIELDS, values))
+    service["thumbnail_url"] = thumbnail_url(service["image_url"])
+    return service
+
+def service_rows(rows) -> list:
+    return [_service(row) for row in rows]
+
+def booking_rows(rows, include_user: bool = False) -> list:
+    booking_end = len(BOOKING_FIELDS)
+    service_end = booking_end + len(SERVICE_FIELDS)
+    bookings = []
+    for row in rows:
+        booking = dict(zip(BOOKING_FIELDS, row[:booking_end]))
+        booking["service"] = _service(row[booking_end:service_end])
+        if include_user:
+            booking["user"] = dict(zip(USER_FIELDS, row[service_end:]))
+        bookings.append(booking)
+    return bookings
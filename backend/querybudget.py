@@ -0,0 +1,74 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+
+# off: no instrumentation; warn: log routes over budget; raise: fail them with a 500 (tests/dev)
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "off").lower()
+STATEMENT_COUNT_HEADER = "X-Statement-Count"
+
+# Statements issued by the current request; None outside instrumented requests
+_statements = ContextVar("statements", default=None)
+
+def statement_budget(limit: int):
+    # Declares how many SQL statements a route may issue, auth lookups included
+    def decorator(endpoint):
+        endpoint.statement_budget = limit
+        return endpoint
+    return decorator
+
+@contextmanager
+def uncounted():
+    # Bookkeeping around a request (e.g. the idempotency store) that is not the route's own work
+    token = _statements.set(None)
+    try:
+        yield
+    finally:
+        _statements.reset(token)
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    statements = _statements.get()
+    if statements is not None:
+        statements.append(statement)
+
+def instrument(engine):
+    # Accepts sync or async engines; background workers run outside requests and are not counted
+    target = getattr(engine, "sync_engine", engine)
+    if not event.contains(target, "before_cursor_execute", _count_statement):
+        event.listen(target, "before_cursor_execute", _count_statement)
+
+async def count_statements(request: Request, call_next):
+    statements = []
+    token = _statements.set(statements)
+    try:
+        response = await call_next(request)
+    finally:
+        _statements.reset(token)
+
+    response.headers[STATEMENT_COUNT_HEADER] = str(len(statements))
+    endpoint = request.scope.get("endpoint")
+    budget = getattr(endpoint, "statement_budget", None)
+    if budget is None or len(statements) <= budget:
+        return response
+
+    message = f"{request.method} {request.url.path} issued {len(statements)} SQL statements, budget is {budget}"
+    print(f"⚠️ {message}")
+    for statement in statements:
+        print(f"    {' '.join(statement.split())[:200]}")
+    if QUERY_BUDGET_MODE == "raise":
+        return JSONResponse(
+            status_code=500,
+            content={"detail": message, "statements": statements},
+            headers={STATEMENT_COUNT_HEADER: str(len(statements))}
+        )
+    return response
+
+def install(app, *engines):
+    if QUERY_BUDGET_MODE == "off":
+        return
+    for engine in engines:
+        instrument(engine)
+    app.middleware("http")(count_statements)
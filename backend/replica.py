@@ -0,0 +1,50 @@
+import os
+import time
+
+from fastapi import Depends, Request, Response
+
+from auth import get_current_user
+from cache import TTLCache
+from database import AsyncSessionLocal, ReplicaSessionLocal, async_engine, replica_engine
+from schemas import UserPrincipal
+
+# Replica lag we are prepared to hide: reads within this window after a write go to the primary
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+# Set on write responses and echoed back by clients; carries the window across workers
+LAST_WRITE_HEADER = "X-Last-Write"
+
+REPLICA_ENABLED = replica_engine is not async_engine
+
+# user id -> time of that user's last write, for requests landing on this worker
+recent_writes = TTLCache(maxsize=100000, ttl=READ_YOUR_WRITES_SECONDS)
+
+def note_write(response: Response, user_id: int):
+    now = time.time()
+    recent_writes.set(user_id, now)
+    response.headers[LAST_WRITE_HEADER] = f"{now:.3f}"
+
+def within_window(written_at) -> bool:
+    return written_at is not None and time.time() - written_at < READ_YOUR_WRITES_SECONDS
+
+def _header_write_time(request: Request):
+    try:
+        return float(request.headers.get(LAST_WRITE_HEADER, ""))
+    except ValueError:
+        return None
+
+def read_session(use_primary: bool = False):
+    if use_primary or not REPLICA_ENABLED:
+        return AsyncSessionLocal()
+    return ReplicaSessionLocal()
+
+# ============ DEPENDENCIES ============
+async def get_read_db():
+    # Replica session for reads that tolerate lag (catalog, admin reporting)
+    async with read_session() as db:
+        yield db
+
+async def get_user_read_db(request: Request, current_user: UserPrincipal = Depends(get_current_user)):
+    # Replica session for the user's own data, unless they wrote recently (read-your-writes)
+    use_primary = within_window(recent_writes.get(current_user.id)) or within_window(_header_write_time(request))
+    async with read_session(use_primary) as db:
+        yield db
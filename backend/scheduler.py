@@ -0,0 +1,183 @@
+import asyncio
+import heapq
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm.exc import StaleDataError
+
+from database import AsyncSessionLocal
+from models import Booking, BookingStatus, PaymentStatus, Service, User
+from outbox import enqueue_email
+from slots import release_slots
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+# Unpaid bookings (payment PENDING or FAILED) give their slot back this long after the last payment attempt
+BOOKING_EXPIRY_MINUTES = float(os.getenv("BOOKING_EXPIRY_MINUTES", "30"))
+REMINDER_LEAD_HOURS = float(os.getenv("REMINDER_LEAD_HOURS", "24"))
+# Bookings fired per tick, all in one transaction
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "100"))
+# The heap holds bookings due within this window, reloaded from ix_bookings_due_at every SCHEDULER_RELOAD_SECONDS
+SCHEDULER_HORIZON_SECONDS = float(os.getenv("SCHEDULER_HORIZON_SECONDS", "300"))
+SCHEDULER_RELOAD_SECONDS = float(os.getenv("SCHEDULER_RELOAD_SECONDS", "60"))
+SCHEDULER_LOAD_LIMIT = int(os.getenv("SCHEDULER_LOAD_LIMIT", "10000"))
+
+EXPIRY_GRACE = timedelta(minutes=BOOKING_EXPIRY_MINUTES)
+REMINDER_LEAD = timedelta(hours=REMINDER_LEAD_HOURS)
+
+# ============ DUE TIMES ============
+# due_at is "look at this booking no later than": when it fires the booking is
+# re-evaluated and due_at recomputed, so a stale value (left by a Core update that
+# bypasses the flush hook) only costs an early look, never a missed one.
+def expires_at(booking):
+    if booking.status == BookingStatus.PENDING and booking.payment_status in (PaymentStatus.PENDING, PaymentStatus.FAILED):
+        return (booking.payment_updated_at or booking.created_at or datetime.utcnow()) + EXPIRY_GRACE
+    return None
+
+def remind_at(booking, now: datetime):
+    if booking.status != BookingStatus.CONFIRMED or booking.reminder_sent_at or not booking.booking_date:
+        return None
+    if booking.booking_date <= now:
+        return None
+    at = booking.booking_date - REMINDER_LEAD
+    # Booked inside the reminder window: the confirmation email is reminder enough
+    if booking.created_at and at <= booking.created_at:
+        return None
+    return at
+
+def next_due_at(booking, now: datetime = None):
+    now = now or datetime.utcnow()
+    return expires_at(booking) or remind_at(booking, now)
+
+@event.listens_for(Session, "before_flush")
+def _schedule_bookings(session, flush_context, instances):
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            obj.due_at = next_due_at(obj)
+    for obj in session.dirty:
+        if isinstance(obj, Booking) and session.is_modified(obj):
+            obj.due_at = next_due_at(obj)
+
+# ============ SCHEDULER ============
+class BookingScheduler:
+    def __init__(self, batch_size: int = SCHEDULER_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._heap = []   # (due_at, booking_id)
+        self._loaded_at = None
+        self._loaded_until = None
+        self._task = None
+
+    def start(self):
+        if self._task or not SCHEDULER_ENABLED:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                fired = await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"⚠️ Booking scheduler tick failed: {exc}")
+                fired = 0
+            if fired >= self.batch_size:
+                continue
+            await asyncio.sleep(self._idle_seconds())
+
+    def _idle_seconds(self) -> float:
+        now = datetime.utcnow()
+        wake_at = self._loaded_at + timedelta(seconds=SCHEDULER_RELOAD_SECONDS) if self._loaded_at else now
+        if self._heap:
+            wake_at = min(wake_at, self._heap[0][0])
+        return min(max((wake_at - now).total_seconds(), 0.1), SCHEDULER_RELOAD_SECONDS)
+
+    async def _load(self, now: datetime):
+        # Replaces the heap with everything due within the horizon (index range scan)
+        horizon = now + timedelta(seconds=SCHEDULER_HORIZON_SECONDS)
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Booking.due_at, Booking.id)
+                .where(Booking.due_at <= horizon)
+                .order_by(Booking.due_at)
+                .limit(SCHEDULER_LOAD_LIMIT)
+            )).all()
+        self._heap = [tuple(row) for row in rows]
+        heapq.heapify(self._heap)
+        # A full load may have cut the horizon short: reload once the heap passes its last entry
+        self._loaded_until = rows[-1].due_at if len(rows) == SCHEDULER_LOAD_LIMIT else horizon
+        self._loaded_at = now
+
+    async def tick(self) -> int:
+        now = datetime.utcnow()
+        if (
+            self._loaded_at is None
+            or now >= self._loaded_until
+            or now - self._loaded_at >= timedelta(seconds=SCHEDULER_RELOAD_SECONDS)
+        ):
+            await self._load(now)
+        batch = []
+        while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+            batch.append(heapq.heappop(self._heap)[1])
+        if batch:
+            await self._fire(batch, now)
+        return len(batch)
+
+    async def _fire(self, booking_ids: list, now: datetime):
+        async with AsyncSessionLocal() as db:
+            # Rows another worker is handling are skipped; the due_at re-check drops
+            # bookings that were rescheduled since the heap was loaded
+            bookings = (await db.execute(
+                select(Booking)
+                .options(
+                    joinedload(Booking.user).load_only(User.email),
+                    joinedload(Booking.service).load_only(Service.title)
+                )
+                .where(Booking.id.in_(booking_ids), Booking.due_at <= now)
+                .with_for_update(skip_locked=True, of=Booking)
+            )).scalars().all()
+            released = Counter()
+            for booking in bookings:
+                expiry = expires_at(booking)
+                reminder = remind_at(booking, now)
+                if expiry and expiry <= now:
+                    booking.status = BookingStatus.CANCELLED
+                    booking.cancelled_at = now
+                    released[(booking.service_id, booking.booking_date.date(), booking.time_slot)] += 1
+                    enqueue_email(
+                        db,
+                        booking.user.email,
+                        "Booking Expired",
+                        f"Your booking #{booking.id} for {booking.service.title} on {booking.booking_date:%Y-%m-%d} at {booking.time_slot} was released because payment was not completed."
+                    )
+                elif reminder and reminder <= now:
+                    booking.reminder_sent_at = now
+                    enqueue_email(
+                        db,
+                        booking.user.email,
+                        "Session Reminder",
+                        f"Reminder: your {booking.service.title} session is on {booking.booking_date:%Y-%m-%d} at {booking.time_slot}."
+                    )
+                booking.due_at = next_due_at(booking, now)
+            await release_slots(db, released)
+            try:
+                await db.commit()
+            except StaleDataError:
+                # A booking changed underneath us (payment claimed, user cancelled); its
+                # due_at is unchanged, so the whole batch is looked at again after the next load
+                await db.rollback()
+                print(f"⚠️ Booking scheduler batch of {len(bookings)} conflicted, will retry")
+
+booking_scheduler = BookingScheduler()
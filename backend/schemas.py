@@ -1,7 +1,8 @@
-from pydantic import BaseModel, EmailStr, Field, ConfigDict
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, computed_field
+from datetime import datetime, date
 from typing import Optional, List
 from models import UserRole, BookingStatus, PaymentStatus
+from images import thumbnail_url
 
 # User Schemas
 class UserBase(BaseModel):
@@ -29,6 +30,14 @@ class UserResponse(UserBase):
     
     model_config = ConfigDict(from_attributes=True)
 
+class UserAdminUpdate(BaseModel):
+    role: Optional[UserRole] = None
+    is_active: Optional[bool] = None
+
+# Immutable snapshot of the authenticated user, safe to share from the principal cache
+class UserPrincipal(UserResponse):
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
 # Service Schemas
 class ServiceBase(BaseModel):
     title: str
@@ -38,6 +47,7 @@ class ServiceBase(BaseModel):
     duration_minutes: int = 60
     expert_name: Optional[str] = None
     image_url: Optional[str] = " "
+    slot_capacity: int = Field(1, ge=1)
 
 class ServiceCreate(ServiceBase):
     pass
@@ -50,14 +60,31 @@ class ServiceUpdate(BaseModel):
     duration_minutes: Optional[int] = None
     expert_name: Optional[str] = None
     image_url: Optional[str] = None
+    slot_capacity: Optional[int] = Field(None, ge=1)
     is_active: Optional[bool] = None
 
+# One row of a bulk import: updates the service with this id, or the one with the same
+# title and category, otherwise creates it
+class ServiceImportRow(ServiceBase):
+    id: Optional[int] = None
+    is_active: bool = True
+
+class ServiceImportResult(BaseModel):
+    created: int
+    updated: int
+    ids: List[int]
+
 class ServiceResponse(ServiceBase):
     id: int
     is_active: bool
     created_at: datetime
     
     model_config = ConfigDict(from_attributes=True)
+    
+    @computed_field
+    @property
+    def thumbnail_url(self) -> Optional[str]:
+        return thumbnail_url(self.image_url)
 
 # Booking Schemas
 class BookingCreate(BaseModel):
@@ -87,6 +114,35 @@ class BookingAdminResponse(BookingResponse):
     
     model_config = ConfigDict(from_attributes=True)
 
+# At least one criterion is required; bulk changes never apply to every booking by default
+class BookingBulkFilter(BaseModel):
+    booking_ids: Optional[List[int]] = Field(None, max_length=10000)
+    service_id: Optional[int] = None
+    expert_name: Optional[str] = None
+    user_id: Optional[int] = None
+    status: Optional[BookingStatus] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+
+class BookingBulkStatusUpdate(BaseModel):
+    filter: BookingBulkFilter
+    status: BookingStatus
+    notify: bool = True
+    reason: Optional[str] = Field(None, max_length=500)
+    dry_run: bool = False
+
+class BookingBulkStatusResult(BaseModel):
+    matched: int
+    updated: int
+    notified: int
+
+class SlotAvailability(BaseModel):
+    slot_date: date
+    time_slot: str
+    capacity: int
+    booked: int
+    available: int
+
 # Token Schemas
 class Token(BaseModel):
     access_token: str
@@ -96,6 +152,10 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     email: Optional[str] = None
 
+class StreamTicket(BaseModel):
+    ticket: str
+    expires_in: int
+
 # Payment Schemas
 class PaymentRequest(BaseModel):
     booking_id: int
@@ -113,4 +173,25 @@ class DashboardStats(BaseModel):
     total_revenue: float
     pending_bookings: int
     confirmed_bookings: int
-    cancelled_bookings: int
\ No newline at end of file
+    cancelled_bookings: int
+
+# Analytics: one row per group; dimensions that were not grouped by are omitted
+class AnalyticsRow(BaseModel):
+    day: Optional[date] = None
+    category: Optional[str] = None
+    service_id: Optional[int] = None
+    service_title: Optional[str] = None
+    bookings: int
+    pending: int
+    confirmed: int
+    cancelled: int
+    revenue: float
+
+# Cache Stats
+class CacheStats(BaseModel):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+    evictions: int
+    hit_rate: float
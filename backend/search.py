@@ -0,0 +1,164 @@
+import bisect
+import heapq
+import math
+import os
+import re
+import time
+
+from sqlalchemy import func, literal_column
+
+from models import SEARCH_CONFIG, Service, service_search_vector
+from projections import service_list_query, service_rows
+
+# The in-memory index is rebuilt from the database at most this often, to pick up
+# edits from other workers when invalidation events are not forwarded between them
+SEARCH_INDEX_TTL = float(os.getenv("SEARCH_INDEX_TTL", "300"))
+# Bounds how many vocabulary terms a short prefix ("y") may expand to
+MAX_PREFIX_TERMS = 100
+# A term that only starts with the query token scores less than an exact match
+PREFIX_MATCH_FACTOR = 0.5
+# Field weights mirror ts_rank's defaults for the A/B/C labels of the Postgres document
+FIELD_WEIGHTS = (("title", 1.0), ("category", 0.4), ("expert_name", 0.4), ("description", 0.2))
+
+# Postgres drops these via the english config; the memory index must too, or
+# "yoga for beginners" would require every match to contain "for"
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from in into is it of on or the to with your you".split()
+)
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+def tokenize(value) -> list:
+    if not value:
+        return []
+    return [token for token in _TOKEN.findall(value.lower()) if token not in STOP_WORDS]
+
+# ============ IN-MEMORY INDEX ============
+# Inverted index over active services for backends without full-text search (SQLite/dev).
+# Every query token must match (AND); each may be a prefix of an indexed term, which
+# doubles as autocomplete. Scores are field-weighted term frequency times IDF.
+class SearchIndex:
+    def __init__(self, ttl: float = SEARCH_INDEX_TTL):
+        self.ttl = ttl
+        self._postings = {}    # term -> {service_id: weight}
+        self._terms = []       # sorted vocabulary for prefix lookups
+        self._documents = {}   # service_id -> (response dict, terms)
+        self._built_at = None
+        self._rebuild = True
+        self._stale = set()
+
+    def on_catalog_event(self, event: dict):
+        # CatalogCache watcher: re-read the changed service on the next search
+        if event.get("service_id") is None:
+            self._rebuild = True
+        else:
+            self._stale.add(event["service_id"])
+
+    def _add(self, row):
+        service = service_rows([row])[0]
+        weights = {}
+        for field, weight in FIELD_WEIGHTS:
+            for term in tokenize(service[field]):
+                weights[term] = weights.get(term, 0.0) + weight
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._terms, term)
+            postings[service["id"]] = weight
+        self._documents[service["id"]] = (service, tuple(weights))
+
+    def _remove(self, service_id: int):
+        document = self._documents.pop(service_id, None)
+        if document is None:
+            return
+        for term in document[1]:
+            postings = self._postings[term]
+            postings.pop(service_id, None)
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    async def sync(self, db):
+        # At most one query: a full rebuild when due, otherwise a reload of changed services
+        if self._rebuild or self._built_at is None or time.monotonic() - self._built_at > self.ttl:
+            self._rebuild, self._stale = False, set()
+            try:
+                rows = (await db.execute(service_list_query().where(Service.is_active == True))).all()
+            except Exception:
+                self._rebuild = True
+                raise
+            self._postings, self._terms, self._documents = {}, [], {}
+            for row in rows:
+                self._add(row)
+            self._built_at = time.monotonic()
+        elif self._stale:
+            service_ids, self._stale = self._stale, set()
+            try:
+                rows = (await db.execute(
+                    service_list_query().where(Service.id.in_(service_ids), Service.is_active == True)
+                )).all()
+            except Exception:
+                self._stale |= service_ids
+                raise
+            for service_id in service_ids:
+                self._remove(service_id)
+            for row in rows:
+                self._add(row)
+
+    def _expand(self, token: str):
+        start = bisect.bisect_left(self._terms, token)
+        for term in self._terms[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(token):
+                break
+            yield term
+
+    def search(self, query: str, limit: int, category: str = None) -> list:
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        total = len(self._documents)
+        scores = None
+        for token in tokens:
+            token_scores = {}
+            for term in self._expand(token):
+                postings = self._postings[term]
+                factor = (1.0 if term == token else PREFIX_MATCH_FACTOR) * math.log(1 + total / len(postings))
+                for service_id, weight in postings.items():
+                    score = weight * factor
+                    if score > token_scores.get(service_id, 0.0):
+                        token_scores[service_id] = score
+            if scores is not None:
+                token_scores = {sid: score + scores[sid] for sid, score in token_scores.items() if sid in scores}
+            scores = token_scores
+            if not scores:
+                return []
+        if category:
+            scores = {sid: score for sid, score in scores.items() if self._documents[sid][0]["category"] == category}
+        ranked = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [self._documents[service_id][0] for service_id, _ in ranked]
+
+    def stats(self) -> dict:
+        return {"documents": len(self._documents), "terms": len(self._terms), "stale": len(self._stale)}
+
+search_index = SearchIndex()
+
+# ============ QUERIES ============
+def _postgres_search(query_tokens, limit: int, category: str = None):
+    vector = service_search_vector(Service.title, Service.category, Service.expert_name, Service.description)
+    # Every token is a prefix match; tokens are [^\W_]+ so they carry no tsquery operators
+    tsquery = func.to_tsquery(literal_column(f"'{SEARCH_CONFIG}'"), " & ".join(f"{token}:*" for token in query_tokens))
+    query = service_list_query().where(Service.is_active == True, vector.op("@@")(tsquery))
+    if category:
+        query = query.where(Service.category == category)
+    return query.order_by(func.ts_rank_cd(vector, tsquery).desc(), Service.id).limit(limit)
+
+async def search_catalog(db, query: str, limit: int, category: str = None) -> list:
+    # Ranked services as response dicts (ServiceResponse shape), best match first
+    if db.get_bind().dialect.name == "postgresql":
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        return service_rows((await db.execute(_postgres_search(tokens, limit, category))).all())
+    await search_index.sync(db)
+    return search_index.search(query, limit, category)
@@ -0,0 +1,230 @@
+import os
+import re
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import bindparam, case, func, select, update
+
+from database import conflict_insert
+from models import Booking, BookingStatus, Service, ServiceSlot
+
+SLOT_TIMES = [t.strip() for t in os.getenv(
+    "SLOT_TIMES", "09:00,10:00,11:00,12:00,13:00,14:00,15:00,16:00,17:00,18:00"
+).split(",") if t.strip()]
+# Inventory is precomputed this many days ahead; later dates are created on first reservation
+SLOT_HORIZON_DAYS = int(os.getenv("SLOT_HORIZON_DAYS", "60"))
+MAX_AVAILABILITY_DAYS = int(os.getenv("MAX_AVAILABILITY_DAYS", "62"))
+INSERT_BATCH_SIZE = 500
+
+# Older clients send display labels such as "09:00 AM – 10:00 AM"; the slot is its start time
+_SLOT_LABEL = re.compile(r"\s*(\d{1,2}):(\d{2})\s*([AaPp][Mm])?\b")
+
+def normalize_time_slot(value: str):
+    # "HH:MM" for a recognised slot time, else None
+    match = _SLOT_LABEL.match(value or "")
+    if not match:
+        return None
+    hour, minute, meridiem = int(match.group(1)), match.group(2), (match.group(3) or "").upper()
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem == "PM" else 0)
+    time_slot = f"{hour:02d}:{minute}"
+    return time_slot if time_slot in SLOT_TIMES else None
+
+def slot_row(service: Service, slot_date: date, time_slot: str) -> dict:
+    return {
+        "service_id": service.id,
+        "slot_date": slot_date,
+        "time_slot": time_slot,
+        "capacity": service.slot_capacity,
+        "booked": 0,
+    }
+
+def slot_rows(service: Service, start: date, end: date):
+    day = start
+    while day <= end:
+        for time_slot in SLOT_TIMES:
+            yield slot_row(service, day, time_slot)
+        day += timedelta(days=1)
+
+def booked_count(service_id: int, slot_date: date, time_slot: str):
+    # Live bookings already holding the slot, so a row created over existing bookings
+    # (e.g. on a database migrated from before slot inventory) starts out with them counted
+    day = datetime.combine(slot_date, time.min)
+    return (
+        select(func.count(Booking.id))
+        .where(
+            Booking.service_id == service_id,
+            Booking.booking_date >= day,
+            Booking.booking_date < day + timedelta(days=1),
+            Booking.time_slot == time_slot,
+            Booking.status != BookingStatus.CANCELLED
+        )
+        .scalar_subquery()
+    )
+
+async def _insert_missing(db, rows: list):
+    # booked is evaluated by the insert itself, inside the same statement
+    rows = [{**row, "booked": booked_count(row["service_id"], row["slot_date"], row["time_slot"])} for row in rows]
+    stmt = conflict_insert(db, ServiceSlot)
+    if stmt is not None:
+        for i in range(0, len(rows), INSERT_BATCH_SIZE):
+            await db.execute(
+                stmt.values(rows[i:i + INSERT_BATCH_SIZE])
+                .on_conflict_do_nothing(index_elements=["service_id", "slot_date", "time_slot"])
+            )
+        return
+    for row in rows:
+        exists = (await db.execute(select(ServiceSlot.id).where(
+            ServiceSlot.service_id == row["service_id"],
+            ServiceSlot.slot_date == row["slot_date"],
+            ServiceSlot.time_slot == row["time_slot"]
+        ))).first()
+        if not exists:
+            db.add(ServiceSlot(**row))
+    await db.flush()
+
+async def ensure_inventory(db, service: Service, start: date = None, days: int = SLOT_HORIZON_DAYS):
+    start = start or date.today()
+    await _insert_missing(db, list(slot_rows(service, start, start + timedelta(days=days - 1))))
+
+async def sync_booked(db, start: date = None):
+    # Recounts booked on inventory rows from start on, and adds the rows missing for
+    # slots that hold live bookings (e.g. beyond the horizon on a migrated database)
+    start = start or date.today()
+    live = (Booking.status != BookingStatus.CANCELLED, Booking.time_slot.in_(SLOT_TIMES))
+    await db.execute(
+        update(ServiceSlot)
+        .where(ServiceSlot.slot_date >= start)
+        .values(booked=select(func.count(Booking.id)).where(
+            Booking.service_id == ServiceSlot.service_id,
+            func.date(Booking.booking_date) == ServiceSlot.slot_date,
+            Booking.time_slot == ServiceSlot.time_slot,
+            *live
+        ).scalar_subquery())
+        .execution_options(synchronize_session=False)
+    )
+    held = (await db.execute(
+        select(Booking.service_id, Booking.booking_date, Booking.time_slot, Service.slot_capacity)
+        .join(Service, Booking.service_id == Service.id)
+        .where(Booking.booking_date >= datetime.combine(start, time.min), *live)
+        .distinct()
+    )).all()
+    await _insert_missing(db, [
+        {
+            "service_id": row.service_id,
+            "slot_date": row.booking_date.date(),
+            "time_slot": row.time_slot,
+            "capacity": row.slot_capacity,
+        }
+        for row in held
+    ])
+
+async def ensure_all_inventory(db):
+    services = (await db.execute(select(Service).where(Service.is_active == True))).scalars().all()
+    for service in services:
+        await ensure_inventory(db, service)
+    # Rows that already existed are brought in line with the bookings as well
+    await sync_booked(db)
+    await db.commit()
+
+async def _increment(db, service_id: int, slot_date: date, time_slot: str) -> bool:
+    # Atomic: the increment only applies while booked < capacity
+    result = await db.execute(
+        update(ServiceSlot)
+        .where(
+            ServiceSlot.service_id == service_id,
+            ServiceSlot.slot_date == slot_date,
+            ServiceSlot.time_slot == time_slot,
+            ServiceSlot.booked < ServiceSlot.capacity
+        )
+        .values(booked=ServiceSlot.booked + 1)
+    )
+    return result.rowcount == 1
+
+async def reserve_slot(db, service: Service, slot_date: date, time_slot: str) -> bool:
+    if await _increment(db, service.id, slot_date, time_slot):
+        return True
+    # Full, or no inventory row yet (beyond the horizon): only then is a row inserted,
+    # with the bookings it already holds counted, and the increment retried
+    await _insert_missing(db, [slot_row(service, slot_date, time_slot)])
+    return await _increment(db, service.id, slot_date, time_slot)
+
+async def release_slot(db, service_id: int, booking_date: datetime, time_slot: str):
+    await db.execute(
+        update(ServiceSlot)
+        .where(
+            ServiceSlot.service_id == service_id,
+            ServiceSlot.slot_date == booking_date.date(),
+            ServiceSlot.time_slot == time_slot,
+            ServiceSlot.booked > 0
+        )
+        .values(booked=ServiceSlot.booked - 1)
+    )
+
+async def release_slots(db, reservations: dict):
+    # Bulk release_slot: {(service_id, slot_date, time_slot): count}, one executemany
+    if not reservations:
+        return
+    slots = ServiceSlot.__table__
+    count = bindparam("release_count")
+    await db.execute(
+        update(slots)
+        .where(
+            slots.c.service_id == bindparam("release_service_id"),
+            slots.c.slot_date == bindparam("release_slot_date"),
+            slots.c.time_slot == bindparam("release_time_slot")
+        )
+        .values(booked=case((slots.c.booked > count, slots.c.booked - count), else_=0)),
+        [
+            {
+                "release_service_id": service_id,
+                "release_slot_date": slot_date,
+                "release_time_slot": time_slot,
+                "release_count": n
+            }
+            for (service_id, slot_date, time_slot), n in reservations.items()
+        ]
+    )
+
+async def resize_slots_many(db, service_ids: list):
+    # resize_slots for several services in one statement, each taking its service's capacity
+    await db.execute(
+        update(ServiceSlot)
+        .where(ServiceSlot.service_id.in_(service_ids), ServiceSlot.slot_date >= date.today())
+        .values(capacity=select(Service.slot_capacity).where(Service.id == ServiceSlot.service_id).scalar_subquery())
+        .execution_options(synchronize_session=False)
+    )
+
+async def resize_slots(db, service: Service):
+    # Capacity changes apply to today and later; existing reservations are kept
+    await db.execute(
+        update(ServiceSlot)
+        .where(ServiceSlot.service_id == service.id, ServiceSlot.slot_date >= date.today())
+        .values(capacity=service.slot_capacity)
+    )
+
+async def get_availability(db, service: Service, start: date, end: date) -> list:
+    rows = (await db.execute(
+        select(ServiceSlot.slot_date, ServiceSlot.time_slot, ServiceSlot.capacity, ServiceSlot.booked)
+        .where(
+            ServiceSlot.service_id == service.id,
+            ServiceSlot.slot_date >= start,
+            ServiceSlot.slot_date <= end
+        )
+    )).all()
+    inventory = {(row.slot_date, row.time_slot): row for row in rows}
+    availability = []
+    for default in slot_rows(service, start, end):
+        # Slots without an inventory row have never been reserved
+        row = inventory.get((default["slot_date"], default["time_slot"]))
+        capacity = row.capacity if row else default["capacity"]
+        booked = row.booked if row else 0
+        availability.append({
+            "slot_date": default["slot_date"],
+            "time_slot": default["time_slot"],
+            "capacity": capacity,
+            "booked": booked,
+            "available": max(capacity - booked, 0),
+        })
+    return availability
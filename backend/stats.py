@@ -0,0 +1,199 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import case, event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, attributes
+
+from archive import all_bookings
+from database import conflict_insert
+from models import Booking, BookingDailyRollup, BookingStat, BookingStatus, PaymentStatus, User, UserRole
+
+# ============ INCREMENTAL COUNTERS ============
+def booking_contribution(status, payment_status, amount):
+    # What a single booking adds to booking_stats: (status row, revenue)
+    status = status or BookingStatus.PENDING
+    revenue = (amount or 0.0) if payment_status == PaymentStatus.SUCCESS else 0.0
+    return status, revenue
+
+def add_transition(deltas, old=None, new=None):
+    # old/new are (status, payment_status, amount) tuples, None for insert/delete
+    if old is not None:
+        status, revenue = booking_contribution(*old)
+        deltas[status][0] -= 1
+        deltas[status][1] -= revenue
+    if new is not None:
+        status, revenue = booking_contribution(*new)
+        deltas[status][0] += 1
+        deltas[status][1] += revenue
+
+def add_rollup_transition(deltas, day, service_id, old=None, new=None):
+    # Same contributions as add_transition, split by booking day and service
+    if old is not None:
+        status, revenue = booking_contribution(*old)
+        deltas[(day, service_id, status)][0] -= 1
+        deltas[(day, service_id, status)][1] -= revenue
+    if new is not None:
+        status, revenue = booking_contribution(*new)
+        deltas[(day, service_id, status)][0] += 1
+        deltas[(day, service_id, status)][1] += revenue
+
+def rollup_day(created_at):
+    return (created_at or datetime.utcnow()).date()
+
+def new_deltas():
+    return defaultdict(lambda: [0, 0.0])
+
+def _attribute_change(obj, key):
+    history = attributes.get_history(obj, key)
+    new = history.added[0] if history.added else (history.unchanged[0] if history.unchanged else None)
+    if history.deleted:
+        return history.deleted[0], new
+    return new, new
+
+def apply_stat_deltas(connection, deltas):
+    for status, (count_delta, revenue_delta) in deltas.items():
+        if count_delta == 0 and revenue_delta == 0:
+            continue
+        result = connection.execute(
+            update(BookingStat)
+            .where(BookingStat.status == status)
+            .values(
+                booking_count=BookingStat.booking_count + count_delta,
+                revenue=BookingStat.revenue + revenue_delta
+            )
+        )
+        if result.rowcount == 0:
+            connection.execute(
+                insert(BookingStat).values(status=status, booking_count=count_delta, revenue=revenue_delta)
+            )
+
+def apply_rollup_deltas(connection, deltas):
+    # One multi-row upsert where supported; rows go in key order so concurrent
+    # writers lock them in the same order
+    rows = [
+        {"day": day, "service_id": service_id, "status": status, "booking_count": count_delta, "revenue": revenue_delta}
+        for (day, service_id, status), (count_delta, revenue_delta) in sorted(deltas.items())
+        if count_delta != 0 or revenue_delta != 0
+    ]
+    if not rows:
+        return
+    stmt = conflict_insert(connection, BookingDailyRollup)
+    if stmt is not None:
+        stmt = stmt.values(rows)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=["day", "service_id", "status"],
+            set_={
+                "booking_count": BookingDailyRollup.booking_count + stmt.excluded.booking_count,
+                "revenue": BookingDailyRollup.revenue + stmt.excluded.revenue
+            }
+        ))
+        return
+    for row in rows:
+        key = (
+            BookingDailyRollup.day == row["day"],
+            BookingDailyRollup.service_id == row["service_id"],
+            BookingDailyRollup.status == row["status"]
+        )
+        result = connection.execute(
+            update(BookingDailyRollup)
+            .where(*key)
+            .values(
+                booking_count=BookingDailyRollup.booking_count + row["booking_count"],
+                revenue=BookingDailyRollup.revenue + row["revenue"]
+            )
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(BookingDailyRollup).values(**row))
+
+@event.listens_for(Session, "after_flush")
+def _track_booking_stats(session, flush_context):
+    deltas = new_deltas()
+    rollups = new_deltas()
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            new = (obj.status, obj.payment_status, obj.total_amount)
+            add_transition(deltas, new=new)
+            add_rollup_transition(rollups, rollup_day(obj.created_at), obj.service_id, new=new)
+    for obj in session.dirty:
+        if isinstance(obj, Booking) and session.is_modified(obj):
+            old_status, new_status = _attribute_change(obj, "status")
+            old_payment, new_payment = _attribute_change(obj, "payment_status")
+            old_amount, new_amount = _attribute_change(obj, "total_amount")
+            old = (old_status, old_payment, old_amount)
+            new = (new_status, new_payment, new_amount)
+            add_transition(deltas, old=old, new=new)
+            add_rollup_transition(rollups, rollup_day(obj.created_at), obj.service_id, old=old, new=new)
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            old = (obj.status, obj.payment_status, obj.total_amount)
+            add_transition(deltas, old=old)
+            add_rollup_transition(rollups, rollup_day(obj.created_at), obj.service_id, old=old)
+    if deltas:
+        apply_stat_deltas(session.connection(), deltas)
+        apply_rollup_deltas(session.connection(), rollups)
+
+# ============ READS ============
+def aggregate_booking_stats_query():
+    # Single-pass baseline over bookings and the archive, also used to rebuild the counters
+    bookings = all_bookings("id", "status", "payment_status", "total_amount")
+    return select(
+        bookings.c.status,
+        func.count(bookings.c.id),
+        func.coalesce(func.sum(case((bookings.c.payment_status == PaymentStatus.SUCCESS, bookings.c.total_amount), else_=0.0)), 0.0)
+    ).group_by(bookings.c.status)
+
+def summarize(total_users: int, rows) -> dict:
+    counts = {status: 0 for status in BookingStatus}
+    total_revenue = 0.0
+    for status, booking_count, revenue in rows:
+        counts[BookingStatus(status)] += booking_count
+        total_revenue += revenue or 0.0
+    return {
+        "total_users": total_users or 0,
+        "total_bookings": sum(counts.values()),
+        "total_revenue": round(total_revenue, 2),
+        "pending_bookings": counts[BookingStatus.PENDING],
+        "confirmed_bookings": counts[BookingStatus.CONFIRMED],
+        "cancelled_bookings": counts[BookingStatus.CANCELLED]
+    }
+
+async def read_dashboard_stats(db) -> dict:
+    total_users = select(func.count(User.id)).where(User.role == UserRole.USER).scalar_subquery()
+    result = await db.execute(
+        select(BookingStat.status, BookingStat.booking_count, BookingStat.revenue, total_users)
+    )
+    rows = result.all()
+    if not rows:
+        # Counters not built yet: the caller rebuilds them on the primary
+        return None
+    return summarize(rows[0][3], [row[:3] for row in rows])
+
+# ============ RECONCILE ============
+async def reconcile_booking_stats(db) -> dict:
+    # Lock the counter rows first so concurrent booking writes queue behind the rebuild
+    await db.execute(select(BookingStat.status).with_for_update())
+    rows = (await db.execute(aggregate_booking_stats_query())).all()
+    actual = {BookingStatus(status): (count, revenue or 0.0) for status, count, revenue in rows}
+    for status in BookingStatus:
+        count, revenue = actual.get(status, (0, 0.0))
+        result = await db.execute(
+            update(BookingStat)
+            .where(BookingStat.status == status)
+            .values(booking_count=count, revenue=revenue)
+        )
+        if result.rowcount == 0:
+            await db.execute(insert(BookingStat).values(status=status, booking_count=count, revenue=revenue))
+    total_users = (await db.execute(select(func.count(User.id)).where(User.role == UserRole.USER))).scalar()
+    await db.commit()
+    return summarize(total_users, [(status, count, revenue) for status, (count, revenue) in actual.items()])
+
+async def ensure_booking_stats(db):
+    # Build the counters once if the table is empty (first start on existing data)
+    if (await db.execute(select(BookingStat.status).limit(1))).first():
+        return
+    try:
+        await reconcile_booking_stats(db)
+    except IntegrityError:
+        # Another worker built them concurrently
+        await db.rollback()
@@ -0,0 +1,153 @@
+import itertools
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+# Modules read their configuration at import time: point them at a scratch database
+# and a scratch working directory (static files, email spool) before anything loads
+WORKDIR = tempfile.mkdtemp(prefix="wellness-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'test.db')}"
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["LOAD_SHEDDING_ENABLED"] = "false"
+os.environ["SCHEDULER_ENABLED"] = "false"
+os.environ["BOOKING_ARCHIVE_ENABLED"] = "false"
+os.environ["EMAIL_SPOOL_DIR"] = os.path.join(WORKDIR, "mock_emails")
+os.chdir(WORKDIR)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from database import SessionLocal
+from models import Booking, BookingStatus, EmailOutbox, PaymentStatus, ServiceSlot, User
+
+ADMIN = {"email": "admin@wellness.com", "password": "Admin@123"}
+# Sample service taking one booking per slot ("Personalized Diet Plan")
+ONE_PER_SLOT = 2
+# Every test books its own day, so tests never compete for the same slot
+_days = itertools.count(3)
+
+class Gateway:
+    # Stands in for the payment gateway; hold() keeps calls in flight until release()
+    def __init__(self):
+        self.status = PaymentStatus.SUCCESS
+        self.calls = 0
+        self._open = threading.Event()
+        self._open.set()
+
+    def __call__(self, amount: float):
+        self.calls += 1
+        self._open.wait(10)
+        return {"status": self.status, "payment_id": f"PAY_TEST{self.calls}", "message": self.status.value}
+
+    def hold(self):
+        self._open.clear()
+
+    def release(self):
+        self._open.set()
+
+def wait_for(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = predicate()
+        if value:
+            return value
+        time.sleep(0.05)
+    raise AssertionError("condition not met in time")
+
+def load_booking(booking_id: int) -> Booking:
+    with SessionLocal() as db:
+        return db.get(Booking, booking_id)
+
+def unsettled_payments() -> int:
+    with SessionLocal() as db:
+        return db.query(Booking).filter(
+            Booking.payment_status.in_((PaymentStatus.PENDING, PaymentStatus.PROCESSING)),
+            Booking.status != BookingStatus.CANCELLED
+        ).count()
+
+def wait_for_payment(booking_id: int, *statuses) -> Booking:
+    statuses = statuses or (PaymentStatus.SUCCESS, PaymentStatus.FAILED)
+    return wait_for(lambda: (lambda b: b if b.payment_status in statuses else None)(load_booking(booking_id)))
+
+def booked(service_id: int, day: str, time_slot: str) -> int:
+    with SessionLocal() as db:
+        slot = db.query(ServiceSlot).filter_by(
+            service_id=service_id, slot_date=datetime.strptime(day, "%Y-%m-%d").date(), time_slot=time_slot
+        ).one()
+        return slot.booked
+
+def emails_about(booking_id: int, subject: str) -> list:
+    # Each test books as a fresh user, so the booking's owner identifies its emails
+    with SessionLocal() as db:
+        return db.execute(
+            select(EmailOutbox.body)
+            .join(User, User.email == EmailOutbox.to_email)
+            .join(Booking, Booking.user_id == User.id)
+            .where(Booking.id == booking_id, EmailOutbox.subject == subject)
+        ).scalars().all()
+
+def book(client, headers, day, time_slot="09:00", service_id=1, expect=201):
+    response = client.post(
+        "/api/bookings",
+        json={"service_id": service_id, "booking_date": day, "time_slot": time_slot},
+        headers=headers
+    )
+    assert response.status_code == expect, response.text
+    return response
+
+@pytest.fixture(scope="session")
+def client():
+    import manage
+    manage.bootstrap()
+    import main
+    with TestClient(main.app) as client:
+        yield client
+
+@pytest.fixture
+def gateway(client):
+    import payments
+    fake = Gateway()
+    original = payments.payment_processor.gateway
+    payments.payment_processor.gateway = fake
+    yield fake
+    fake.release()
+    # Payments a test left in flight settle here instead of calling the next test's gateway
+    wait_for(lambda: not unsettled_payments())
+    payments.payment_processor.gateway = original
+
+def login(client, email: str, password: str) -> dict:
+    response = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def register(client) -> dict:
+    name = uuid.uuid4().hex[:12]
+    user = {"email": f"{name}@example.com", "username": name, "password": "secret1", "full_name": "Test User"}
+    response = client.post("/api/auth/register", json=user)
+    assert response.status_code == 201, response.text
+    return login(client, user["email"], user["password"])
+
+@pytest.fixture
+def user(client) -> dict:
+    return register(client)
+
+@pytest.fixture
+def other_user(client) -> dict:
+    return register(client)
+
+@pytest.fixture(scope="session")
+def admin(client) -> dict:
+    return login(client, ADMIN["email"], ADMIN["password"])
+
+@pytest.fixture
+def booking_day() -> str:
+    return (datetime.utcnow() + timedelta(days=next(_days))).strftime("%Y-%m-%d")
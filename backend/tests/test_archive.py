@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from archive import BOOKING_ARCHIVE_AFTER_DAYS, BOOKING_ARCHIVE_CANCELLED_AFTER_DAYS, archive_bookings
+from conftest import book, load_booking, wait_for_payment
+from database import SessionLocal, engine
+from models import Booking, BookingArchive
+
+def backdate(booking_id: int, **values):
+    with engine.begin() as conn:
+        conn.execute(update(Booking).where(Booking.id == booking_id).values(**values))
+
+def archive(client) -> int:
+    return client.portal.call(archive_bookings)
+
+def archived(booking_id: int):
+    with SessionLocal() as db:
+        return db.get(BookingArchive, booking_id)
+
+def settled_booking(client, user, day, **options) -> dict:
+    booking = book(client, user, day, **options).json()
+    wait_for_payment(booking["id"])
+    return booking
+
+def test_old_bookings_move_to_the_archive(client, gateway, user, admin, booking_day):
+    cancelled = settled_booking(client, user, booking_day, time_slot="09:00")
+    assert client.delete(f"/api/bookings/{cancelled['id']}", headers=user).status_code == 200
+    backdate(cancelled["id"], cancelled_at=datetime.utcnow() - timedelta(days=BOOKING_ARCHIVE_CANCELLED_AFTER_DAYS + 1))
+    past = settled_booking(client, user, booking_day, time_slot="10:00")
+    backdate(past["id"], booking_date=datetime.utcnow() - timedelta(days=BOOKING_ARCHIVE_AFTER_DAYS + 1), due_at=None)
+    # The newest booking is never archived; this one keeps the two above movable
+    settled_booking(client, user, booking_day, time_slot="11:00")
+    stats = client.get("/api/admin/dashboard", headers=admin).json()
+
+    assert archive(client) >= 2
+    for booking in (cancelled, past):
+        assert load_booking(booking["id"]) is None
+        assert archived(booking["id"]).archived_at is not None
+    user_id = cancelled["user_id"]
+    listed = client.get(f"/api/admin/bookings/archive?user_id={user_id}", headers=admin).json()
+    assert sorted(b["id"] for b in listed) == sorted([cancelled["id"], past["id"]])
+    # Counters cover both tables, so archiving changes neither them nor a reconcile
+    assert client.get("/api/admin/dashboard", headers=admin).json() == stats
+    assert client.post("/api/admin/stats/reconcile", headers=admin).json() == stats
+
+def test_recent_and_scheduled_bookings_stay(client, gateway, user, booking_day):
+    recent = settled_booking(client, user, booking_day, time_slot="09:00")
+    assert client.delete(f"/api/bookings/{recent['id']}", headers=user).status_code == 200
+    # Still owned by the scheduler (e.g. a reminder is due)
+    scheduled = settled_booking(client, user, booking_day, time_slot="10:00")
+    backdate(scheduled["id"], booking_date=datetime.utcnow() - timedelta(days=BOOKING_ARCHIVE_AFTER_DAYS + 1), due_at=datetime.utcnow())
+    settled_booking(client, user, booking_day, time_slot="11:00")
+
+    archive(client)
+    for booking in (recent, scheduled):
+        assert load_booking(booking["id"]) is not None
+        assert archived(booking["id"]) is None
@@ -0,0 +1,66 @@
+from conftest import ONE_PER_SLOT, book, load_booking, wait_for, wait_for_payment
+from models import BookingStatus, PaymentStatus
+from payments import PAYMENT_WORKERS
+
+def bulk_status(client, admin, booking_ids: list, status: str, **options) -> dict:
+    response = client.post(
+        "/api/admin/bookings/bulk-status",
+        json={"filter": {"booking_ids": booking_ids}, "status": status, **options},
+        headers=admin
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def revenue(client, admin) -> float:
+    return client.get("/api/admin/dashboard", headers=admin).json()["total_revenue"]
+
+def test_bulk_confirm_records_the_payment(client, gateway, user, admin, booking_day):
+    # Every worker is busy with a held gateway call, so the last booking waits in the queue
+    gateway.hold()
+    busy = [book(client, user, booking_day, time_slot=f"{9 + i:02d}:00").json() for i in range(PAYMENT_WORKERS)]
+    wait_for(lambda: all(load_booking(b["id"]).payment_status == PaymentStatus.PROCESSING for b in busy))
+    queued = book(client, user, booking_day, time_slot="17:00").json()
+    before = revenue(client, admin)
+
+    result = bulk_status(client, admin, [queued["id"]], "CONFIRMED", notify=False)
+    assert result == {"matched": 1, "updated": 1, "notified": 0}
+    confirmed = load_booking(queued["id"])
+    assert (confirmed.status, confirmed.payment_status) == (BookingStatus.CONFIRMED, PaymentStatus.SUCCESS)
+    assert revenue(client, admin) == before + queued["total_amount"]
+
+    # The queued payment finds nothing left to charge; a booking queued behind it
+    # settling means the worker has been through it
+    gateway.release()
+    after = book(client, user, booking_day, time_slot="18:00").json()
+    wait_for_payment(after["id"])
+    assert load_booking(queued["id"]).payment_id is None
+    assert gateway.calls == PAYMENT_WORKERS + 1
+
+def test_bulk_confirm_after_failed_payment(client, gateway, user, admin, booking_day):
+    gateway.status = PaymentStatus.FAILED
+    booking = book(client, user, booking_day).json()
+    wait_for_payment(booking["id"])
+
+    assert bulk_status(client, admin, [booking["id"]], "CONFIRMED")["updated"] == 1
+    confirmed = load_booking(booking["id"])
+    assert (confirmed.status, confirmed.payment_status) == (BookingStatus.CONFIRMED, PaymentStatus.SUCCESS)
+
+def test_bulk_skips_payments_in_flight(client, gateway, user, admin, booking_day):
+    gateway.hold()
+    booking = book(client, user, booking_day, service_id=ONE_PER_SLOT).json()
+    wait_for_payment(booking["id"], PaymentStatus.PROCESSING)
+
+    for status in ("CANCELLED", "CONFIRMED"):
+        assert bulk_status(client, admin, [booking["id"]], status)["matched"] == 0
+    gateway.release()
+    settled = wait_for_payment(booking["id"])
+    assert (settled.status, settled.payment_status) == (BookingStatus.CONFIRMED, PaymentStatus.SUCCESS)
+
+def test_bulk_cancel_releases_slots(client, gateway, user, other_user, admin, booking_day):
+    booking = book(client, user, booking_day, service_id=ONE_PER_SLOT).json()
+    wait_for_payment(booking["id"])
+
+    assert bulk_status(client, admin, [booking["id"]], "CANCELLED", dry_run=True)["updated"] == 0
+    assert bulk_status(client, admin, [booking["id"]], "CANCELLED")["updated"] == 1
+    assert load_booking(booking["id"]).status == BookingStatus.CANCELLED
+    book(client, other_user, booking_day, service_id=ONE_PER_SLOT)
@@ -0,0 +1,62 @@
+from compression import COMPRESSION_MIN_SIZE, choose_encoding
+from conftest import book, wait_for_payment
+
+def revalidate(client, path: str, etag: str, headers: dict = None):
+    return client.get(path, headers={**(headers or {}), "If-None-Match": etag})
+
+def test_catalog_is_revalidated_with_its_etag(client, admin):
+    first = client.get("/api/services")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    unchanged = revalidate(client, "/api/services", etag)
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert unchanged.headers["ETag"] == etag
+    # Weak comparison: the strong form and a list containing the tag match as well
+    assert revalidate(client, "/api/services", etag[2:]).status_code == 304
+    assert revalidate(client, "/api/services", f'"other", {etag}').status_code == 304
+
+    service = first.json()[0]
+    response = client.put(f"/api/admin/services/{service['id']}", json={"price": service["price"] + 1}, headers=admin)
+    assert response.status_code == 200, response.text
+    changed = revalidate(client, "/api/services", etag)
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    client.put(f"/api/admin/services/{service['id']}", json={"price": service["price"]}, headers=admin)
+
+def test_booking_list_etag_is_private_and_follows_changes(client, gateway, user, booking_day):
+    first = client.get("/api/bookings/my", headers=user)
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    assert revalidate(client, "/api/bookings/my", etag, user).status_code == 304
+
+    booking = book(client, user, booking_day).json()
+    changed = revalidate(client, "/api/bookings/my", etag, user)
+    assert changed.status_code == 200
+    assert [b["id"] for b in changed.json()] == [booking["id"]]
+    # The payment settling changes the booking, and with it the list's validator
+    wait_for_payment(booking["id"])
+    settled = revalidate(client, "/api/bookings/my", changed.headers["ETag"], user)
+    assert settled.status_code == 200
+    assert settled.json()[0]["payment_status"] == "SUCCESS"
+
+def test_large_responses_are_compressed(client):
+    plain = client.get("/api/services", headers={"Accept-Encoding": "identity"})
+    assert len(plain.content) >= COMPRESSION_MIN_SIZE
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["Vary"] == "Accept-Encoding"
+
+    encoded = client.get("/api/services", headers={"Accept-Encoding": "gzip"})
+    assert encoded.headers["content-encoding"] == "gzip"
+    assert encoded.json() == plain.json()
+    # Same validator whatever the encoding
+    assert encoded.headers["ETag"] == plain.headers["ETag"]
+
+def test_encoding_negotiation():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("") is None
+    assert choose_encoding("*;q=0.5") in ("br", "gzip")
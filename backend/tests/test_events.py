@@ -0,0 +1,27 @@
+from auth import STREAM_TICKET_SECONDS, get_stream_user
+from database import AsyncSessionLocal
+
+def ticket_for(client, headers) -> str:
+    response = client.post("/api/events/ticket", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["expires_in"] == STREAM_TICKET_SECONDS
+    return response.json()["ticket"]
+
+def stream_principal(client, ticket: str):
+    async def resolve():
+        async with AsyncSessionLocal() as db:
+            return await get_stream_user(ticket=ticket, credentials=None, db=db)
+    return client.portal.call(resolve)
+
+def test_stream_ticket_identifies_the_user(client, user):
+    me = client.get("/api/auth/me", headers=user).json()
+    assert stream_principal(client, ticket_for(client, user)).id == me["id"]
+
+def test_stream_ticket_is_not_a_bearer_token(client, user):
+    ticket = ticket_for(client, user)
+    assert client.get("/api/auth/me", headers={"Authorization": f"Bearer {ticket}"}).status_code == 401
+
+def test_bearer_token_is_not_accepted_in_the_url(client, user):
+    token = user["Authorization"].split(" ", 1)[1]
+    assert client.get(f"/api/events?ticket={token}").status_code == 401
+    assert client.get(f"/api/events?token={token}").status_code == 401
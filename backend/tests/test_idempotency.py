@@ -0,0 +1,63 @@
+import uuid
+
+from conftest import ONE_PER_SLOT, book, wait_for_payment
+from database import SessionLocal
+from idempotency import REPLAYED_HEADER
+from models import Booking, PaymentStatus
+
+def with_key(headers: dict) -> dict:
+    return {**headers, "Idempotency-Key": uuid.uuid4().hex}
+
+def bookings_of(response) -> int:
+    with SessionLocal() as db:
+        user_id = response.json()["user_id"]
+        return db.query(Booking).filter_by(user_id=user_id).count()
+
+def test_retried_booking_is_replayed(client, gateway, user, booking_day):
+    headers = with_key(user)
+    first = book(client, headers, booking_day)
+    second = book(client, headers, booking_day)
+
+    assert second.headers.get(REPLAYED_HEADER) == "true"
+    assert REPLAYED_HEADER not in first.headers
+    assert second.json() == first.json()
+    assert bookings_of(first) == 1
+    wait_for_payment(first.json()["id"])
+    assert gateway.calls == 1
+
+def test_key_reused_for_a_different_request_is_rejected(client, gateway, user, booking_day):
+    headers = with_key(user)
+    book(client, headers, booking_day)
+    response = book(client, headers, booking_day, time_slot="10:00", expect=422)
+    assert REPLAYED_HEADER not in response.headers
+
+def test_keys_are_scoped_to_the_caller(client, gateway, user, other_user, booking_day):
+    key = uuid.uuid4().hex
+    book(client, {**user, "Idempotency-Key": key}, booking_day, service_id=ONE_PER_SLOT)
+    # Same key from someone else is a new request: here it meets the full slot
+    response = book(client, {**other_user, "Idempotency-Key": key}, booking_day, service_id=ONE_PER_SLOT, expect=409)
+    assert REPLAYED_HEADER not in response.headers
+
+def test_conflicts_are_not_stored(client, gateway, user, other_user, booking_day):
+    taken = book(client, user, booking_day, service_id=ONE_PER_SLOT).json()
+    headers = with_key(other_user)
+    book(client, headers, booking_day, service_id=ONE_PER_SLOT, expect=409)
+    wait_for_payment(taken["id"])
+    assert client.delete(f"/api/bookings/{taken['id']}", headers=user).status_code == 200
+    # The slot was freed: the same key now runs the booking instead of replaying the 409
+    response = book(client, headers, booking_day, service_id=ONE_PER_SLOT)
+    assert REPLAYED_HEADER not in response.headers
+
+def test_payment_retry_is_replayed(client, gateway, user, booking_day):
+    gateway.status = PaymentStatus.FAILED
+    booking = book(client, user, booking_day).json()
+    wait_for_payment(booking["id"])
+
+    gateway.status = PaymentStatus.SUCCESS
+    headers = with_key(user)
+    first = client.post(f"/api/bookings/{booking['id']}/retry-payment", headers=headers)
+    second = client.post(f"/api/bookings/{booking['id']}/retry-payment", headers=headers)
+    assert (first.status_code, second.status_code) == (202, 202)
+    assert second.headers.get(REPLAYED_HEADER) == "true"
+    assert wait_for_payment(booking["id"], PaymentStatus.SUCCESS)
+    assert gateway.calls == 2
@@ -0,0 +1,56 @@
+import io
+import os
+
+import pytest
+
+import images
+from conftest import wait_for
+from images import thumbnail_path, thumbnail_url
+
+PNG_1PX = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360f8cfc0f01f0005000201a1d0c3"
+    "6b0000000049454e44ae426082"
+)
+
+def upload(client, admin, content: bytes, filename: str = "photo.png"):
+    return client.post(
+        "/api/admin/upload-image",
+        files={"file": (filename, io.BytesIO(content), "application/octet-stream")},
+        headers=admin
+    )
+
+def test_upload_is_content_addressed_by_its_bytes(client, admin):
+    # Named .jpg, stored as what the bytes are
+    response = upload(client, admin, PNG_1PX, filename="photo.jpg")
+    assert response.status_code == 200, response.text
+    image_url = response.json()["image_url"]
+    assert image_url.endswith(".png")
+    assert client.get(image_url).content == PNG_1PX
+
+@pytest.mark.skipif(images.Image is None, reason="Pillow is not installed")
+def test_thumbnail_is_advertised_once_written(client, admin):
+    # A fresh image, so its variants cannot exist yet
+    content = PNG_1PX + os.urandom(8)
+    image_url = upload(client, admin, content).json()["image_url"]
+    digest = image_url.rsplit("/", 1)[-1].split(".", 1)[0]
+
+    wait_for(lambda: os.path.exists(thumbnail_path(digest, images.THUMBNAIL_WIDTHS[0])), timeout=30)
+    thumb = thumbnail_url(image_url)
+    assert thumb != image_url
+    assert client.get(thumb).status_code == 200
+
+def test_missing_thumbnail_falls_back_to_the_image():
+    image_url = f"{images.IMAGE_URL_PREFIX}/{'0' * 64}.png"
+    assert thumbnail_url(image_url) == image_url
+    assert thumbnail_url("/static/images/default-service.jpg") == "/static/images/default-service.jpg"
+
+def test_non_image_is_rejected(client, admin):
+    response = upload(client, admin, b"<html>not an image</html>")
+    assert response.status_code == 400
+    assert upload(client, admin, b"").status_code == 400
+
+def test_oversized_upload_is_refused_before_parsing(client, admin, monkeypatch):
+    monkeypatch.setattr(images, "MAX_UPLOAD_REQUEST_BYTES", 1024)
+    response = upload(client, admin, PNG_1PX + b"\0" * 2048)
+    assert response.status_code == 413
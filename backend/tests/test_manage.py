@@ -0,0 +1,6 @@
+import manage
+
+def test_reconcile_command_rebuilds_the_counters(client, admin, capsys):
+    stats = client.get("/api/admin/dashboard", headers=admin).json()
+    assert manage.main(["reconcile"]) == 0
+    assert str(stats) in capsys.readouterr().out
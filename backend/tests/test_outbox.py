@@ -0,0 +1,81 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+import outbox
+from conftest import wait_for
+from database import SessionLocal
+from models import EmailOutbox, EmailStatus
+from outbox import OUTBOX_BACKOFF_SECONDS, OUTBOX_MAX_ATTEMPTS, EmailTransport, backoff_delay, enqueue_email
+
+class FlakyTransport(EmailTransport):
+    # Fails every message to the addresses in failing; the rest are delivered
+    def __init__(self):
+        self.failing = set()
+        self.sent = []
+
+    def send(self, to: str, subject: str, body: str):
+        if to in self.failing:
+            raise ConnectionError("relay unreachable")
+        self.sent.append(to)
+
+@pytest.fixture
+def transport(client):
+    fake = FlakyTransport()
+    original = outbox.outbox_worker.transport
+    outbox.outbox_worker.transport = fake
+    yield fake
+    outbox.outbox_worker.transport = original
+
+def enqueue(to: str, **values) -> int:
+    with SessionLocal() as db:
+        enqueue_email(db, to, "Test", "Hello")
+        db.flush()
+        message = db.query(EmailOutbox).filter_by(to_email=to).one()
+        for key, value in values.items():
+            setattr(message, key, value)
+        db.commit()
+        return message.id
+
+def load_message(message_id: int) -> EmailOutbox:
+    with SessionLocal() as db:
+        return db.get(EmailOutbox, message_id)
+
+def retry_now(message_id: int):
+    with SessionLocal() as db:
+        db.get(EmailOutbox, message_id).next_attempt_at = datetime.utcnow()
+        db.commit()
+    outbox.outbox_worker.wake()
+
+def test_backoff_doubles_up_to_the_cap():
+    assert backoff_delay(1) == timedelta(seconds=OUTBOX_BACKOFF_SECONDS)
+    assert backoff_delay(3) == timedelta(seconds=OUTBOX_BACKOFF_SECONDS * 4)
+    assert backoff_delay(50) == timedelta(seconds=outbox.OUTBOX_MAX_BACKOFF_SECONDS)
+
+def test_failed_send_is_retried_after_backoff(transport):
+    to = f"{uuid.uuid4().hex[:12]}@example.com"
+    transport.failing.add(to)
+    message_id = enqueue(to)
+
+    failed = wait_for(lambda: (lambda m: m if m.last_error else None)(load_message(message_id)))
+    assert (failed.status, failed.attempts) == (EmailStatus.PENDING, 1)
+    assert failed.last_error == "relay unreachable"
+    delay = failed.next_attempt_at - datetime.utcnow()
+    assert timedelta(seconds=OUTBOX_BACKOFF_SECONDS - 5) < delay <= timedelta(seconds=OUTBOX_BACKOFF_SECONDS)
+
+    transport.failing.clear()
+    retry_now(message_id)
+    sent = wait_for(lambda: (lambda m: m if m.status == EmailStatus.SENT else None)(load_message(message_id)))
+    assert sent.attempts == 2
+    assert sent.last_error is None
+    assert transport.sent.count(to) == 1
+
+def test_message_fails_after_max_attempts(transport):
+    to = f"{uuid.uuid4().hex[:12]}@example.com"
+    transport.failing.add(to)
+    message_id = enqueue(to, attempts=OUTBOX_MAX_ATTEMPTS - 1)
+
+    failed = wait_for(lambda: (lambda m: m if m.status == EmailStatus.FAILED else None)(load_message(message_id)))
+    assert failed.attempts == OUTBOX_MAX_ATTEMPTS
+    assert failed.last_error == "relay unreachable"
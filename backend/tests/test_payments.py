@@ -0,0 +1,74 @@
+from conftest import book, emails_about, load_booking, wait_for_payment
+from database import SessionLocal
+from models import Booking, BookingStatus, PaymentStatus
+
+def revenue(client, admin) -> float:
+    return client.get("/api/admin/dashboard", headers=admin).json()["total_revenue"]
+
+def test_successful_payment_confirms_booking(client, gateway, user, booking_day):
+    booking = book(client, user, booking_day).json()
+    assert booking["payment_status"] == "PENDING"
+
+    settled = wait_for_payment(booking["id"])
+    assert settled.payment_status == PaymentStatus.SUCCESS
+    assert settled.status == BookingStatus.CONFIRMED
+    assert len(emails_about(booking["id"], "Booking Confirmed!")) == 1
+
+def test_failed_payment_can_be_retried(client, gateway, user, booking_day):
+    gateway.status = PaymentStatus.FAILED
+    booking = book(client, user, booking_day).json()
+    assert wait_for_payment(booking["id"]).payment_status == PaymentStatus.FAILED
+
+    gateway.status = PaymentStatus.SUCCESS
+    response = client.post(f"/api/bookings/{booking['id']}/retry-payment", headers=user)
+    assert response.status_code == 202, response.text
+    settled = wait_for_payment(booking["id"], PaymentStatus.SUCCESS)
+    assert settled.status == BookingStatus.CONFIRMED
+    assert gateway.calls == 2
+
+def test_cancel_is_rejected_while_payment_is_processing(client, gateway, user, booking_day):
+    gateway.hold()
+    booking = book(client, user, booking_day).json()
+    wait_for_payment(booking["id"], PaymentStatus.PROCESSING)
+
+    response = client.delete(f"/api/bookings/{booking['id']}", headers=user)
+    assert response.status_code == 409
+
+    gateway.release()
+    settled = wait_for_payment(booking["id"])
+    assert (settled.status, settled.payment_status) == (BookingStatus.CONFIRMED, PaymentStatus.SUCCESS)
+    response = client.delete(f"/api/bookings/{booking['id']}", headers=user)
+    assert response.status_code == 200, response.text
+
+def test_payment_settling_after_cancellation_is_refunded(client, gateway, user, admin, booking_day):
+    before = revenue(client, admin)
+    gateway.hold()
+    booking = book(client, user, booking_day).json()
+    wait_for_payment(booking["id"], PaymentStatus.PROCESSING)
+
+    # A cancellation that reached the row while the gateway call was in flight
+    with SessionLocal() as db:
+        row = db.get(Booking, booking["id"])
+        row.status = BookingStatus.CANCELLED
+        db.commit()
+
+    gateway.release()
+    settled = wait_for_payment(booking["id"], PaymentStatus.REFUND_PENDING)
+    assert settled.status == BookingStatus.CANCELLED
+    assert settled.payment_id == "PAY_TEST1"
+    assert emails_about(booking["id"], "Booking Confirmed!") == []
+    assert revenue(client, admin) == before
+
+def test_failed_payment_after_cancellation_sends_nothing(client, gateway, user, booking_day):
+    gateway.status = PaymentStatus.FAILED
+    gateway.hold()
+    booking = book(client, user, booking_day).json()
+    wait_for_payment(booking["id"], PaymentStatus.PROCESSING)
+    with SessionLocal() as db:
+        db.get(Booking, booking["id"]).status = BookingStatus.CANCELLED
+        db.commit()
+
+    gateway.release()
+    wait_for_payment(booking["id"], PaymentStatus.FAILED)
+    assert load_booking(booking["id"]).status == BookingStatus.CANCELLED
+    assert emails_about(booking["id"], "Payment Failed") == []
@@ -0,0 +1,43 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+import querybudget
+from database import engine
+from querybudget import STATEMENT_COUNT_HEADER, statement_budget
+
+def budget_app() -> FastAPI:
+    app = FastAPI()
+    querybudget.install(app, engine)
+
+    @app.get("/queries/{count}")
+    @statement_budget(1)
+    def run_queries(count: int):
+        with engine.connect() as conn:
+            for _ in range(count):
+                conn.execute(text("SELECT 1"))
+        return {"count": count}
+
+    return app
+
+def test_route_within_budget_passes():
+    with TestClient(budget_app()) as client:
+        response = client.get("/queries/1")
+    assert response.status_code == 200, response.text
+    assert response.headers[STATEMENT_COUNT_HEADER] == "1"
+
+def test_route_over_budget_raises():
+    assert querybudget.QUERY_BUDGET_MODE == "raise"
+    with TestClient(budget_app()) as client:
+        response = client.get("/queries/2")
+    assert response.status_code == 500
+    assert response.headers[STATEMENT_COUNT_HEADER] == "2"
+    assert response.json()["detail"] == "GET /queries/2 issued 2 SQL statements, budget is 1"
+    assert len(response.json()["statements"]) == 2
+
+def test_route_over_budget_only_warns(monkeypatch):
+    monkeypatch.setattr(querybudget, "QUERY_BUDGET_MODE", "warn")
+    with TestClient(budget_app()) as client:
+        response = client.get("/queries/2")
+    assert response.status_code == 200, response.text
+    assert response.headers[STATEMENT_COUNT_HEADER] == "2"
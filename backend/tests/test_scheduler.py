@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from conftest import ONE_PER_SLOT, book, booked, emails_about, load_booking, wait_for_payment
+from database import engine
+from models import Booking, BookingStatus, PaymentStatus
+from scheduler import EXPIRY_GRACE, REMINDER_LEAD, BookingScheduler
+
+def make_due(booking_id: int, **values):
+    # As if the booking had been waiting since before its grace period started
+    with engine.begin() as conn:
+        conn.execute(update(Booking).where(Booking.id == booking_id).values(due_at=datetime.utcnow(), **values))
+
+def tick(client) -> int:
+    # Runs on the app's event loop, like the scheduler task would
+    return client.portal.call(BookingScheduler().tick)
+
+def test_unpaid_booking_expires_and_frees_its_slot(client, gateway, user, other_user, booking_day):
+    gateway.status = PaymentStatus.FAILED
+    booking = book(client, user, booking_day, service_id=ONE_PER_SLOT).json()
+    wait_for_payment(booking["id"])
+    make_due(booking["id"], payment_updated_at=datetime.utcnow() - EXPIRY_GRACE - timedelta(minutes=1))
+
+    assert tick(client) >= 1
+    expired = load_booking(booking["id"])
+    assert expired.status == BookingStatus.CANCELLED
+    assert expired.due_at is None
+    assert booked(ONE_PER_SLOT, booking_day, "09:00") == 0
+    assert len(emails_about(booking["id"], "Booking Expired")) == 1
+    gateway.status = PaymentStatus.SUCCESS
+    book(client, other_user, booking_day, service_id=ONE_PER_SLOT)
+
+def test_unpaid_booking_within_grace_is_kept(client, gateway, user, booking_day):
+    gateway.status = PaymentStatus.FAILED
+    booking = book(client, user, booking_day).json()
+    wait_for_payment(booking["id"])
+    make_due(booking["id"])
+
+    tick(client)
+    kept = load_booking(booking["id"])
+    assert kept.status == BookingStatus.PENDING
+    # Looked at again once the grace period after the failed attempt runs out
+    assert kept.due_at == kept.payment_updated_at + EXPIRY_GRACE
+    assert emails_about(booking["id"], "Booking Expired") == []
+
+def test_paid_booking_is_rescheduled_for_its_reminder(client, gateway, user, booking_day):
+    booking = book(client, user, booking_day).json()
+    wait_for_payment(booking["id"])
+    make_due(booking["id"])
+
+    tick(client)
+    confirmed = load_booking(booking["id"])
+    assert confirmed.status == BookingStatus.CONFIRMED
+    assert confirmed.due_at == confirmed.booking_date - REMINDER_LEAD
@@ -0,0 +1,92 @@
+from datetime import date, timedelta
+
+from sqlalchemy import update
+
+from conftest import ONE_PER_SLOT, book, booked, load_booking, wait_for_payment
+from database import engine
+from migrations import MIGRATIONS, migrate, schema_migrations
+from models import Booking, ServiceSlot
+from querybudget import STATEMENT_COUNT_HEADER
+from slots import SLOT_HORIZON_DAYS
+
+def test_full_slot_returns_409(client, gateway, user, other_user, booking_day):
+    book(client, user, booking_day, service_id=ONE_PER_SLOT)
+    response = book(client, other_user, booking_day, service_id=ONE_PER_SLOT, expect=409)
+    assert response.json()["detail"] == "This time slot is fully booked"
+    assert booked(ONE_PER_SLOT, booking_day, "09:00") == 1
+
+def test_cancelling_frees_the_slot(client, gateway, user, other_user, booking_day):
+    booking = book(client, user, booking_day, service_id=ONE_PER_SLOT).json()
+    wait_for_payment(booking["id"])
+    assert client.delete(f"/api/bookings/{booking['id']}", headers=user).status_code == 200
+    assert booked(ONE_PER_SLOT, booking_day, "09:00") == 0
+    book(client, other_user, booking_day, service_id=ONE_PER_SLOT)
+
+def test_availability_reflects_reservations(client, gateway, user, booking_day):
+    book(client, user, booking_day, time_slot="10:00", service_id=ONE_PER_SLOT)
+    response = client.get(f"/api/services/{ONE_PER_SLOT}/availability?from={booking_day}&to={booking_day}")
+    assert response.status_code == 200, response.text
+    slots = {slot["time_slot"]: slot["available"] for slot in response.json()}
+    assert slots["10:00"] == 0
+    assert slots["09:00"] == 1
+
+def test_unknown_time_slot_is_rejected(client, user, booking_day):
+    book(client, user, booking_day, time_slot="09:30", expect=400)
+
+def test_slot_booked_before_migration_stays_taken(client, gateway, user, other_user, booking_day):
+    taken = book(client, user, booking_day, service_id=ONE_PER_SLOT).json()
+    wait_for_payment(taken["id"])
+    # Back to a database from before slot inventory: the booking exists, no slot rows do
+    with engine.begin() as conn:
+        ServiceSlot.__table__.drop(conn)
+        conn.execute(schema_migrations.delete())
+    assert len(migrate(engine)) == len(MIGRATIONS)
+
+    response = book(client, other_user, booking_day, service_id=ONE_PER_SLOT, expect=409)
+    assert response.json()["detail"] == "This time slot is fully booked"
+
+def test_legacy_slot_labels_are_normalized(client, gateway, user, booking_day):
+    booking = book(client, user, booking_day, time_slot="01:00 PM – 02:00 PM", service_id=ONE_PER_SLOT).json()
+    assert booking["time_slot"] == "13:00"
+    assert booked(ONE_PER_SLOT, booking_day, "13:00") == 1
+
+def test_bootstrap_resyncs_existing_inventory(client, gateway, user, other_user, booking_day):
+    import manage
+
+    booking = book(client, user, booking_day, service_id=ONE_PER_SLOT).json()
+    wait_for_payment(booking["id"])
+    # Inventory that drifted from the bookings, e.g. rows created by an older release
+    with engine.begin() as conn:
+        conn.execute(update(ServiceSlot).where(
+            ServiceSlot.service_id == ONE_PER_SLOT, ServiceSlot.slot_date == date.fromisoformat(booking_day)
+        ).values(booked=0))
+    manage.bootstrap()
+
+    assert booked(ONE_PER_SLOT, booking_day, "09:00") == 1
+    book(client, other_user, booking_day, service_id=ONE_PER_SLOT, expect=409)
+
+def test_existing_inventory_row_is_reserved_in_one_statement(client, gateway, user, booking_day):
+    # Warms the principal cache so both counts below leave auth out
+    book(client, user, booking_day, time_slot="09:00")
+    within = book(client, user, booking_day, time_slot="10:00")
+    beyond_day = (date.today() + timedelta(days=SLOT_HORIZON_DAYS + 5)).isoformat()
+    beyond = book(client, user, beyond_day)
+
+    # Only the slot without an inventory row pays for the insert and the retried increment
+    assert int(beyond.headers[STATEMENT_COUNT_HEADER]) == int(within.headers[STATEMENT_COUNT_HEADER]) + 2
+    assert booked(1, beyond_day, "09:00") == 1
+
+def test_legacy_slot_labels_are_migrated(client, gateway, user, other_user, booking_day):
+    import manage
+
+    # Stored by the original frontend, before labels were normalized on the way in
+    booking = book(client, user, booking_day, service_id=ONE_PER_SLOT).json()
+    wait_for_payment(booking["id"])
+    with engine.begin() as conn:
+        conn.execute(update(Booking).where(Booking.id == booking["id"]).values(time_slot="09:00 AM – 10:00 AM"))
+        conn.execute(schema_migrations.delete().where(schema_migrations.c.version == "0009"))
+    manage.bootstrap()
+
+    assert load_booking(booking["id"]).time_slot == "09:00"
+    assert booked(ONE_PER_SLOT, booking_day, "09:00") == 1
+    book(client, other_user, booking_day, service_id=ONE_PER_SLOT, expect=409)
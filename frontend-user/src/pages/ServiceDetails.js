@@ -7,7 +7,8 @@ function ServiceDetails() {
   const [service, setService] = useState(null);
   const [date, setDate] = useState("");
   const [timeSlot, setTimeSlot] = useState("");
-  const timeSlots = ["09:00 AM – 10:00 AM","10:00 AM – 11:00 AM","11:00 AM – 12:00 PM","01:00 PM – 02:00 PM","02:00 PM – 03:00 PM","03:00 PM – 04:00 PM","04:00 PM – 05:00 PM","05:00 PM – 06:00 PM"];
+  // [value sent to the API (slot start, "HH:MM"), label shown]
+  const timeSlots = [["09:00","09:00 AM – 10:00 AM"],["10:00","10:00 AM – 11:00 AM"],["11:00","11:00 AM – 12:00 PM"],["12:00","12:00 PM – 01:00 PM"],["13:00","01:00 PM – 02:00 PM"],["14:00","02:00 PM – 03:00 PM"],["15:00","03:00 PM – 04:00 PM"],["16:00","04:00 PM – 05:00 PM"],["17:00","05:00 PM – 06:00 PM"],["18:00","06:00 PM – 07:00 PM"]];
 
   useEffect(() => {
     axios.get("http://localhost:8000/user/services")
@@ -44,7 +45,7 @@ function ServiceDetails() {
       <input type="date" value={date} onChange={e=>setDate(e.target.value)} className="border p-2 rounded mt-2 w-full"/>
       <select value={timeSlot} onChange={e=>setTimeSlot(e.target.value)} className="border p-2 rounded mt-2 w-full">
         <option value="">Select Time Slot</option>
-        {timeSlots.map(ts => <option key={ts} value={ts}>{ts}</option>)}
+        {timeSlots.map(([value, label]) => <option key={value} value={value}>{label}</option>)}
       </select>
 
       <button onClick={handleBooking} className="bg-blue-600 text-white p-2 rounded mt-2 w-full">Book Now</button>
@@ -1,14 +1,82 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Calendar, Clock, User, LogOut, Home, BookOpen, Heart, Shield } from 'lucide-react';
 
 const API_URL = "http://localhost:8000/api";
 
+// List endpoints return one page at a time; X-Next-Cursor is absent on the last page
+const fetchPage = async (path, cursor, headers) => {
+  const url = cursor ? `${API_URL}${path}?cursor=${encodeURIComponent(cursor)}` : `${API_URL}${path}`;
+  const res = await fetch(url, { headers });
+  return { items: await res.json(), next: res.headers.get('X-Next-Cursor') };
+};
+
+// Event streams authenticate with a short-lived ticket instead of the bearer token,
+// which would otherwise end up in URLs and access logs. A ticket expires soon after it
+// is used, so every reconnect fetches a new one and resumes after the last event seen.
+const subscribeEvents = (listeners) => {
+  let source = null;
+  let lastEventId = null;
+  let retryTimer = null;
+  let closed = false;
+
+  const reconnect = () => {
+    if (!closed) retryTimer = setTimeout(connect, 3000);
+  };
+
+  const connect = async () => {
+    try {
+      const res = await fetch(`${API_URL}/events/ticket`, {
+        method: 'POST',
+        headers: { Authorization: `Bearer ${localStorage.getItem('token')}` }
+      });
+      if (!res.ok) throw new Error(`Stream ticket refused (${res.status})`);
+      const { ticket } = await res.json();
+      if (closed) return;
+      const params = new URLSearchParams({ ticket });
+      if (lastEventId) params.set('last_event_id', lastEventId);
+      source = new EventSource(`${API_URL}/events?${params}`);
+      Object.entries(listeners).forEach(([type, listener]) => {
+        source.addEventListener(type, (e) => {
+          if (e.lastEventId) lastEventId = e.lastEventId;
+          listener(e);
+        });
+      });
+      source.onerror = () => {
+        source.close();
+        reconnect();
+      };
+    } catch (err) {
+      console.error('Event stream error:', err);
+      reconnect();
+    }
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(retryTimer);
+    if (source) source.close();
+  };
+};
+
+const LoadMore = ({ cursor, onClick }) => cursor ? (
+  <div className="text-center mt-6">
+    <button
+      onClick={onClick}
+      className="px-8 py-3 bg-white text-purple-600 border border-purple-300 rounded-lg font-semibold hover:bg-purple-50 transition"
+    >
+      Load more
+    </button>
+  </div>
+) : null;
+
 
 const App = () => {
   const [page, setPage] = useState('home');
   const [user, setUser] = useState(null);
   const [services, setServices] = useState([]);
   const [bookings, setBookings] = useState([]);
+  const [bookingsCursor, setBookingsCursor] = useState(null);
   const [selectedService, setSelectedService] = useState(null);
   const [loading, setLoading] = useState(false);
   const [message, setMessage] = useState({ type: '', text: '' });
@@ -72,16 +140,83 @@ const App = () => {
     }
   };
 
-  const fetchBookings = async (token) => {
+  // Booking writes return X-Last-Write; echoing it keeps our next reads off a lagging replica
+  const rememberWrite = (res) => {
+    const lastWrite = res.headers.get('X-Last-Write');
+    if (lastWrite) localStorage.setItem('lastWrite', lastWrite);
+  };
+
+  // Without a cursor the list restarts at the newest page; with one the next page is appended
+  const fetchBookings = async (token, cursor) => {
     try {
-      const res = await fetch(`${API_URL}/bookings/my`, {
-        headers: { Authorization: `Bearer ${token || localStorage.getItem('token')}` }
+      const headers = { Authorization: `Bearer ${token || localStorage.getItem('token')}` };
+      const lastWrite = localStorage.getItem('lastWrite');
+      if (lastWrite) headers['X-Last-Write'] = lastWrite;
+      const { items, next } = await fetchPage('/bookings/my', cursor, headers);
+      setBookings((current) => (cursor ? [...current, ...items] : items));
+      setBookingsCursor(next);
+    } catch (err) {
+      console.error('Fetch bookings error:', err);
+    }
+  };
+
+  // Booking events pushed over /events: payment results resolve waitForPayment and
+  // changes are applied to the list in place, so nothing polls
+  const paymentWaiters = useRef({});
+  const settledPayments = useRef({});
+
+  useEffect(() => {
+    if (!user || user.role === 'ADMIN') return;
+    return subscribeEvents({
+      booking: (e) => {
+        const booking = JSON.parse(e.data);
+        if (booking.payment_status === 'PENDING' || booking.payment_status === 'PROCESSING') {
+          delete settledPayments.current[booking.id];
+        } else {
+          settledPayments.current[booking.id] = booking;
+          const resolve = paymentWaiters.current[booking.id];
+          if (resolve) resolve(booking);
+        }
+        if (booking.action === 'created') {
+          fetchBookings();
+        } else {
+          setBookings((current) => current.map((b) => (
+            b.id === booking.id ? { ...b, status: booking.status, payment_status: booking.payment_status } : b
+          )));
+        }
+      },
+      // Missed events (fell behind or reconnected too late): reload the list
+      resync: () => fetchBookings()
+    });
+  }, [user]);
+
+  // Payments are processed in the background; wait for the event reporting the result,
+  // checking the booking once if none arrives in time
+  const waitForPayment = async (bookingId) => {
+    const pushed = await new Promise((resolve) => {
+      if (settledPayments.current[bookingId]) return resolve(settledPayments.current[bookingId]);
+      const timer = setTimeout(() => resolve(null), 15000);
+      paymentWaiters.current[bookingId] = (booking) => {
+        clearTimeout(timer);
+        resolve(booking);
+      };
+    });
+    delete paymentWaiters.current[bookingId];
+    delete settledPayments.current[bookingId];
+    if (pushed) return pushed;
+    try {
+      const res = await fetch(`${API_URL}/bookings/${bookingId}`, {
+        headers: { Authorization: `Bearer ${localStorage.getItem('token')}` }
       });
+      if (!res.ok) return null;
       const data = await res.json();
-      setBookings(data);
+      if (data.payment_status !== 'PENDING' && data.payment_status !== 'PROCESSING') {
+        return data;
+      }
     } catch (err) {
-      console.error('Fetch bookings error:', err);
+      return null;
     }
+    return null;
   };
 
   const handleAuth = async () => {
@@ -165,14 +300,18 @@ const App = () => {
           ...bookingForm
         })
       });
+      rememberWrite(res);
 
       const data = await res.json();
       
       if (res.ok) {
-        if (data.payment_status === 'SUCCESS') {
+        const settled = await waitForPayment(data.id);
+        if (settled && settled.payment_status === 'SUCCESS') {
           showMessage('success', '🎉 Booking confirmed! Payment successful.');
-        } else {
+        } else if (settled) {
           showMessage('error', '❌ Payment failed. Please retry from My Bookings.');
+        } else {
+          showMessage('success', '⏳ Booking received. Payment is being processed.');
         }
         fetchBookings();
         setPage('bookings');
@@ -194,6 +333,7 @@ const App = () => {
         method: 'DELETE',
         headers: { Authorization: `Bearer ${localStorage.getItem('token')}` }
       });
+      rememberWrite(res);
 
       if (res.ok) {
         showMessage('success', 'Booking cancelled successfully');
@@ -209,19 +349,24 @@ const App = () => {
 
   const handleRetryPayment = async (bookingId) => {
     setLoading(true);
+    delete settledPayments.current[bookingId];
     try {
       const res = await fetch(`${API_URL}/bookings/${bookingId}/retry-payment`, {
         method: 'POST',
         headers: { Authorization: `Bearer ${localStorage.getItem('token')}` }
       });
+      rememberWrite(res);
 
       const data = await res.json();
       
       if (res.ok) {
-        if (data.payment_status === 'SUCCESS') {
+        const settled = await waitForPayment(data.id);
+        if (settled && settled.payment_status === 'SUCCESS') {
           showMessage('success', '✅ Payment successful! Booking confirmed.');
-        } else {
+        } else if (settled) {
           showMessage('error', '❌ Payment failed. Please try again.');
+        } else {
+          showMessage('success', '⏳ Payment is being processed.');
         }
         fetchBookings();
       } else {
@@ -255,6 +400,7 @@ const App = () => {
       case 'SUCCESS': return 'bg-green-100 text-green-800';
       case 'FAILED': return 'bg-red-100 text-red-800';
       case 'PENDING': return 'bg-yellow-100 text-yellow-800';
+      case 'PROCESSING': return 'bg-blue-100 text-blue-800';
       default: return 'bg-gray-100 text-gray-800';
     }
   };
@@ -690,6 +836,7 @@ const App = () => {
                   </div>
                 </div>
               ))}
+              <LoadMore cursor={bookingsCursor} onClick={() => fetchBookings(null, bookingsCursor)} />
             </div>
           )}
         </div>
@@ -703,8 +850,10 @@ const AdminPanel = ({ user, onLogout, showMessage }) => {
   const [page, setPage] = useState('dashboard');
   const [stats, setStats] = useState(null);
   const [users, setUsers] = useState([]);
+  const [usersCursor, setUsersCursor] = useState(null);
   const [services, setServices] = useState([]);
   const [bookings, setBookings] = useState([]);
+  const [bookingsCursor, setBookingsCursor] = useState(null);
   const [loading, setLoading] = useState(false);
 
   const [serviceForm, setServiceForm] = useState({
@@ -735,6 +884,38 @@ const AdminPanel = ({ user, onLogout, showMessage }) => {
     fetchBookings();
   }, []);
 
+  // Live updates: every booking change is pushed over /events. Rows are patched in
+  // place; the dashboard (cheap, counter backed) is refreshed once per burst of events.
+  const dashboardRefresh = useRef(null);
+
+  useEffect(() => {
+    const refreshDashboard = () => {
+      clearTimeout(dashboardRefresh.current);
+      dashboardRefresh.current = setTimeout(fetchDashboard, 500);
+    };
+    const unsubscribe = subscribeEvents({
+      booking: (e) => {
+        const booking = JSON.parse(e.data);
+        if (booking.action === 'created') {
+          fetchBookings();
+        } else {
+          setBookings((current) => current.map((b) => (
+            b.id === booking.id ? { ...b, status: booking.status, payment_status: booking.payment_status } : b
+          )));
+        }
+        refreshDashboard();
+      },
+      resync: () => {
+        fetchBookings();
+        refreshDashboard();
+      }
+    });
+    return () => {
+      clearTimeout(dashboardRefresh.current);
+      unsubscribe();
+    };
+  }, []);
+
   const fetchDashboard = async () => {
     try {
       const res = await fetch(`${API_URL}/admin/dashboard`, {
@@ -747,13 +928,13 @@ const AdminPanel = ({ user, onLogout, showMessage }) => {
     }
   };
 
-  const fetchUsers = async () => {
+  const fetchUsers = async (cursor) => {
     try {
-      const res = await fetch(`${API_URL}/admin/users`, {
-        headers: { Authorization: `Bearer ${localStorage.getItem('token')}` }
+      const { items, next } = await fetchPage('/admin/users', cursor, {
+        Authorization: `Bearer ${localStorage.getItem('token')}`
       });
-      const data = await res.json();
-      setUsers(data);
+      setUsers((current) => (cursor ? [...current, ...items] : items));
+      setUsersCursor(next);
     } catch (err) {
       console.error(err);
     }
@@ -769,13 +950,13 @@ const AdminPanel = ({ user, onLogout, showMessage }) => {
     }
   };
 
-  const fetchBookings = async () => {
+  const fetchBookings = async (cursor) => {
     try {
-      const res = await fetch(`${API_URL}/admin/bookings`, {
-        headers: { Authorization: `Bearer ${localStorage.getItem('token')}` }
+      const { items, next } = await fetchPage('/admin/bookings', cursor, {
+        Authorization: `Bearer ${localStorage.getItem('token')}`
       });
-      const data = await res.json();
-      setBookings(data);
+      setBookings((current) => (cursor ? [...current, ...items] : items));
+      setBookingsCursor(next);
     } catch (err) {
       console.error(err);
     }
@@ -1022,7 +1203,7 @@ const AdminPanel = ({ user, onLogout, showMessage }) => {
         {/* Users */}
         {page === 'users' && (
           <div>
-            <h1 className="text-4xl font-bold text-gray-800 mb-8">Registered Users ({users.length})</h1>
+            <h1 className="text-4xl font-bold text-gray-800 mb-8">Registered Users ({users.length}{usersCursor ? '+' : ''})</h1>
             
             <div className="bg-white rounded-2xl shadow-lg overflow-hidden">
               <table className="w-full">
@@ -1052,6 +1233,7 @@ const AdminPanel = ({ user, onLogout, showMessage }) => {
                 </tbody>
               </table>
             </div>
+            <LoadMore cursor={usersCursor} onClick={() => fetchUsers(usersCursor)} />
           </div>
         )}
 
@@ -1191,7 +1373,7 @@ const AdminPanel = ({ user, onLogout, showMessage }) => {
         {/* Bookings */}
         {page === 'bookings' && (
           <div>
-            <h1 className="text-4xl font-bold text-gray-800 mb-8">All Bookings ({bookings.length})</h1>
+            <h1 className="text-4xl font-bold text-gray-800 mb-8">All Bookings ({bookings.length}{bookingsCursor ? '+' : ''})</h1>
             
             <div className="bg-white rounded-2xl shadow-lg overflow-hidden">
               <div className="overflow-x-auto">
@@ -1241,6 +1423,7 @@ const AdminPanel = ({ user, onLogout, showMessage }) => {
                 </table>
               </div>
             </div>
+            <LoadMore cursor={bookingsCursor} onClick={() => fetchBookings(bookingsCursor)} />
           </div>
         )}
       </div>